@@ -0,0 +1,233 @@
+"""Archiving of old assignments.
+
+The scheduler only looks at ±30 days of assignments and the dashboard at ±12
+weeks, but ``week_assignment`` used to keep all of history. ``archive_assignments``
+moves every week older than a horizon into ``assignment_archive`` (one row per
+week, holding its assignments as zlib-compressed JSON columns) and adds their
+fairness totals to ``staff_week_rollup``. Rollups are keyed by the same
+``week_start_date`` value the assignments had, so ``calculate_fairness_score``
+returns the same figures for any window. Preference scores are taken as they
+are when a week is archived.
+
+The weekly load counters (``staff_week_load``) already summarize shift counts
+and are left untouched.
+
+Run it from the API (``POST /api/archive/run``) or the command line:
+
+    python archive.py --horizon-days 180 [--vacuum]
+"""
+import argparse
+import json
+import logging
+import os
+import zlib
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Tuple
+from sqlalchemy import and_, func, text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+import models
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_HORIZON_DAYS = int(os.getenv("ARCHIVE_HORIZON_DAYS", "180"))
+MIN_ARCHIVE_HORIZON_DAYS = 31  # Never archive inside the scheduler's ±30 day window
+DELETE_CHUNK_SIZE = 500
+
+# Same thresholds as SchedulingEngine.calculate_fairness_score
+PREFERRED_SCORE = 0.2
+AVOIDED_SCORE = -0.2
+
+ARCHIVE_COLUMNS = (
+    "id", "staff_id", "shift_template_id", "week_start_date", "day_of_week",
+    "assigned_at", "shift_date", "start_at", "end_at", "preference_score"
+)
+
+
+def _json_value(value):
+    return value.isoformat() if isinstance(value, (date, datetime)) else value
+
+
+def encode_rows(rows: List[tuple]) -> bytes:
+    """Pack archive rows column by column (compresses much better than row dicts)."""
+    columns = {name: [_json_value(row[i]) for row in rows] for i, name in enumerate(ARCHIVE_COLUMNS)}
+    return zlib.compress(json.dumps(columns, separators=(",", ":")).encode(), 9)
+
+
+def decode_rows(payload: bytes) -> List[Dict]:
+    columns = json.loads(zlib.decompress(payload))
+    names = list(columns)
+    return [dict(zip(names, values)) for values in zip(*columns.values())]
+
+
+def archive_week(db: Session, week_date: date) -> int:
+    """Move one week's assignments to the archive and roll them up. Commits; returns rows moved."""
+    day_start = datetime.combine(week_date, datetime.min.time())
+    WA = models.WeekAssignment
+    rows = db.query(
+        WA.id, WA.staff_id, WA.shift_template_id, WA.week_start_date, WA.day_of_week,
+        WA.assigned_at, WA.shift_date, WA.start_at, WA.end_at,
+        func.coalesce(models.Preference.preference_score, 0.0)
+    ).outerjoin(models.Preference, and_(
+        models.Preference.staff_id == WA.staff_id,
+        models.Preference.shift_template_id == WA.shift_template_id,
+        models.Preference.day_of_week == WA.day_of_week
+    )).filter(models.week_start_filter(day_start)).order_by(WA.id).all()
+
+    # A duplicated preference row would repeat the assignment; keep the first like get_preference_score does
+    seen = set()
+    unique_rows = []
+    for row in rows:
+        if row[0] not in seen:
+            seen.add(row[0])
+            unique_rows.append(row)
+    if not unique_rows:
+        return 0
+
+    rollups = {}  # (staff_id, week_start_date) -> [shifts, preference_sum, preferred, avoided]
+    for row in unique_rows:
+        score = row[-1]
+        totals = rollups.setdefault((row[1], row[3]), [0, 0.0, 0, 0])
+        totals[0] += 1
+        totals[1] += score
+        if score > PREFERRED_SCORE:
+            totals[2] += 1
+        elif score < AVOIDED_SCORE:
+            totals[3] += 1
+
+    stmt = sqlite_insert(models.StaffWeekRollup)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["staff_id", "week_start_date"],
+        set_={
+            "shift_count": models.StaffWeekRollup.shift_count + stmt.excluded.shift_count,
+            "preference_sum": models.StaffWeekRollup.preference_sum + stmt.excluded.preference_sum,
+            "preferred_count": models.StaffWeekRollup.preferred_count + stmt.excluded.preferred_count,
+            "avoided_count": models.StaffWeekRollup.avoided_count + stmt.excluded.avoided_count,
+        }
+    )
+    db.execute(stmt, [
+        {
+            "staff_id": staff_id, "week_start_date": week_start_date, "shift_count": shifts,
+            "preference_sum": preference_sum, "preferred_count": preferred, "avoided_count": avoided
+        }
+        for (staff_id, week_start_date), (shifts, preference_sum, preferred, avoided) in rollups.items()
+    ])
+
+    db.add(models.AssignmentArchive(week_start_date=day_start, row_count=len(unique_rows), payload=encode_rows(unique_rows)))
+
+    ids = [row[0] for row in unique_rows]
+    for i in range(0, len(ids), DELETE_CHUNK_SIZE):
+        db.query(WA).filter(WA.id.in_(ids[i:i + DELETE_CHUNK_SIZE])).delete(synchronize_session=False)
+
+    db.commit()
+    return len(unique_rows)
+
+
+def archive_assignments(db: Session, horizon_days: int = None, now: datetime = None) -> Dict:
+    """Archive every week that starts more than horizon_days ago, one transaction per week."""
+    if horizon_days is None:
+        horizon_days = ARCHIVE_HORIZON_DAYS
+    if horizon_days < MIN_ARCHIVE_HORIZON_DAYS:
+        raise ValueError(f"horizon_days must be at least {MIN_ARCHIVE_HORIZON_DAYS}")
+
+    cutoff = datetime.combine(((now or datetime.utcnow()) - timedelta(days=horizon_days)).date(), datetime.min.time())
+    weeks = [
+        date.fromisoformat(day) for (day,) in db.query(func.date(models.WeekAssignment.week_start_date)).filter(
+            models.WeekAssignment.week_start_date < cutoff
+        ).distinct().order_by(func.date(models.WeekAssignment.week_start_date)).all()
+    ]
+
+    archived = []
+    total = 0
+    for week_date in weeks:
+        moved = archive_week(db, week_date)
+        total += moved
+        archived.append({"week_start_date": week_date.isoformat(), "assignments": moved})
+        logger.debug("Archived %d assignments for week %s", moved, week_date)
+
+    return {
+        "cutoff": cutoff.date().isoformat(),
+        "weeks_archived": len(archived),
+        "assignments_archived": total,
+        "weeks": archived
+    }
+
+
+def query_archive(db: Session, start_date: datetime = None, end_date: datetime = None, staff_id: int = None) -> List[Dict]:
+    """Archived assignments for weeks starting in [start_date, end_date], optionally for one staff member."""
+    query = db.query(models.AssignmentArchive.payload)
+    if start_date is not None:
+        query = query.filter(models.AssignmentArchive.week_start_date >= datetime.combine(start_date.date(), datetime.min.time()))
+    if end_date is not None:
+        query = query.filter(models.AssignmentArchive.week_start_date <= end_date)
+
+    results = []
+    for (payload,) in query.order_by(models.AssignmentArchive.week_start_date, models.AssignmentArchive.id).all():
+        for row in decode_rows(payload):
+            if staff_id is None or row["staff_id"] == staff_id:
+                results.append(row)
+    return results
+
+
+def get_rollup_totals(db: Session, staff_id: int, start_date: datetime, end_date: datetime) -> Tuple[int, float, int, int]:
+    """(shifts, preference_sum, preferred, avoided) from archived weeks in a fairness window."""
+    R = models.StaffWeekRollup
+    row = db.query(
+        func.coalesce(func.sum(R.shift_count), 0),
+        func.coalesce(func.sum(R.preference_sum), 0.0),
+        func.coalesce(func.sum(R.preferred_count), 0),
+        func.coalesce(func.sum(R.avoided_count), 0)
+    ).filter(
+        R.staff_id == staff_id,
+        R.week_start_date >= start_date,
+        R.week_start_date <= end_date
+    ).one()
+    return row[0], row[1], row[2], row[3]
+
+
+NO_ROLLUP = (0, 0.0, 0, 0)
+
+
+def latest_archived_week(db: Session):
+    """Newest week with rollups, or None if nothing has been archived."""
+    return db.query(func.max(models.StaffWeekRollup.week_start_date)).scalar()
+
+
+def get_rollup_totals_by_staff(db: Session, start_date: datetime, end_date: datetime) -> Dict[int, Tuple[int, float, int, int]]:
+    """get_rollup_totals for every staff member with archived weeks in the window, from one grouped query."""
+    R = models.StaffWeekRollup
+    rows = db.query(
+        R.staff_id,
+        func.sum(R.shift_count),
+        func.sum(R.preference_sum),
+        func.sum(R.preferred_count),
+        func.sum(R.avoided_count)
+    ).filter(
+        R.week_start_date >= start_date,
+        R.week_start_date <= end_date
+    ).group_by(R.staff_id).all()
+    return {staff_id: (shifts, preference_sum, preferred, avoided) for staff_id, shifts, preference_sum, preferred, avoided in rows}
+
+
+def main():
+    from sites import DEFAULT_SITE, site_registry
+
+    parser = argparse.ArgumentParser(description="Move old week assignments into the archive")
+    parser.add_argument("--horizon-days", type=int, default=ARCHIVE_HORIZON_DAYS, help="Archive weeks starting more than this many days ago")
+    parser.add_argument("--vacuum", action="store_true", help="VACUUM afterwards so the database file shrinks")
+    parser.add_argument("--site", default=DEFAULT_SITE, help="Site whose database to archive")
+    args = parser.parse_args()
+
+    site = site_registry.get(args.site)
+    with site.SessionLocal() as db:
+        result = archive_assignments(db, args.horizon_days)
+    print(f"Archived {result['assignments_archived']} assignments from {result['weeks_archived']} weeks (before {result['cutoff']})")
+
+    if args.vacuum:
+        with site.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(text("VACUUM"))
+        print("Vacuumed database")
+
+
+if __name__ == "__main__":
+    main()
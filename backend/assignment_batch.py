@@ -0,0 +1,146 @@
+"""Batch edits to one week's assignments.
+
+The Schedule view used to send a drag-and-drop rearrangement as one
+``POST``/``DELETE`` per assignment, each validated and committed on its own,
+so a failure half-way left the week half-changed. ``apply_batch`` takes a
+list of operations on one week:
+
+    add     staff_id, shift_template_id, day_of_week
+    remove  assignment_id
+    move    assignment_id plus any of staff_id, shift_template_id, day_of_week
+
+and checks them all against the week as loaded once: referenced assignments
+must exist in the week and be used by one operation only, templates must run
+on the day, and the week must not end up with the same staff member twice on
+a shift and day. Removals and moves free their slot before anything is
+claimed, so two moves can swap staff. If every operation is valid they are
+applied in one transaction (a move is a delete plus an insert, so the moved
+assignment gets a new id); otherwise nothing is written and
+``BatchRejected`` carries the per-operation results. Like single manual
+assignments, availability and shift caps are not enforced.
+"""
+from datetime import datetime
+from typing import Dict, List, Sequence, Tuple
+from sqlalchemy import delete
+from sqlalchemy.orm import Session
+import load_counters
+import models
+from events import assignment_payload
+from reference_cache import reference_cache
+
+OPERATIONS = ("add", "remove", "move")
+MAX_BATCH_OPERATIONS = 500
+
+
+class BatchRejected(Exception):
+    """At least one operation is invalid; nothing was applied."""
+
+    def __init__(self, results: List[Dict]):
+        self.results = results
+        failed = sum(1 for r in results if r["status"] == "error")
+        super().__init__(f"{failed} of {len(results)} operations are invalid; nothing was applied")
+
+
+def _target(reference, op, source=None) -> Tuple[Tuple[int, int, int], str]:
+    """(staff, template, day) an add or move ends up at, or an error message."""
+    staff_id = op.staff_id if op.staff_id is not None else (source.staff_id if source else None)
+    template_id = op.shift_template_id if op.shift_template_id is not None else (source.shift_template_id if source else None)
+    day = op.day_of_week if op.day_of_week is not None else (source.day_of_week if source else None)
+    if staff_id is None or template_id is None or day is None:
+        return None, "add needs staff_id, shift_template_id and day_of_week"
+    if staff_id not in reference.staff_by_id:
+        return None, "Staff not found"
+    template = reference.templates_by_id.get(template_id)
+    if template is None:
+        return None, "Shift template not found"
+    if day not in template.days_of_week:
+        return None, f"Day {day} is not in this shift template's days"
+    return (staff_id, template_id, day), None
+
+
+def plan_batch(reference, week_rows: Sequence[models.WeekAssignment], operations: Sequence) -> Tuple[List[Dict], List, List]:
+    """Validate operations against the week's rows.
+
+    Returns (results, rows to delete, inserts); inserts are (operation index,
+    (staff, template, day), moved row or None). The results mark every invalid
+    operation with status "error".
+    """
+    rows_by_id = {row.id: row for row in week_rows}
+    occupied = {(row.staff_id, row.shift_template_id, row.day_of_week) for row in week_rows}
+    results = [{"index": i, "op": op.op, "status": "ok"} for i, op in enumerate(operations)]
+    sources = [None] * len(operations)
+    used_ids = set()
+
+    # Pass 1: operations on existing assignments release their slots
+    for i, op in enumerate(operations):
+        if op.op not in OPERATIONS:
+            results[i].update(status="error", detail=f"Unknown operation '{op.op}' (expected add, remove or move)")
+            continue
+        if op.op == "add":
+            continue
+        results[i]["assignment_id"] = op.assignment_id
+        row = rows_by_id.get(op.assignment_id)
+        if row is None:
+            results[i].update(status="error", detail="Assignment not found in this week")
+        elif op.assignment_id in used_ids:
+            results[i].update(status="error", detail="Assignment is already changed by an earlier operation")
+        else:
+            used_ids.add(op.assignment_id)
+            sources[i] = row
+            occupied.discard((row.staff_id, row.shift_template_id, row.day_of_week))
+
+    # Pass 2: adds and moves claim their slots, in order
+    deletes = [sources[i] for i, op in enumerate(operations) if sources[i] is not None]
+    inserts = []
+    for i, op in enumerate(operations):
+        if op.op not in ("add", "move") or results[i]["status"] == "error":
+            continue
+        key, error = _target(reference, op, sources[i])
+        if error:
+            results[i].update(status="error", detail=error)
+        elif key in occupied:
+            results[i].update(status="error", detail="This staff member is already assigned to this shift on this day")
+        else:
+            occupied.add(key)
+            inserts.append((i, key, sources[i]))
+    return results, deletes, inserts
+
+
+def apply_batch(db: Session, week_start_date: datetime, operations: Sequence) -> Tuple[List[Dict], List[int], List[Dict]]:
+    """Validate and apply a batch in one transaction. Commits.
+
+    Call with the week's lock held. Returns (results, removed ids, change feed payloads of the added rows);
+    raises BatchRejected without writing anything if an operation is invalid.
+    """
+    reference = reference_cache.get(db)
+    week_rows = db.query(models.WeekAssignment).filter(models.week_start_filter(week_start_date)).all()
+    results, deletes, inserts = plan_batch(reference, week_rows, operations)
+    if any(r["status"] == "error" for r in results):
+        raise BatchRejected(results)
+
+    removed_ids = [row.id for row in deletes]
+    deltas = {staff_id: -count for staff_id, count in load_counters.count_by_staff(deletes).items()}
+    moved_from = {index: source.id for index, _, source in inserts if source is not None}
+    if removed_ids:
+        db.execute(delete(models.WeekAssignment).where(models.WeekAssignment.id.in_(removed_ids)))
+
+    added = []
+    for _, (staff_id, template_id, day), source in inserts:
+        added.append(models.WeekAssignment(
+            staff_id=staff_id,
+            shift_template_id=template_id,
+            day_of_week=day,
+            week_start_date=source.week_start_date if source is not None else week_start_date
+        ))
+    db.add_all(added)
+    db.flush()
+    for (index, _, _), row in zip(inserts, added):
+        if index in moved_from:
+            results[index]["previous_assignment_id"] = moved_from[index]
+        results[index]["assignment_id"] = row.id
+        deltas[row.staff_id] = deltas.get(row.staff_id, 0) + 1
+
+    load_counters.adjust_week_loads(db, week_start_date, deltas)
+    payloads = [assignment_payload(row) for row in added]  # Before the commit expires them
+    db.commit()
+    return results, removed_ids, payloads
@@ -0,0 +1,528 @@
+"""Bulk import and export of rosters and assignment history.
+
+Moving data in from another tool one POST per row takes hours for tens of
+thousands of staff, availability and preference rows, and far longer for
+historical assignments. ``import_file`` reads a CSV or Parquet file in chunks
+of ``CHUNK_ROWS`` rows. For each chunk it:
+
+    1. coerces and validates the rows against ids loaded once at the start
+       (no per-row queries); bad rows are skipped and reported;
+    2. writes the rest with one batched executemany per statement;
+    3. updates the side tables (weekly load counters, data version) and
+       commits, so memory stays flat and a failure keeps the earlier chunks.
+
+Structured columns (qualifications, days_of_week, required_qualifications) are
+JSON strings in both formats, so a file exported here imports unchanged.
+
+Kinds and their semantics:
+
+    staff, shift_templates  rows with an id update that row, rows without one are added
+    availability, preferences  replace any existing row for the same (staff, template, day);
+                 a second row for a key already in the file is an invalid row
+                 (the API and scheduler keep the first row for a key, so
+                 last-row-wins would schedule differently)
+    assignments  ids and unique (staff, template, day, week) duplicates are skipped;
+                 shift_date/start_at/end_at and the weekly counters are filled in
+
+Parquet needs ``pyarrow`` (``pip install pyarrow``); CSV works without it.
+
+    python bulk_io.py import staff staff.csv
+    python bulk_io.py import assignments history.parquet
+    python bulk_io.py export assignments history.csv --start-date 2024-01-01
+"""
+import argparse
+import csv
+import io
+import json
+import logging
+import time
+from datetime import date, datetime
+from datetime import time as time_of_day
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
+from sqlalchemy import bindparam, insert, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+import models
+from load_counters import adjust_week_loads, week_key
+from snapshot import bump_data_version
+
+logger = logging.getLogger(__name__)
+
+CHUNK_ROWS = 10000
+MAX_REPORTED_ERRORS = 50
+FORMATS = ("csv", "parquet")
+
+# kind -> ((column, type), ...) in file order
+COLUMNS = {
+    "staff": (
+        ("id", "int"), ("name", "str"), ("qualifications", "json"), ("max_shifts_per_week", "int"),
+    ),
+    "shift_templates": (
+        ("id", "int"), ("name", "str"), ("days_of_week", "json"), ("start_time", "str"), ("end_time", "str"),
+        ("required_staff", "int"), ("required_qualifications", "json"), ("is_active", "bool"),
+    ),
+    "availability": (
+        ("staff_id", "int"), ("shift_template_id", "int"), ("day_of_week", "int"), ("is_available", "bool"),
+    ),
+    "preferences": (
+        ("staff_id", "int"), ("shift_template_id", "int"), ("day_of_week", "int"), ("preference_score", "float"),
+    ),
+    "assignments": (
+        ("id", "int"), ("staff_id", "int"), ("shift_template_id", "int"), ("week_start_date", "datetime"),
+        ("day_of_week", "int"), ("assigned_at", "datetime"),
+    ),
+}
+REQUIRED = {
+    "staff": {"name"},
+    "shift_templates": {"name", "days_of_week", "start_time", "end_time"},
+    "availability": {"staff_id", "day_of_week"},
+    "preferences": {"staff_id", "day_of_week", "preference_score"},
+    "assignments": {"staff_id", "shift_template_id", "week_start_date", "day_of_week"},
+}
+MODELS = {
+    "staff": models.Staff,
+    "shift_templates": models.ShiftTemplate,
+    "availability": models.Availability,
+    "preferences": models.Preference,
+    "assignments": models.WeekAssignment,
+}
+
+
+def _parquet():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ValueError("Parquet support needs pyarrow (pip install pyarrow)")
+    return pyarrow, pyarrow.parquet
+
+
+def check_kind_and_format(kind: str, fmt: str):
+    if kind not in COLUMNS:
+        raise ValueError(f"Unknown kind '{kind}', expected one of: {', '.join(COLUMNS)}")
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format '{fmt}', expected one of: {', '.join(FORMATS)}")
+    if fmt == "parquet":
+        _parquet()
+
+
+# Reading
+
+def read_chunks(source: BinaryIO, fmt: str, chunk_rows: int = CHUNK_ROWS) -> Iterator[List[Dict]]:
+    """Rows of a CSV or Parquet file as dicts, chunk_rows at a time."""
+    if fmt == "parquet":
+        _, parquet = _parquet()
+        for batch in parquet.ParquetFile(source).iter_batches(batch_size=chunk_rows):
+            yield batch.to_pylist()
+        return
+
+    reader = csv.DictReader(io.TextIOWrapper(source, encoding="utf-8-sig", newline=""))
+    chunk = []
+    for row in reader:
+        chunk.append(row)
+        if len(chunk) == chunk_rows:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _blank(value) -> bool:
+    return value is None or (isinstance(value, str) and value.strip() == "")
+
+
+def _coerce(value, kind: str):
+    if kind == "int":
+        if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+            raise ValueError(f"expected an integer, got {value!r}")
+        return int(value)
+    if kind == "float":
+        return float(value)
+    if kind == "bool":
+        if isinstance(value, bool):
+            return value
+        text = str(value).strip().lower()
+        if text in ("1", "true", "yes", "y", "t"):
+            return True
+        if text in ("0", "false", "no", "n", "f"):
+            return False
+        raise ValueError(f"expected a boolean, got {value!r}")
+    if kind == "json":
+        return json.loads(value) if isinstance(value, str) else value
+    if kind == "datetime":
+        if isinstance(value, datetime):
+            return value.replace(tzinfo=None)
+        if isinstance(value, date):
+            return datetime.combine(value, datetime.min.time())
+        return datetime.fromisoformat(str(value).strip())
+    return str(value).strip()
+
+
+def _day(value: int) -> int:
+    if not 0 <= value <= 6:
+        raise ValueError(f"day_of_week must be 0-6, got {value}")
+    return value
+
+
+class ImportContext:
+    """Ids and lookups loaded once per import and kept up to date as chunks land."""
+
+    def __init__(self, db: Session, kind: str):
+        self.kind = kind
+        self.staff_ids = {staff_id for (staff_id,) in db.query(models.Staff.id).all()}
+        self.templates = {
+            row.id: row for row in db.query(
+                models.ShiftTemplate.id, models.ShiftTemplate.days_of_week,
+                models.ShiftTemplate.start_time, models.ShiftTemplate.end_time
+            ).all()
+        }
+        self.template_ids = set(self.templates)
+        self.updated_template_ids = set()
+        self.existing = {}  # (staff_id, template_id, day) -> id, for availability/preferences
+        if kind in ("availability", "preferences"):
+            model = MODELS[kind]
+            for row_id, staff_id, template_id, day in db.query(
+                model.id, model.staff_id, model.shift_template_id, model.day_of_week
+            ).order_by(model.id).all():
+                self.existing[(staff_id, template_id, day)] = row_id
+        self.file_keys = {}  # (staff_id, template_id, day) -> file row that set it, for availability/preferences
+        self.shift_times = {}  # (week_start_date, day, template_id) -> (shift_date, start_at, end_at)
+        self.week_deltas = {}  # week key -> {staff_id: added}
+
+
+def _validate(kind: str, row: Dict, ctx: ImportContext, row_number: int) -> Dict:
+    """Typed, checked row for kind (row_number is its 1-based position in the file).
+
+    Raises ValueError with a message on bad input.
+    """
+    clean = {}
+    for column, column_type in COLUMNS[kind]:
+        value = row.get(column)
+        if _blank(value):
+            if column in REQUIRED[kind]:
+                raise ValueError(f"{column} is required")
+            clean[column] = None
+            continue
+        try:
+            clean[column] = _coerce(value, column_type)
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"{column}: {e}")
+
+    if kind == "staff":
+        qualifications = clean["qualifications"] or []
+        if not isinstance(qualifications, list) or not all(isinstance(q, str) for q in qualifications):
+            raise ValueError("qualifications must be a JSON list of strings")
+        clean["qualifications"] = qualifications
+        clean["max_shifts_per_week"] = 5 if clean["max_shifts_per_week"] is None else clean["max_shifts_per_week"]
+        if clean["max_shifts_per_week"] < 0:
+            raise ValueError("max_shifts_per_week must not be negative")
+    elif kind == "shift_templates":
+        days = clean["days_of_week"]
+        if not isinstance(days, list) or not days or not all(isinstance(d, int) and 0 <= d <= 6 for d in days):
+            raise ValueError("days_of_week must be a JSON list of days 0-6")
+        for column in ("start_time", "end_time"):
+            time_of_day.fromisoformat(clean[column])
+        quals = clean["required_qualifications"] or {}
+        if not isinstance(quals, dict) or not all(isinstance(k, str) and isinstance(v, int) and v >= 0 for k, v in quals.items()):
+            raise ValueError("required_qualifications must be a JSON object of qualification -> count")
+        clean["required_qualifications"] = quals
+        clean["required_staff"] = 1 if clean["required_staff"] is None else clean["required_staff"]
+        clean["is_active"] = True if clean["is_active"] is None else clean["is_active"]
+    else:
+        if clean["staff_id"] not in ctx.staff_ids:
+            raise ValueError(f"unknown staff_id {clean['staff_id']}")
+        template_id = clean["shift_template_id"]
+        if template_id is not None and template_id not in ctx.template_ids:
+            raise ValueError(f"unknown shift_template_id {template_id}")
+        _day(clean["day_of_week"])
+
+    if kind in ("availability", "preferences"):
+        key = (clean["staff_id"], clean["shift_template_id"], clean["day_of_week"])
+        first = ctx.file_keys.get(key)
+        if first is not None:
+            raise ValueError(f"duplicate of row {first} (same staff_id, shift_template_id and day_of_week)")
+
+    if kind == "availability":
+        clean["is_available"] = True if clean["is_available"] is None else clean["is_available"]
+    elif kind == "preferences":
+        if not -1.0 <= clean["preference_score"] <= 1.0:
+            raise ValueError("preference_score must be between -1 and 1")
+    elif kind == "assignments":
+        template = ctx.templates[clean["shift_template_id"]]
+        if clean["day_of_week"] not in (template.days_of_week or ()):
+            raise ValueError(f"day {clean['day_of_week']} is not in shift template {template.id}'s days")
+        key = (clean["week_start_date"], clean["day_of_week"], template.id)
+        times = ctx.shift_times.get(key)
+        if times is None:
+            times = ctx.shift_times[key] = models.shift_times(*key[:2], template.start_time, template.end_time)
+        clean["shift_date"], clean["start_at"], clean["end_at"] = times
+        if clean["assigned_at"] is None:
+            clean["assigned_at"] = datetime.utcnow()
+        if clean["id"] is None:
+            del clean["id"]
+
+    if kind in ("availability", "preferences"):
+        ctx.file_keys[key] = row_number
+    return clean
+
+
+# Writing, one function per kind; each returns (written, skipped)
+
+def _write_with_ids(db: Session, model, rows: List[Dict], known_ids: set, update_columns: Tuple[str, ...]) -> Tuple[int, int]:
+    table = model.__table__
+    with_id = [row for row in rows if row["id"] is not None]
+    without_id = [{k: v for k, v in row.items() if k != "id"} for row in rows if row["id"] is None]
+    if with_id:
+        stmt = sqlite_insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["id"],
+            set_={column: stmt.excluded[column] for column in update_columns}
+        )
+        db.execute(stmt, with_id)
+        known_ids.update(row["id"] for row in with_id)
+    if without_id:
+        known_ids.update(row_id for (row_id,) in db.execute(insert(table).returning(table.c.id), without_id))
+    return len(rows), 0
+
+
+def _write_staff(db: Session, rows: List[Dict], ctx: ImportContext) -> Tuple[int, int]:
+    return _write_with_ids(db, models.Staff, rows, ctx.staff_ids, ("name", "qualifications", "max_shifts_per_week"))
+
+
+def _write_templates(db: Session, rows: List[Dict], ctx: ImportContext) -> Tuple[int, int]:
+    ctx.updated_template_ids.update(row["id"] for row in rows if row["id"] in ctx.template_ids)
+    result = _write_with_ids(db, models.ShiftTemplate, rows, ctx.template_ids, (
+        "name", "days_of_week", "start_time", "end_time", "required_staff", "required_qualifications", "is_active"
+    ))
+    for row in rows:
+        if row["id"] is not None:
+            ctx.templates[row["id"]] = _TemplateTimes(row["id"], row["days_of_week"], row["start_time"], row["end_time"])
+    return result
+
+
+class _TemplateTimes:
+    __slots__ = ("id", "days_of_week", "start_time", "end_time")
+
+    def __init__(self, template_id, days_of_week, start_time, end_time):
+        self.id, self.days_of_week, self.start_time, self.end_time = template_id, days_of_week, start_time, end_time
+
+
+def _write_replacing(db: Session, rows: List[Dict], ctx: ImportContext) -> Tuple[int, int]:
+    """Availability/preferences: each row replaces the table's row for its (staff, template, day).
+
+    Keys are unique within the file (_validate rejects repeats).
+    """
+    table = MODELS[ctx.kind].__table__
+    keys = [(row["staff_id"], row["shift_template_id"], row["day_of_week"]) for row in rows]
+    replaced = [{"old_id": ctx.existing[key]} for key in keys if key in ctx.existing]
+    if replaced:
+        db.execute(table.delete().where(table.c.id == bindparam("old_id")), replaced)
+    inserted = db.execute(
+        insert(table).returning(table.c.id, table.c.staff_id, table.c.shift_template_id, table.c.day_of_week),
+        rows
+    )
+    for row_id, staff_id, template_id, day in inserted:
+        ctx.existing[(staff_id, template_id, day)] = row_id
+    return len(rows), 0
+
+
+def _write_assignments(db: Session, rows: List[Dict], ctx: ImportContext) -> Tuple[int, int]:
+    table = models.WeekAssignment.__table__
+    written = 0
+    week_keys = {}
+    # Rows with and without an explicit id need separate statements (different columns)
+    for group in ([row for row in rows if "id" in row], [row for row in rows if "id" not in row]):
+        if not group:
+            continue
+        stmt = sqlite_insert(table).on_conflict_do_nothing().returning(table.c.staff_id, table.c.week_start_date)
+        for staff_id, week_start_date in db.execute(stmt, group):
+            week = week_keys.get(week_start_date)
+            if week is None:
+                week = week_keys[week_start_date] = week_key(week_start_date)
+            deltas = ctx.week_deltas.setdefault(week, {})
+            deltas[staff_id] = deltas.get(staff_id, 0) + 1
+            written += 1
+    return written, len(rows) - written
+
+
+WRITERS = {
+    "staff": _write_staff,
+    "shift_templates": _write_templates,
+    "availability": _write_replacing,
+    "preferences": _write_replacing,
+    "assignments": _write_assignments,
+}
+
+
+def import_file(db: Session, kind: str, source: BinaryIO, fmt: str = "csv", chunk_rows: int = CHUNK_ROWS) -> Dict:
+    """Stream a file into the database, one transaction per chunk. Returns a throughput report."""
+    check_kind_and_format(kind, fmt)
+    started = time.perf_counter()
+    ctx = ImportContext(db, kind)
+    writer = WRITERS[kind]
+
+    rows_read = written = skipped = invalid = chunks = 0
+    errors = []
+    for chunk in read_chunks(source, fmt, chunk_rows):
+        if chunks == 0:
+            missing = REQUIRED[kind] - set(chunk[0])
+            if missing:
+                raise ValueError(f"Missing required columns: {', '.join(sorted(missing))}")
+
+        valid = []
+        for offset, row in enumerate(chunk):
+            try:
+                valid.append(_validate(kind, row, ctx, rows_read + offset + 1))
+            except (KeyError, ValueError) as e:
+                invalid += 1
+                if len(errors) < MAX_REPORTED_ERRORS:
+                    errors.append({"row": rows_read + offset + 1, "error": str(e)})
+        rows_read += len(chunk)
+
+        if valid:
+            chunk_written, chunk_skipped = writer(db, valid, ctx)
+            written += chunk_written
+            skipped += chunk_skipped
+        if ctx.week_deltas:
+            for week, deltas in ctx.week_deltas.items():
+                adjust_week_loads(db, week, deltas)
+            ctx.week_deltas = {}
+        if kind != "assignments":
+            bump_data_version(db)
+        db.commit()
+        chunks += 1
+        logger.debug("Bulk import %s: chunk %d, %d rows read, %d written", kind, chunks, rows_read, written)
+
+    # Template times may have changed under existing assignments
+    if ctx.updated_template_ids:
+        for template in db.query(models.ShiftTemplate).filter(models.ShiftTemplate.id.in_(ctx.updated_template_ids)).all():
+            models.refresh_shift_times(db, template)
+        db.commit()
+
+    seconds = time.perf_counter() - started
+    return {
+        "kind": kind,
+        "format": fmt,
+        "rows_read": rows_read,
+        "rows_written": written,
+        "rows_skipped": skipped,
+        "rows_invalid": invalid,
+        "errors": errors,
+        "chunks": chunks,
+        "seconds": round(seconds, 3),
+        "rows_per_second": round(rows_read / seconds) if seconds > 0 else rows_read
+    }
+
+
+# Export
+
+def export_chunks(db: Session, kind: str, start_date: Optional[datetime] = None, end_date: Optional[datetime] = None,
+                  chunk_rows: int = CHUNK_ROWS) -> Iterator[List[tuple]]:
+    """Rows of one kind in id order, chunk_rows at a time (assignments optionally by week_start_date range)."""
+    model = MODELS[kind]
+    stmt = select(*(getattr(model, column) for column, _ in COLUMNS[kind])).order_by(model.id)
+    if kind == "assignments":
+        if start_date is not None:
+            stmt = stmt.where(model.week_start_date >= start_date)
+        if end_date is not None:
+            stmt = stmt.where(model.week_start_date <= end_date)
+    result = db.execute(stmt.execution_options(yield_per=chunk_rows))
+    for partition in result.partitions():
+        yield partition
+
+
+def _csv_value(value, column_type: str):
+    if value is None:
+        return ""
+    if column_type == "json":
+        return json.dumps(value)
+    if column_type == "datetime":
+        return value.isoformat()
+    if column_type == "bool":
+        return "true" if value else "false"
+    return value
+
+
+def iter_csv(db: Session, kind: str, **filters) -> Iterator[str]:
+    """CSV text of one kind, one string per chunk (header first)."""
+    columns = COLUMNS[kind]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([column for column, _ in columns])
+    yield buffer.getvalue()
+    for rows in export_chunks(db, kind, **filters):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows([_csv_value(value, column_type) for value, (_, column_type) in zip(row, columns)] for row in rows)
+        yield buffer.getvalue()
+
+
+def write_parquet(db: Session, kind: str, target: BinaryIO, **filters) -> int:
+    """Write one kind as Parquet, one row group per chunk. Returns rows written."""
+    pyarrow, parquet = _parquet()
+    arrow_types = {
+        "int": pyarrow.int64(), "float": pyarrow.float64(), "bool": pyarrow.bool_(),
+        "str": pyarrow.string(), "json": pyarrow.string(), "datetime": pyarrow.timestamp("us"),
+    }
+    columns = COLUMNS[kind]
+    schema = pyarrow.schema([(column, arrow_types[column_type]) for column, column_type in columns])
+    total = 0
+    with parquet.ParquetWriter(target, schema) as writer:
+        for rows in export_chunks(db, kind, **filters):
+            data = {}
+            for i, (column, column_type) in enumerate(columns):
+                values = [row[i] for row in rows]
+                if column_type == "json":
+                    values = [None if v is None else json.dumps(v) for v in values]
+                data[column] = values
+            writer.write_table(pyarrow.Table.from_pydict(data, schema=schema))
+            total += len(rows)
+    return total
+
+
+def main():
+    from reference_cache import reference_cache
+    from sites import DEFAULT_SITE, site_registry
+
+    parser = argparse.ArgumentParser(description="Bulk import/export of staff, templates, availability, preferences and assignments")
+    parser.add_argument("action", choices=("import", "export"))
+    parser.add_argument("kind", choices=tuple(COLUMNS))
+    parser.add_argument("path", help="CSV or Parquet file")
+    parser.add_argument("--format", choices=FORMATS, help="Defaults to the file extension")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    parser.add_argument("--start-date", type=datetime.fromisoformat, help="Export assignments from this week_start_date")
+    parser.add_argument("--end-date", type=datetime.fromisoformat, help="Export assignments up to this week_start_date")
+    parser.add_argument("--site", default=DEFAULT_SITE, help="Site whose database to use")
+    args = parser.parse_args()
+    fmt = args.format or ("parquet" if args.path.endswith((".parquet", ".pq")) else "csv")
+    check_kind_and_format(args.kind, fmt)
+
+    site = site_registry.get(args.site)
+    with site.SessionLocal() as db:
+        if args.action == "import":
+            with open(args.path, "rb") as source:
+                report = import_file(db, args.kind, source, fmt, args.chunk_rows)
+            reference_cache.invalidate(db)  # Let a running server reload staff and templates
+            print(f"Imported {report['rows_written']} of {report['rows_read']} {args.kind} rows in {report['seconds']}s "
+                  f"({report['rows_per_second']} rows/s); {report['rows_skipped']} skipped, {report['rows_invalid']} invalid")
+            for error in report["errors"]:
+                print(f"  row {error['row']}: {error['error']}")
+        else:
+            started = time.perf_counter()
+            filters = {"start_date": args.start_date, "end_date": args.end_date} if args.kind == "assignments" else {}
+            if fmt == "parquet":
+                with open(args.path, "wb") as target:
+                    total = write_parquet(db, args.kind, target, chunk_rows=args.chunk_rows, **filters)
+            else:
+                total = 0
+                with open(args.path, "w", newline="", encoding="utf-8") as target:
+                    for text in iter_csv(db, args.kind, chunk_rows=args.chunk_rows, **filters):
+                        target.write(text)
+                        total += text.count("\n")
+                total -= 1  # header
+            seconds = time.perf_counter() - started
+            print(f"Exported {total} {args.kind} rows to {args.path} in {seconds:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,295 @@
+"""Hard constraints compiled once per scheduling run.
+
+``check_constraints`` used to run several queries and format a violation
+string for every (staff, template, day) it looked at, even when the caller
+only wanted a yes/no answer. ``ConstraintTable`` takes availability and
+qualification bitsets from the scheduling snapshot (snapshot.py), loads the
+week's assignments in one query and stores one byte per (staff, template, day)
+holding a bitmask of reason codes (0 = feasible). Human-readable messages are
+rendered by ``explain`` only when somebody asks why a pairing was rejected.
+
+Qualifications are per-slot minimums (``{"first_aid": 1}`` means at least one
+of the assigned staff must hold it), not something every assignee needs. They
+are interned to bit positions once per table: each staff member gets a bitmask
+and each qualification an inverted list of the staff holding it. A
+``SlotCoverage`` tracks what a (template, day) slot still needs; a candidate
+keeps the slot coverable iff ``staff_mask & tight_mask == tight_mask``.
+"""
+from datetime import datetime
+from typing import Callable, Dict, List
+from sqlalchemy.orm import Session
+import models
+from reference_cache import reference_cache
+from snapshot import Snapshot, snapshot_store
+
+DAY_NAMES = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+# Reason codes (bit flags so one cell can carry several violations)
+REASON_OK = 0
+REASON_UNAVAILABLE = 1
+REASON_MISSING_QUALIFICATION = 2
+REASON_ALREADY_ASSIGNED = 4
+REASON_SAME_DAY_ASSIGNMENT = 8
+REASON_MAX_SHIFTS = 16
+
+REASON_NAMES = {
+    REASON_UNAVAILABLE: "unavailable",
+    REASON_MISSING_QUALIFICATION: "missing_qualification",
+    REASON_ALREADY_ASSIGNED: "already_assigned",
+    REASON_SAME_DAY_ASSIGNMENT: "same_day_assignment",
+    REASON_MAX_SHIFTS: "max_shifts_per_week",
+}
+
+
+def reason_names(code: int) -> List[str]:
+    """Decode a reason bitmask into its flag names."""
+    return [name for flag, name in REASON_NAMES.items() if code & flag]
+
+
+class QualificationIndex:
+    """Required qualifications interned to bit positions.
+
+    Only qualifications some template asks for get a bit; the rest cannot
+    affect coverage.
+    """
+
+    def __init__(self, staff: List[models.Staff], templates: List[models.ShiftTemplate], snapshot: Snapshot = None):
+        self.bits = {}  # qualification -> bit
+        if snapshot is not None:
+            # Same bit order as the snapshot, so its staff bitsets can be used as they are
+            for qual in snapshot.qualifications:
+                self.bits[qual] = 1 << len(self.bits)
+        for template in templates:
+            for qual in (template.required_qualifications or {}):
+                if qual not in self.bits:
+                    self.bits[qual] = 1 << len(self.bits)
+        self.names = {bit: qual for qual, bit in self.bits.items()}
+
+        # template_id -> ((bit, min_count), ...)
+        self.requirements = {
+            t.id: tuple((self.bits[qual], count) for qual, count in (t.required_qualifications or {}).items() if count > 0)
+            for t in templates
+        }
+
+        self.staff_masks = {}  # staff_id -> bitmask of held qualifications
+        self.holders = {bit: [] for bit in self.names}  # bit -> staff ids holding it
+        for member in staff:
+            mask = snapshot.staff_mask(member.id) if snapshot is not None else None
+            if mask is None:
+                mask = 0
+                for qual in (member.qualifications or ()):
+                    mask |= self.bits.get(qual, 0)
+            for bit in self.holders:
+                if mask & bit:
+                    self.holders[bit].append(member.id)
+            self.staff_masks[member.id] = mask
+
+
+class SlotCoverage:
+    """Seats left and per-qualification shortfall of one (template, day) slot."""
+
+    __slots__ = ("seats", "deficits")
+
+    def __init__(self, seats: int, deficits: Dict[int, int]):
+        self.seats = seats
+        self.deficits = deficits  # bit -> holders still needed
+
+    def copy(self) -> "SlotCoverage":
+        return SlotCoverage(self.seats, dict(self.deficits))
+
+    def add(self, staff_mask: int):
+        self.seats -= 1
+        for bit, needed in self.deficits.items():
+            if needed > 0 and staff_mask & bit:
+                self.deficits[bit] = needed - 1
+
+    def unmet_mask(self) -> int:
+        mask = 0
+        for bit, needed in self.deficits.items():
+            if needed > 0:
+                mask |= bit
+        return mask
+
+    def tight_mask(self) -> int:
+        """Qualifications every remaining seat must hold (shortfall >= seats left)."""
+        mask = 0
+        for bit, needed in self.deficits.items():
+            if needed > 0 and needed >= self.seats:
+                mask |= bit
+        return mask
+
+    def admits(self, staff_mask: int) -> bool:
+        tight = self.tight_mask()
+        return staff_mask & tight == tight
+
+
+class ConstraintTable:
+    """Feasibility of every (staff, template, day) pairing for one week."""
+
+    def __init__(
+        self,
+        week_start_date: datetime,
+        staff: List[models.Staff],
+        templates: List[models.ShiftTemplate],
+        unavailable_days: Callable[[int, int], int],
+        existing: List[tuple],
+        snapshot: Snapshot = None
+    ):
+        self.week_start_date = week_start_date
+        self.staff = staff
+        self.templates = templates
+        self.staff_index = {s.id: i for i, s in enumerate(staff)}
+        self.template_index = {t.id: i for i, t in enumerate(templates)}
+        self.staff_by_id = {s.id: s for s in staff}
+        self.template_by_id = {t.id: t for t in templates}
+        self.qualifications = QualificationIndex(staff, templates, snapshot)
+        self.staff_masks = self.qualifications.staff_masks
+
+        # Existing assignments for the week, as loaded from the database
+        self.week_counts = {}  # staff_id -> shifts already this week
+        self.assigned_per_slot = {}  # (template_id, day) -> headcount
+        self.day_assignments = {}  # (staff_id, day) -> [template_id, ...]
+        self.covered_per_slot = {}  # (template_id, day) -> {bit: holders assigned}
+        for staff_id, template_id, day in existing:
+            self.week_counts[staff_id] = self.week_counts.get(staff_id, 0) + 1
+            self.assigned_per_slot[(template_id, day)] = self.assigned_per_slot.get((template_id, day), 0) + 1
+            self.day_assignments.setdefault((staff_id, day), []).append(template_id)
+            mask = self.staff_masks.get(staff_id, 0)
+            if mask:
+                covered = self.covered_per_slot.setdefault((template_id, day), {})
+                for bit, _ in self.qualifications.requirements.get(template_id, ()):
+                    if mask & bit:
+                        covered[bit] = covered.get(bit, 0) + 1
+
+        template_count = len(templates)
+        self._stride = template_count * 7
+        self.codes = bytearray(len(staff) * self._stride)
+
+        for s_idx, member in enumerate(staff):
+            at_cap = self.week_counts.get(member.id, 0) >= member.max_shifts_per_week
+            base = s_idx * self._stride
+            for t_idx, template in enumerate(templates):
+                template_code = REASON_MAX_SHIFTS if at_cap else REASON_OK
+                days_off = unavailable_days(member.id, template.id)
+                for day in range(7):
+                    code = template_code
+                    if days_off >> day & 1:
+                        code |= REASON_UNAVAILABLE
+                    same_day = self.day_assignments.get((member.id, day))
+                    if same_day:
+                        if template.id in same_day:
+                            code |= REASON_ALREADY_ASSIGNED
+                        if any(other != template.id for other in same_day):
+                            code |= REASON_SAME_DAY_ASSIGNMENT
+                    self.codes[base + t_idx * 7 + day] = code
+
+    @classmethod
+    def compile(
+        cls,
+        db: Session,
+        week_start_date: datetime,
+        staff: List[models.Staff] = None,
+        templates: List[models.ShiftTemplate] = None,
+        snapshot: Snapshot = None
+    ) -> "ConstraintTable":
+        """Build the table from the scheduling snapshot plus the week's assignments."""
+        if snapshot is None:
+            snapshot = snapshot_store.get(db)
+        if staff is None:
+            staff = reference_cache.staff(db)
+        if templates is None:
+            # Inactive templates are included so existing assignments to them can be named
+            templates = reference_cache.templates(db, active_only=False)
+
+        existing = db.query(
+            models.WeekAssignment.staff_id,
+            models.WeekAssignment.shift_template_id,
+            models.WeekAssignment.day_of_week
+        ).filter(models.week_start_filter(week_start_date)).all()
+
+        return cls(week_start_date, staff, templates, snapshot.unavailable_days, existing, snapshot)
+
+    def reason(self, staff_id: int, template_id: int, day: int) -> int:
+        """Reason bitmask for assigning staff to template on day (0 = feasible)."""
+        return self.codes[self.staff_index[staff_id] * self._stride + self.template_index[template_id] * 7 + day]
+
+    def slot_coverage(self, template_id: int, day: int) -> SlotCoverage:
+        """What a slot still needs given the assignments loaded with the table."""
+        covered = self.covered_per_slot.get((template_id, day), {})
+        return SlotCoverage(
+            self.template_by_id[template_id].required_staff - self.assigned_per_slot.get((template_id, day), 0),
+            {bit: count - covered.get(bit, 0) for bit, count in self.qualifications.requirements.get(template_id, ())}
+        )
+
+    def coverage_reason(self, staff_id: int, template_id: int, day: int) -> int:
+        """REASON_MISSING_QUALIFICATION if taking a seat would leave the slot short of a qualification."""
+        if self.slot_coverage(template_id, day).admits(self.staff_masks.get(staff_id, 0)):
+            return REASON_OK
+        return REASON_MISSING_QUALIFICATION
+
+    def full_reason(self, staff_id: int, template_id: int, day: int = None) -> int:
+        """Per-pairing reasons plus, for a specific day, the slot's qualification coverage."""
+        if day is None:
+            return self.template_reason(staff_id, template_id)
+        return self.reason(staff_id, template_id, day) | self.coverage_reason(staff_id, template_id, day)
+
+    def is_feasible(self, staff_id: int, template_id: int, day: int) -> bool:
+        return self.reason(staff_id, template_id, day) == REASON_OK
+
+    def template_reason(self, staff_id: int, template_id: int) -> int:
+        """Reason bitmask for a template as a whole: feasible if any of its days is."""
+        template = self.template_by_id[template_id]
+        combined = None
+        for day in template.days_of_week:
+            code = self.reason(staff_id, template_id, day)
+            if code & ~(REASON_ALREADY_ASSIGNED | REASON_SAME_DAY_ASSIGNMENT) == REASON_OK:
+                return REASON_OK
+            combined = code if combined is None else combined & code
+        return (combined or REASON_OK) & ~(REASON_ALREADY_ASSIGNED | REASON_SAME_DAY_ASSIGNMENT)
+
+    def explain(self, staff_id: int, template_id: int, day: int = None) -> List[str]:
+        """Render the violation messages for a pairing. Only called on demand."""
+        staff = self.staff_by_id[staff_id]
+        template = self.template_by_id[template_id]
+        code = self.full_reason(staff_id, template_id, day)
+
+        violations = []
+        if code & REASON_UNAVAILABLE:
+            if day is not None:
+                violations.append(f"{staff.name} is not available for {template.name} on {DAY_NAMES[day]}")
+            else:
+                violations.append(f"{staff.name} is not available for {template.name} on any day")
+        if code & REASON_MISSING_QUALIFICATION:
+            coverage = self.slot_coverage(template_id, day)
+            missing = coverage.tight_mask() & ~self.staff_masks.get(staff_id, 0)
+            for bit, needed in coverage.deficits.items():
+                if missing & bit:
+                    violations.append(
+                        f"{template.name} on {DAY_NAMES[day]} still needs {needed} staff with "
+                        f"{self.qualifications.names[bit]} ({coverage.seats} seats left) and {staff.name} lacks it"
+                    )
+        if code & REASON_ALREADY_ASSIGNED:
+            violations.append(f"{staff.name} is already assigned to {template.name} on {DAY_NAMES[day]} this week")
+            return violations
+        if code & REASON_SAME_DAY_ASSIGNMENT:
+            for other_id in self.day_assignments.get((staff_id, day), []):
+                if other_id == template_id:
+                    continue
+                violations.append(f"{staff.name} is already assigned to {self.template_by_id[other_id].name} on {DAY_NAMES[day]}")
+        if code & REASON_MAX_SHIFTS:
+            violations.append(f"{staff.name} has reached maximum shifts per week ({staff.max_shifts_per_week})")
+        return violations
+
+    def describe(self, staff_id: int, template_id: int, day: int = None) -> Dict:
+        """Structured explanation used by the explain endpoint."""
+        code = self.full_reason(staff_id, template_id, day)
+        return {
+            "staff_id": staff_id,
+            "staff_name": self.staff_by_id[staff_id].name,
+            "shift_template_id": template_id,
+            "day_of_week": day,
+            "feasible": code == REASON_OK,
+            "reason_code": code,
+            "reason_names": reason_names(code),
+            "reasons": self.explain(staff_id, template_id, day) if code else []
+        }
@@ -0,0 +1,129 @@
+"""Week coverage matrix: required, assigned and missing staff per (template, day).
+
+Scheduling needs to know which slots are understaffed in two places (whether
+there is anything to do at all, and how many open seats each slot has). It
+used to run one COUNT query per (template, day) for each. ``week_coverage``
+answers both from a single query: active templates LEFT JOIN the week's
+assignments, grouped by template and day. The same matrix backs the staffing
+heatmap endpoint and the coverage part of ``/api/bootstrap``.
+"""
+from datetime import datetime
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+from sqlalchemy import and_, func, select
+from sqlalchemy.orm import Session
+import models
+
+DAY_NAMES = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+
+class SlotStaffing(NamedTuple):
+    required: int
+    assigned: int
+
+    @property
+    def missing(self) -> int:
+        return max(0, self.required - self.assigned)
+
+
+class WeekCoverage:
+    """Staffing of every active (template, day) slot in one week."""
+
+    def __init__(self, week_start_date: datetime, templates: Iterable, counts: Dict[Tuple[int, int], int]):
+        self.week_start_date = week_start_date
+        self.templates = list(templates)
+        self.slots: Dict[Tuple[int, int], SlotStaffing] = {}
+        for template in self.templates:
+            for day in sorted(template.days_of_week or ()):
+                self.slots[(template.id, day)] = SlotStaffing(template.required_staff, counts.get((template.id, day), 0))
+
+    def missing(self, template_id: int, day: int) -> int:
+        slot = self.slots.get((template_id, day))
+        return slot.missing if slot is not None else 0
+
+    def understaffed_templates(self) -> List:
+        return [t for t in self.templates if any(self.missing(t.id, day) for day in (t.days_of_week or ()))]
+
+    @property
+    def total_missing(self) -> int:
+        return sum(slot.missing for slot in self.slots.values())
+
+    @property
+    def fully_staffed(self) -> bool:
+        return self.total_missing == 0
+
+    def slot_list(self) -> List[Dict]:
+        """Flat list of slots (bootstrap and schemas.SlotCoverage form)."""
+        return [
+            {
+                "shift_template_id": template_id,
+                "day_of_week": day,
+                "required": slot.required,
+                "assigned": slot.assigned,
+                "missing": slot.missing
+            }
+            for (template_id, day), slot in self.slots.items()
+        ]
+
+    def matrix(self) -> Dict:
+        """Template rows x day cells for the staffing heatmap."""
+        rows = []
+        for template in self.templates:
+            cells = []
+            for day in sorted(template.days_of_week or ()):
+                slot = self.slots[(template.id, day)]
+                cells.append({
+                    "day_of_week": day,
+                    "day_name": DAY_NAMES[day],
+                    "required": slot.required,
+                    "assigned": slot.assigned,
+                    "missing": slot.missing
+                })
+            rows.append({"shift_template_id": template.id, "shift_name": template.name, "days": cells})
+        return {
+            "week_start_date": self.week_start_date.date().isoformat(),
+            "templates": rows,
+            "total_required": sum(slot.required for slot in self.slots.values()),
+            "total_assigned": sum(min(slot.assigned, slot.required) for slot in self.slots.values()),
+            "total_missing": self.total_missing
+        }
+
+
+class _TemplateRow(NamedTuple):
+    id: int
+    name: str
+    days_of_week: Tuple[int, ...]
+    required_staff: int
+
+
+def week_coverage(db: Session, week_start_date: datetime, template_ids: Optional[Iterable[int]] = None) -> WeekCoverage:
+    """Coverage of the active templates (optionally only template_ids) from one GROUP BY query."""
+    T = models.ShiftTemplate
+    WA = models.WeekAssignment
+    stmt = (
+        select(T.id, T.name, T.days_of_week, T.required_staff, WA.day_of_week, func.count(WA.id))
+        .select_from(T)
+        .outerjoin(WA, and_(WA.shift_template_id == T.id, models.week_start_filter(week_start_date)))
+        .where(T.is_active == True)
+        .group_by(T.id, WA.day_of_week)
+        .order_by(T.id)
+    )
+    if template_ids is not None:
+        stmt = stmt.where(T.id.in_(list(template_ids)))
+
+    templates = {}
+    counts = {}
+    for template_id, name, days, required, day, assigned in db.execute(stmt):
+        if template_id not in templates:
+            templates[template_id] = _TemplateRow(template_id, name, tuple(days or ()), required)
+        if day is not None:
+            counts[(template_id, day)] = assigned
+    return WeekCoverage(week_start_date, templates.values(), counts)
+
+
+def coverage_from_assignments(week_start_date: datetime, templates: Iterable, assignments: Iterable) -> WeekCoverage:
+    """Same matrix from assignment rows that are already loaded (no query)."""
+    counts = {}
+    for a in assignments:
+        key = (a.shift_template_id, a.day_of_week)
+        counts[key] = counts.get(key, 0) + 1
+    return WeekCoverage(week_start_date, templates, counts)
@@ -1,17 +1,75 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
+import threading
+from typing import Optional
 from dotenv import load_dotenv
 
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./shift_organizer.db")
-
-engine = create_engine(
-    DATABASE_URL, connect_args={"check_same_thread": False}
+# Same database through the aiosqlite driver for the async read endpoints
+ASYNC_DATABASE_URL = os.getenv(
+    "ASYNC_DATABASE_URL",
+    DATABASE_URL.replace("sqlite://", "sqlite+aiosqlite://", 1)
 )
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def _configure_sqlite(dbapi_connection, connection_record):
+    # WAL lets dashboard reads proceed while a scheduling run is writing
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA busy_timeout=5000")
+    cursor.close()
+
+def create_engines(database_url: str, async_database_url: Optional[str] = None):
+    """Sync and async engines plus session factories for one database."""
+    if async_database_url is None:
+        async_database_url = database_url.replace("sqlite://", "sqlite+aiosqlite://", 1)
+    sync_engine = create_engine(database_url, connect_args={"check_same_thread": False})
+    session_factory = sessionmaker(autocommit=False, autoflush=False, bind=sync_engine)
+    async_engine = create_async_engine(async_database_url)
+    async_session_factory = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+    if database_url.startswith("sqlite"):
+        event.listen(sync_engine, "connect", _configure_sqlite)
+        event.listen(async_engine.sync_engine, "connect", _configure_sqlite)
+    return sync_engine, session_factory, async_engine, async_session_factory
+
+def database_path(bind) -> Optional[str]:
+    """Absolute path of the SQLite file behind an engine or session (None for other databases).
+
+    Caches kept next to the database key on this, so every site gets its own.
+    """
+    url = getattr(bind, "bind", bind).url  # Session/AsyncSession -> their engine
+    if not url.drivername.startswith("sqlite") or not url.database or url.database == ":memory:":
+        return None
+    return os.path.abspath(url.database)
+
+class PerDatabase:
+    """Registry holding one object (a cache, a store) per database file, created on first use."""
+
+    def __init__(self, factory):
+        self._factory = factory  # path (or None) -> object
+        self._items = {}
+        self._lock = threading.Lock()
+
+    def for_bind(self, bind):
+        path = database_path(bind)
+        item = self._items.get(path)
+        if item is None:
+            with self._lock:
+                item = self._items.get(path)
+                if item is None:
+                    item = self._items[path] = self._factory(path)
+        return item
+
+    def forget(self, bind):
+        """Drop the object for a database that is being closed (e.g. an evicted site)."""
+        with self._lock:
+            self._items.pop(database_path(bind), None)
+
+engine, SessionLocal, async_engine, AsyncSessionLocal = create_engines(DATABASE_URL, ASYNC_DATABASE_URL)
 
 Base = declarative_base()
 
@@ -21,3 +79,7 @@ def get_db():
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
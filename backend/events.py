@@ -0,0 +1,177 @@
+"""In-process change feed.
+
+Write paths publish compact delta events after they commit (assignments added
+or removed, staff, template, availability and preference changes) and
+``GET /api/events`` streams them to browsers as server-sent events, so open
+clients can patch their local state instead of refetching whole weeks.
+
+``publish`` may be called from any thread (sync endpoints run in the
+threadpool, scheduling in its own executor); delivery is handed to each
+subscriber's event loop with ``call_soon_threadsafe``. Assignment events carry
+the week they belong to and only reach subscribers watching that week (or all
+weeks); roster events go to everyone. A subscriber that falls more than
+``QUEUE_SIZE`` events behind gets a single ``resync`` event instead and should
+reload.
+
+The last ``REPLAY_SIZE`` events are kept so a reconnecting EventSource (which
+sends ``Last-Event-ID``) gets what it missed. Ids start from the boot time in
+milliseconds, so after a restart an old id is recognised as too old and the
+client is told to resync.
+
+Events are tagged with the site of the request (or job) that published them
+(``sites.current_site_id``) and only reach subscribers of that site.
+
+The broker lives in one process: with several uvicorn workers a client only
+sees changes made through the worker it is connected to.
+"""
+import asyncio
+import json
+import threading
+import time
+from collections import deque
+from datetime import date, datetime
+from typing import Callable, Dict, Iterable, List, Optional
+from sites import current_site_id
+
+QUEUE_SIZE = 1000
+REPLAY_SIZE = 1000
+KEEPALIVE_SECONDS = 15
+
+
+def _week_key(week_start_date) -> str:
+    """Same day-of-week_start_date matching as models.week_start_filter."""
+    if isinstance(week_start_date, datetime):
+        week_start_date = week_start_date.date()
+    return week_start_date.isoformat()
+
+
+def _iso(value):
+    return value.isoformat() if isinstance(value, (date, datetime)) else value
+
+
+def assignment_payload(assignment) -> Dict:
+    """Compact JSON form of a WeekAssignment row."""
+    return {
+        "id": assignment.id,
+        "staff_id": assignment.staff_id,
+        "shift_template_id": assignment.shift_template_id,
+        "week_start_date": _iso(assignment.week_start_date),
+        "day_of_week": assignment.day_of_week,
+        "shift_date": _iso(assignment.shift_date),
+        "start_at": _iso(assignment.start_at),
+        "end_at": _iso(assignment.end_at),
+    }
+
+
+class Subscription:
+    def __init__(self, loop: asyncio.AbstractEventLoop, site: str, week: Optional[str]):
+        self.loop = loop
+        self.site = site
+        self.week = week
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self.overflowed = False
+
+    def deliver(self, event: Dict):
+        # Runs on the subscriber's loop
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait({"type": "resync"})
+
+    async def next_event(self, timeout: float) -> Optional[Dict]:
+        """Next event, or None if nothing arrived within timeout."""
+        try:
+            event = await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        if event["type"] == "resync":
+            self.overflowed = False
+        return event
+
+
+def _matches(subscription: Subscription, site: str, event: Dict) -> bool:
+    if site != subscription.site:
+        return False
+    event_week = event.get("week_start_date")
+    return subscription.week is None or event_week is None or event_week == subscription.week
+
+
+class ChangeBroker:
+    def __init__(self):
+        self._subscriptions: List[Subscription] = []
+        self._lock = threading.Lock()
+        self._next_id = int(time.time() * 1000)
+        self._recent = deque(maxlen=REPLAY_SIZE)  # (site, event)
+        self._listeners: List[Callable[[str, Dict], None]] = []
+
+    def add_listener(self, callback: Callable[[str, Dict], None]):
+        """Call callback(site, event) in the publishing thread for every event (e.g. to drop cached results)."""
+        self._listeners.append(callback)
+
+    def subscribe(self, week: Optional[str] = None, last_event_id: Optional[int] = None) -> Subscription:
+        """Register a subscriber for the current site on the running event loop
+        (week is YYYY-MM-DD or None for all weeks).
+
+        With last_event_id, events published after it are queued first (or a
+        resync if they are no longer kept).
+        """
+        subscription = Subscription(asyncio.get_running_loop(), current_site_id.get(), week)
+        with self._lock:
+            self._subscriptions.append(subscription)
+            if last_event_id is not None:
+                oldest = self._recent[0][1]["id"] if self._recent else self._next_id
+                if last_event_id + 1 < oldest:
+                    backlog = [{"type": "resync"}]
+                else:
+                    backlog = [e for site, e in self._recent if e["id"] > last_event_id and _matches(subscription, site, e)]
+                for event in backlog:
+                    subscription.deliver(event)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            if subscription in self._subscriptions:
+                self._subscriptions.remove(subscription)
+
+    def publish(self, event_type: str, week_start_date=None, **data):
+        """Send an event to every matching subscriber of the current site. Call after the change is committed."""
+        week = _week_key(week_start_date) if week_start_date is not None else None
+        site = current_site_id.get()
+        with self._lock:
+            event = {"id": self._next_id, "type": event_type, **({"week_start_date": week} if week else {}), **data}
+            self._next_id += 1
+            self._recent.append((site, event))
+            subscriptions = list(self._subscriptions)
+        for listener in self._listeners:
+            listener(site, event)
+        for subscription in subscriptions:
+            if not _matches(subscription, site, event):
+                continue
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, event)
+            except RuntimeError:
+                # Loop already closed; the stream's cleanup will unsubscribe it
+                pass
+
+    def assignments_added(self, week_start_date, payloads: List[Dict]):
+        """payloads come from assignment_payload, built before commit expires the rows."""
+        if payloads:
+            self.publish("assignments.added", week_start_date, assignments=payloads)
+
+    def assignments_removed(self, week_start_date, assignment_ids: Iterable[int]):
+        ids = list(assignment_ids)
+        if ids:
+            self.publish("assignments.removed", week_start_date, assignment_ids=ids)
+
+
+def format_sse(event: Dict) -> str:
+    event_id = f"id: {event['id']}\n" if "id" in event else ""
+    return f"{event_id}event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+
+change_feed = ChangeBroker()
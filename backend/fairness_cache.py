@@ -0,0 +1,152 @@
+"""Shared results for ``/api/fairness/all``.
+
+The fairness dashboard asks for the same window every time its slider moves,
+often from several browsers at once, and every request used to recompute
+``calculate_fairness_score`` for all staff. ``FairnessCache`` makes such
+bursts cost one computation:
+
+- Requests are keyed by site, the window normalized to whole days
+  (``normalize_window``, which ``calculate_fairness_score`` also uses, so
+  a cached result equals a fresh one) and the data version. Identical requests that
+  arrive while one is being computed wait for that result (single flight)
+  instead of starting their own. Its errors are theirs too, but if the
+  computing request is cancelled one of the waiters computes instead.
+- Finished results are kept for ``FAIRNESS_CACHE_TTL_SECONDS`` (default 30)
+  in an LRU of ``FAIRNESS_CACHE_SIZE`` (default 64) windows.
+- Assignment, preference, staff and template change events for a site drop
+  its results, including a computation still running (it is not stored and
+  later requests start afresh). Preference writes in other workers change
+  the data version in the key; their assignment writes are picked up within
+  the TTL.
+"""
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+from events import change_feed
+
+FAIRNESS_CACHE_TTL_SECONDS = float(os.getenv("FAIRNESS_CACHE_TTL_SECONDS", "30"))
+FAIRNESS_CACHE_SIZE = int(os.getenv("FAIRNESS_CACHE_SIZE", "64"))
+DEFAULT_PERIOD_DAYS = 30
+
+# Change events that can alter fairness figures
+INVALIDATING_EVENTS = ("assignments.", "preference.", "staff.", "template.", "resync")
+
+
+def normalize_window(
+    period_days: Optional[int] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    now: Optional[datetime] = None
+) -> Tuple[datetime, datetime]:
+    """Fairness window: start_date/end_date if both are given, else ±period_days (default 30) around now.
+
+    The ±period_days window is rounded inwards to UTC midnights so every
+    request made during a day gets the same window (and cache key).
+    calculate_fairness_score takes its window from here too. Stored week
+    starts are not always midnights (the frontend sends local midnight as
+    UTC, so a Monday can be Sunday evening), which is why the rounding has
+    to be shared rather than assumed to select the same weeks as the
+    unrounded window.
+    """
+    if start_date is not None and end_date is not None:
+        return start_date, end_date
+    now = now or datetime.utcnow()
+    days = timedelta(days=period_days if period_days is not None else DEFAULT_PERIOD_DAYS)
+    past, future = now - days, now + days
+    start = datetime.combine(past.date(), datetime.min.time())
+    if start < past:
+        start += timedelta(days=1)
+    return start, datetime.combine(future.date(), datetime.min.time())
+
+
+class FairnessCache:
+    """Single-flight TTL/LRU cache of per-window fairness results."""
+
+    def __init__(self, ttl_seconds: float = FAIRNESS_CACHE_TTL_SECONDS, max_entries: int = FAIRNESS_CACHE_SIZE):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[tuple, Tuple[float, object]]" = OrderedDict()  # key -> (expires, result)
+        self._inflight: Dict[tuple, Future] = {}
+        self._generations: Dict[str, int] = {}  # site -> invalidation count
+        self._lock = threading.Lock()
+
+    async def get(self, site: str, window: Tuple[datetime, datetime], version: int,
+                  compute: Callable[[], Awaitable[object]]):
+        """Cached result for the key, the in-flight one, or compute() (whose result is shared)."""
+        key = (site, window, version)
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    if entry[0] > time.monotonic():
+                        self._entries.move_to_end(key)
+                        return entry[1]
+                    del self._entries[key]
+                future = self._inflight.get(key)
+                leader = future is None
+                if leader:
+                    # concurrent.futures so waiters on any event loop can await it
+                    future = self._inflight[key] = Future()
+                    generation = self._generations.get(site, 0)
+            if leader:
+                break
+
+            try:
+                # Shielded: a waiter going away must not cancel the shared future
+                return await asyncio.shield(asyncio.wrap_future(future))
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise  # This request was cancelled
+                # The leader's request was cancelled; go again (one waiter becomes the leader)
+
+        try:
+            result = await compute()
+        except Exception as e:
+            self._drop_inflight(key, future)
+            future.set_exception(e)
+            raise
+        except BaseException:
+            # Cancelled (e.g. the client went away): not the waiters' failure, they retry
+            self._drop_inflight(key, future)
+            future.cancel()
+            raise
+
+        with self._lock:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+            if self._generations.get(site, 0) == generation:
+                self._entries[key] = (time.monotonic() + self.ttl_seconds, result)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        future.set_result(result)
+        return result
+
+    def _drop_inflight(self, key: tuple, future: Future):
+        with self._lock:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    def invalidate(self, site: str):
+        """Drop a site's results; computations already running are not stored."""
+        with self._lock:
+            self._generations[site] = self._generations.get(site, 0) + 1
+            for key in [k for k in self._entries if k[0] == site]:
+                del self._entries[key]
+            for key in [k for k in self._inflight if k[0] == site]:
+                del self._inflight[key]
+
+
+fairness_cache = FairnessCache()
+
+
+def _on_change(site: str, event: Dict):
+    if event["type"].startswith(INVALIDATING_EVENTS):
+        fairness_cache.invalidate(site)
+
+
+change_feed.add_listener(_on_change)
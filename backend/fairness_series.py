@@ -0,0 +1,118 @@
+"""Per-staff, per-week fairness time series.
+
+``/api/fairness/all`` returns one aggregate per call and re-scores every
+assignment with ``get_preference_score``. For trend views the dashboard needs
+the same figures week by week, so ``compute_fairness_timeseries`` buckets a
+range of weeks in one grouped query (plus the archived rollups) and returns,
+for every staff member, the weekly values and their prefix sums. Any
+sub-window total is then ``prefix[j + 1] - prefix[i]``, so the client can
+re-slice the range without asking again.
+"""
+import logging
+from datetime import date, datetime, timedelta
+from typing import Dict, List
+from sqlalchemy import case, func, select
+from sqlalchemy.orm import Session
+import models
+from archive import AVOIDED_SCORE, PREFERRED_SCORE
+
+logger = logging.getLogger(__name__)
+
+MAX_SERIES_WEEKS = 520
+SERIES_FIELDS = ("shift_counts", "preference_sums", "preferred_counts", "avoided_counts")
+
+
+def nearest_monday(day: date) -> date:
+    """Week a stored week_start_date belongs to.
+
+    The frontend sends local midnight as UTC, so a Monday can be stored as
+    Sunday evening; rounding to the nearest Monday puts it in the right week.
+    """
+    return day + timedelta(days=(7 - day.weekday()) % 7 if day.weekday() >= 4 else -day.weekday())
+
+
+def prefix_sums(values: List[float]) -> List[float]:
+    sums = [0]
+    for value in values:
+        sums.append(round(sums[-1] + value, 6))
+    return sums
+
+
+def compute_fairness_timeseries(db: Session, start_week: date, end_week: date, staff) -> Dict:
+    """Weekly fairness figures for every staff member for the weeks start_week..end_week (Mondays)."""
+    start_week = nearest_monday(start_week)
+    end_week = nearest_monday(end_week)
+    weeks = [start_week + timedelta(weeks=i) for i in range((end_week - start_week).days // 7 + 1)]
+    week_index = {week: i for i, week in enumerate(weeks)}
+
+    # Any stored value that rounds to a week in range
+    range_start = datetime.combine(start_week - timedelta(days=3), datetime.min.time())
+    range_end = datetime.combine(end_week + timedelta(days=4), datetime.min.time())
+
+    WA = models.WeekAssignment
+    # First matching preference, like get_preference_score
+    score = func.coalesce(
+        select(models.Preference.preference_score).where(
+            models.Preference.staff_id == WA.staff_id,
+            models.Preference.shift_template_id == WA.shift_template_id,
+            models.Preference.day_of_week == WA.day_of_week
+        ).limit(1).correlate(WA).scalar_subquery(),
+        0.0
+    )
+    scored = select(
+        WA.staff_id.label("staff_id"),
+        func.date(WA.week_start_date).label("day"),
+        score.label("score")
+    ).where(WA.week_start_date >= range_start, WA.week_start_date < range_end).subquery()
+
+    live = db.execute(
+        select(
+            scored.c.staff_id,
+            scored.c.day,
+            func.count(),
+            func.sum(scored.c.score),
+            func.sum(case((scored.c.score > PREFERRED_SCORE, 1), else_=0)),
+            func.sum(case((scored.c.score < AVOIDED_SCORE, 1), else_=0))
+        ).group_by(scored.c.staff_id, scored.c.day)
+    ).all()
+
+    R = models.StaffWeekRollup
+    archived = db.query(
+        R.staff_id,
+        func.date(R.week_start_date),
+        func.sum(R.shift_count),
+        func.sum(R.preference_sum),
+        func.sum(R.preferred_count),
+        func.sum(R.avoided_count)
+    ).filter(R.week_start_date >= range_start, R.week_start_date < range_end).group_by(
+        R.staff_id, func.date(R.week_start_date)
+    ).all()
+
+    series = {}  # staff_id -> {field: [value per week]}
+    for staff_id, day, shifts, preference_sum, preferred, avoided in list(live) + list(archived):
+        index = week_index.get(nearest_monday(date.fromisoformat(day)))
+        if index is None:
+            continue
+        entry = series.setdefault(staff_id, {field: [0] * len(weeks) for field in SERIES_FIELDS})
+        entry["shift_counts"][index] += shifts
+        entry["preference_sums"][index] += preference_sum or 0.0
+        entry["preferred_counts"][index] += preferred
+        entry["avoided_counts"][index] += avoided
+
+    results = []
+    for member in staff:
+        entry = series.get(member.id) or {field: [0] * len(weeks) for field in SERIES_FIELDS}
+        entry["preference_sums"] = [round(value, 6) for value in entry["preference_sums"]]
+        results.append({
+            "staff_id": member.id,
+            "staff_name": member.name,
+            **entry,
+            "prefix": {field: prefix_sums(entry[field]) for field in SERIES_FIELDS}
+        })
+
+    logger.debug("Fairness time series for %d weeks, %d staff (%d live groups, %d archived)", len(weeks), len(results), len(live), len(archived))
+
+    return {
+        "weeks": [week.isoformat() for week in weeks],
+        "staff": results
+    }
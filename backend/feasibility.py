@@ -0,0 +1,276 @@
+"""Week feasibility pre-check using bipartite max-flow.
+
+The greedy scheduler can leave slots unfilled either because of the order in
+which it fills them or because the week genuinely cannot be staffed. This
+module answers the second question before anything is written: it builds a
+flow network
+
+    source -> (template, day) slot -> (staff, day) -> staff -> sink
+
+where slot capacities are the missing headcount, slot -> staff-day edges exist
+only where the hard constraints allow the pairing, and staff -> sink edges are
+capped by the remaining ``max_shifts_per_week``. The max-flow value is an upper
+bound on what any assignment can achieve, so ``demand - max_flow`` is a
+provable lower bound on unfilled slots.
+
+Qualification minimums are checked separately, per slot, against the staff
+who hold each qualification and may take the slot.
+"""
+import logging
+from collections import deque
+from datetime import datetime
+from typing import Dict, List
+from sqlalchemy.orm import Session
+import models
+from constraints import ConstraintTable, REASON_OK
+
+logger = logging.getLogger(__name__)
+
+DAY_NAMES = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+
+class FlowNetwork:
+    """Dinic max-flow over integer capacities using flat edge arrays."""
+
+    def __init__(self, node_count: int):
+        self.node_count = node_count
+        self.adjacency = [[] for _ in range(node_count)]
+        self.to = []
+        self.capacity = []
+
+    def add_edge(self, u: int, v: int, capacity: int) -> int:
+        """Add edge u -> v and its residual twin. Returns the forward edge index."""
+        index = len(self.to)
+        self.adjacency[u].append(index)
+        self.to.append(v)
+        self.capacity.append(capacity)
+        self.adjacency[v].append(index + 1)
+        self.to.append(u)
+        self.capacity.append(0)
+        return index
+
+    def _bfs_levels(self, source: int, sink: int):
+        level = [-1] * self.node_count
+        level[source] = 0
+        queue = deque([source])
+        to, capacity, adjacency = self.to, self.capacity, self.adjacency
+        while queue:
+            u = queue.popleft()
+            for e in adjacency[u]:
+                v = to[e]
+                if capacity[e] > 0 and level[v] < 0:
+                    level[v] = level[u] + 1
+                    queue.append(v)
+        return level if level[sink] >= 0 else None
+
+    def _push_blocking_flow(self, source: int, sink: int, level: List[int]) -> int:
+        # Iterative DFS so large networks don't hit the recursion limit
+        to, capacity, adjacency = self.to, self.capacity, self.adjacency
+        next_edge = [0] * self.node_count
+        total = 0
+        while True:
+            path = []
+            u = source
+            while u != sink:
+                edges = adjacency[u]
+                advanced = False
+                while next_edge[u] < len(edges):
+                    e = edges[next_edge[u]]
+                    v = to[e]
+                    if capacity[e] > 0 and level[v] == level[u] + 1:
+                        path.append(e)
+                        u = v
+                        advanced = True
+                        break
+                    next_edge[u] += 1
+                if not advanced:
+                    if u == source:
+                        return total
+                    # Dead end: retreat and skip the edge that led here
+                    level[u] = -1
+                    e = path.pop()
+                    u = to[e ^ 1]
+                    next_edge[u] += 1
+            pushed = min(capacity[e] for e in path)
+            for e in path:
+                capacity[e] -= pushed
+                capacity[e ^ 1] += pushed
+            total += pushed
+
+    def max_flow(self, source: int, sink: int) -> int:
+        flow = 0
+        while True:
+            level = self._bfs_levels(source, sink)
+            if level is None:
+                return flow
+            flow += self._push_blocking_flow(source, sink, level)
+
+    def reachable_from(self, source: int) -> List[bool]:
+        """Nodes on the source side of the minimum cut (after max_flow)."""
+        seen = [False] * self.node_count
+        seen[source] = True
+        queue = deque([source])
+        while queue:
+            u = queue.popleft()
+            for e in self.adjacency[u]:
+                v = self.to[e]
+                if self.capacity[e] > 0 and not seen[v]:
+                    seen[v] = True
+                    queue.append(v)
+        return seen
+
+
+def compute_week_feasibility(
+    db: Session,
+    table: ConstraintTable = None,
+    shift_templates: List[models.ShiftTemplate] = None,
+    week_start_date: datetime = None
+) -> Dict:
+    """Compute maximum achievable coverage for a week without writing anything.
+
+    Pass a compiled ConstraintTable to reuse the engine's constraints, or a
+    week_start_date to compile one here.
+    """
+    if table is None:
+        table = ConstraintTable.compile(db, week_start_date)
+    week_date_only = table.week_start_date.date()
+
+    if shift_templates is None:
+        shift_templates = [t for t in table.templates if t.is_active]
+    all_staff = table.staff
+    week_counts = table.week_counts
+    assigned_per_slot = table.assigned_per_slot
+
+    # Node layout: source, sink, slots, staff-days, staff
+    slots = []
+    for template in shift_templates:
+        for day in template.days_of_week:
+            missing = template.required_staff - assigned_per_slot.get((template.id, day), 0)
+            if missing > 0:
+                slots.append((template, day, missing))
+
+    source, sink = 0, 1
+    next_node = 2
+    slot_nodes = list(range(next_node, next_node + len(slots)))
+    next_node += len(slots)
+    staff_nodes = {}
+    for staff in all_staff:
+        staff_nodes[staff.id] = next_node
+        next_node += 1
+    staff_day_nodes = {}
+    staff_day_templates = {}  # (staff_id, day) -> number of eligible slots that day
+
+    eligible_counts = []
+    edges_by_slot = []
+    for template, day, missing in slots:
+        eligible = []
+        for staff in all_staff:
+            # Covers availability, weekly cap and any shift already held that day
+            if table.reason(staff.id, template.id, day) != REASON_OK:
+                continue
+            eligible.append(staff.id)
+            key = (staff.id, day)
+            if key not in staff_day_nodes:
+                staff_day_nodes[key] = next_node
+                next_node += 1
+            staff_day_templates[key] = staff_day_templates.get(key, 0) + 1
+        eligible_counts.append(len(eligible))
+        edges_by_slot.append(eligible)
+
+    network = FlowNetwork(next_node)
+    source_edges = []
+    for index, (template, day, missing) in enumerate(slots):
+        source_edges.append(network.add_edge(source, slot_nodes[index], missing))
+        for staff_id in edges_by_slot[index]:
+            network.add_edge(slot_nodes[index], staff_day_nodes[(staff_id, day)], 1)
+
+    # Double shifts inside one run are allowed (only penalised), so a staff-day
+    # can absorb one unit per eligible template that day
+    for (staff_id, day), node in staff_day_nodes.items():
+        network.add_edge(node, staff_nodes[staff_id], staff_day_templates[(staff_id, day)])
+
+    staff_sink_edges = {}
+    for staff in all_staff:
+        remaining = max(0, staff.max_shifts_per_week - week_counts.get(staff.id, 0))
+        staff_sink_edges[staff.id] = network.add_edge(staff_nodes[staff.id], sink, remaining)
+
+    demand = sum(missing for _, _, missing in slots)
+    max_coverage = network.max_flow(source, sink)
+    source_side = network.reachable_from(source)
+
+    bottlenecks = []
+    by_template = {}
+    by_day = {}
+    for index, (template, day, missing) in enumerate(slots):
+        filled = missing - network.capacity[source_edges[index]]
+        shortfall = missing - filled
+        if shortfall <= 0:
+            continue
+        bottlenecks.append({
+            "shift_template_id": template.id,
+            "shift_name": template.name,
+            "day_of_week": day,
+            "day_name": DAY_NAMES[day],
+            "missing": missing,
+            "max_fillable": filled,
+            "eligible_staff": eligible_counts[index]
+        })
+        entry = by_template.setdefault(template.id, {"shift_template_id": template.id, "shift_name": template.name, "shortfall": 0})
+        entry["shortfall"] += shortfall
+        by_day[day] = by_day.get(day, 0) + shortfall
+
+    # Per-qualification minimums: enough eligible holders for each slot? The
+    # inverted index keeps this to the holders of each required qualification.
+    qualifications = table.qualifications
+    qualification_shortages = []
+    for template in shift_templates:
+        requirements = qualifications.requirements.get(template.id, ())
+        if not requirements:
+            continue
+        for day in template.days_of_week:
+            coverage = table.slot_coverage(template.id, day)
+            for bit, needed in coverage.deficits.items():
+                if needed <= 0:
+                    continue
+                eligible_holders = sum(
+                    1 for staff_id in qualifications.holders[bit]
+                    if staff_id in staff_nodes and table.reason(staff_id, template.id, day) == REASON_OK
+                )
+                available = min(eligible_holders, max(coverage.seats, 0))
+                if available < needed:
+                    qualification_shortages.append({
+                        "shift_template_id": template.id,
+                        "shift_name": template.name,
+                        "day_of_week": day,
+                        "day_name": DAY_NAMES[day],
+                        "qualification": qualifications.names[bit],
+                        "needed": needed,
+                        "eligible_holders": eligible_holders,
+                        "shortfall": needed - available
+                    })
+
+    # Staff whose weekly cap is a cut edge are the ones limiting coverage
+    capped_staff = [
+        staff.id for staff in all_staff
+        if source_side[staff_nodes[staff.id]]
+        and network.capacity[staff_sink_edges[staff.id]] == 0
+        and staff.max_shifts_per_week - week_counts.get(staff.id, 0) > 0
+    ]
+
+    logger.debug("Feasibility for week %s: demand=%d, max coverage=%d", week_date_only, demand, max_coverage)
+
+    return {
+        "week_start_date": week_date_only.isoformat(),
+        "demand": demand,
+        "max_coverage": max_coverage,
+        "min_unfilled": demand - max_coverage,
+        "fully_staffable": max_coverage == demand and not qualification_shortages,
+        "bottlenecks": bottlenecks,
+        "bottleneck_templates": sorted(by_template.values(), key=lambda x: -x["shortfall"]),
+        "bottleneck_days": [
+            {"day_of_week": day, "day_name": DAY_NAMES[day], "shortfall": shortfall}
+            for day, shortfall in sorted(by_day.items(), key=lambda x: -x[1])
+        ],
+        "capped_staff_ids": capped_staff,
+        "qualification_shortages": qualification_shortages
+    }
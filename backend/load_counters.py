@@ -0,0 +1,116 @@
+"""Per-staff weekly shift counters.
+
+``staff_week_load`` holds one row per (staff, week) with the number of
+assignments that staff member has that week. Every path that inserts or
+deletes ``WeekAssignment`` rows adjusts the counters in the same transaction,
+so weekly cap checks become dictionary lookups and the ±30 day workload term
+is a sum over a few rows instead of a COUNT(*) per staff member.
+"""
+from datetime import datetime
+from typing import Dict, Tuple
+from sqlalchemy import func, or_
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+import models
+
+
+def week_key(week_start_date: datetime) -> datetime:
+    """Counters are keyed by the midnight of the week's start date."""
+    return datetime.combine(week_start_date.date(), datetime.min.time())
+
+
+def adjust_week_loads(db: Session, week_start_date: datetime, deltas: Dict[int, int]):
+    """Add per-staff deltas to a week's counters. Does not commit."""
+    rows = [
+        {"staff_id": staff_id, "week_start_date": week_key(week_start_date), "shift_count": delta}
+        for staff_id, delta in deltas.items() if delta
+    ]
+    if not rows:
+        return
+    stmt = sqlite_insert(models.StaffWeekLoad)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["staff_id", "week_start_date"],
+        set_={"shift_count": models.StaffWeekLoad.shift_count + stmt.excluded.shift_count}
+    )
+    db.execute(stmt, rows)
+
+
+def adjust_week_load(db: Session, staff_id: int, week_start_date: datetime, delta: int):
+    """Add delta to one staff member's counter for a week. Does not commit."""
+    adjust_week_loads(db, week_start_date, {staff_id: delta})
+
+
+def count_by_staff(assignments) -> Dict[int, int]:
+    """Per-staff counts for a list of WeekAssignment rows (used before bulk deletes)."""
+    counts = {}
+    for assignment in assignments:
+        counts[assignment.staff_id] = counts.get(assignment.staff_id, 0) + 1
+    return counts
+
+
+def get_week_loads(db: Session, week_start_date: datetime) -> Dict[int, int]:
+    """staff_id -> shifts in the given week."""
+    rows = db.query(models.StaffWeekLoad.staff_id, models.StaffWeekLoad.shift_count).filter(
+        models.StaffWeekLoad.week_start_date == week_key(week_start_date)
+    ).all()
+    return {staff_id: count for staff_id, count in rows}
+
+
+def get_loads(
+    db: Session,
+    week_start_date: datetime,
+    window_start: datetime,
+    window_end: datetime
+) -> Tuple[Dict[int, int], Dict[int, int]]:
+    """One range scan returning (this week's counts, window totals) per staff_id."""
+    this_week = week_key(week_start_date)
+    rows = db.query(
+        models.StaffWeekLoad.staff_id,
+        models.StaffWeekLoad.week_start_date,
+        models.StaffWeekLoad.shift_count
+    ).filter(or_(
+        models.StaffWeekLoad.week_start_date == this_week,
+        models.StaffWeekLoad.week_start_date.between(window_start, window_end)
+    )).all()
+
+    week_counts = {}
+    window_totals = {}
+    for staff_id, week, count in rows:
+        if week == this_week:
+            week_counts[staff_id] = week_counts.get(staff_id, 0) + count
+        if window_start <= week <= window_end:
+            window_totals[staff_id] = window_totals.get(staff_id, 0) + count
+    return week_counts, window_totals
+
+
+def rebuild_week_loads(db: Session):
+    """Recompute every counter from week_assignment plus archived rollups (for databases created before the table existed)."""
+    db.query(models.StaffWeekLoad).delete()
+    grouped = db.query(
+        models.WeekAssignment.staff_id,
+        func.date(models.WeekAssignment.week_start_date),
+        func.count(models.WeekAssignment.id)
+    ).group_by(models.WeekAssignment.staff_id, func.date(models.WeekAssignment.week_start_date)).all()
+    archived = db.query(
+        models.StaffWeekRollup.staff_id,
+        func.date(models.StaffWeekRollup.week_start_date),
+        func.sum(models.StaffWeekRollup.shift_count)
+    ).group_by(models.StaffWeekRollup.staff_id, func.date(models.StaffWeekRollup.week_start_date)).all()
+
+    counts = {}
+    for staff_id, day, count in list(grouped) + list(archived):
+        counts[(staff_id, day)] = counts.get((staff_id, day), 0) + count
+    db.add_all([
+        models.StaffWeekLoad(staff_id=staff_id, week_start_date=datetime.fromisoformat(day), shift_count=count)
+        for (staff_id, day), count in counts.items()
+    ])
+    db.commit()
+    print(f"DEBUG: Rebuilt {len(counts)} staff week load counters")
+
+
+def ensure_week_loads(db: Session):
+    """Backfill counters once if assignments exist but no counters do."""
+    if db.query(models.StaffWeekLoad).first() is None and (
+        db.query(models.WeekAssignment).first() is not None or db.query(models.StaffWeekRollup).first() is not None
+    ):
+        rebuild_week_loads(db)
@@ -0,0 +1,334 @@
+"""Local load test: concurrent managers and dashboard users against the API.
+
+Generates a large SQLite database, starts the app on localhost with uvicorn
+and replays the calls frontend/src/api.js makes from many concurrent async
+clients. Reports throughput, p50/p95/p99 latency and error / lock-error
+rates per endpoint. Requests that get no response within
+``--request-timeout`` seconds count as timeouts. If the server then does not
+answer a quick probe either, it has stopped responding: the run stops, the
+report is printed and the script exits with status 1 instead of hanging.
+
+Usage:
+    python loadtest.py --staff 300 --templates 12 --weeks 26 --clients 100 --duration 30
+    python loadtest.py --mix week=50,fairness=25,availability=15,auto=5,clear=5
+
+Everything runs on 127.0.0.1; nothing leaves the machine.
+"""
+import argparse
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+import httpx
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+import models
+import load_counters
+
+DEFAULT_MIX = "week=50,fairness=20,availability=15,auto=10,clear=5"
+DEFAULT_REQUEST_TIMEOUT = 60
+PROBE_TIMEOUT = 5
+
+
+def monday_of(day: datetime) -> datetime:
+    return datetime.combine((day - timedelta(days=day.weekday())).date(), datetime.min.time())
+
+
+def generate_database(path: str, staff_count: int, template_count: int, weeks: int, seed: int):
+    """Create a database with staff, templates, availability, preferences and assignment history."""
+    rng = random.Random(seed)
+    gen_engine = create_engine(f"sqlite:///{path}")
+    models.Base.metadata.create_all(bind=gen_engine)
+    db = sessionmaker(bind=gen_engine)()
+
+    qualifications = ["first_aid", "keyholder", "forklift", "barista"]
+    db.execute(insert(models.Staff), [
+        {
+            "name": f"Staff {i}",
+            "qualifications": rng.sample(qualifications, rng.randint(0, 2)),
+            "max_shifts_per_week": rng.randint(3, 6),
+            "created_at": datetime.utcnow(),
+        }
+        for i in range(staff_count)
+    ])
+    db.execute(insert(models.ShiftTemplate), [
+        {
+            "name": f"Shift {i}",
+            "days_of_week": sorted(rng.sample(range(7), rng.randint(3, 7))),
+            "start_time": f"{6 + (i % 4) * 4:02d}:00",
+            "end_time": f"{10 + (i % 4) * 4:02d}:00",
+            "required_staff": rng.randint(1, 4),
+            "required_qualifications": {},
+            "is_active": True,
+        }
+        for i in range(template_count)
+    ])
+    db.commit()
+
+    staff_ids = [row[0] for row in db.query(models.Staff.id).all()]
+    templates = db.query(models.ShiftTemplate).all()
+
+    availability = []
+    preferences = []
+    for staff_id in staff_ids:
+        for _ in range(rng.randint(0, 6)):
+            template = rng.choice(templates)
+            availability.append({
+                "staff_id": staff_id,
+                "day_of_week": rng.choice(template.days_of_week),
+                "shift_template_id": template.id,
+                "is_available": False,
+            })
+        for _ in range(rng.randint(0, 6)):
+            template = rng.choice(templates)
+            preferences.append({
+                "staff_id": staff_id,
+                "day_of_week": rng.choice(template.days_of_week),
+                "shift_template_id": template.id,
+                "preference_score": rng.choice([-1.0, -0.5, 0.5, 1.0]),
+            })
+    if availability:
+        db.execute(insert(models.Availability), availability)
+    if preferences:
+        db.execute(insert(models.Preference), preferences)
+
+    # History: every slot filled for the past weeks, ending with the current week
+    this_week = monday_of(datetime.utcnow())
+    assignments = []
+    for week in range(weeks):
+        week_start = this_week - timedelta(weeks=weeks - 1 - week)
+        for template in templates:
+            for day in template.days_of_week:
+                shift_date, start_at, end_at = models.shift_times(week_start, day, template.start_time, template.end_time)
+                for staff_id in rng.sample(staff_ids, min(template.required_staff, len(staff_ids))):
+                    assignments.append({
+                        "shift_template_id": template.id,
+                        "staff_id": staff_id,
+                        "week_start_date": week_start,
+                        "day_of_week": day,
+                        "assigned_at": datetime.utcnow(),
+                        "shift_date": shift_date,
+                        "start_at": start_at,
+                        "end_at": end_at,
+                    })
+    for start in range(0, len(assignments), 5000):
+        db.execute(insert(models.WeekAssignment), assignments[start:start + 5000])
+    db.commit()
+    template_days = [(t.id, list(t.days_of_week)) for t in templates]
+    load_counters.rebuild_week_loads(db)
+    db.close()
+    gen_engine.dispose()
+
+    print(f"Generated {path}: {staff_count} staff, {template_count} templates, "
+          f"{len(availability)} availability rows, {len(preferences)} preferences, {len(assignments)} assignments")
+    return staff_ids, template_days
+
+
+class Stats:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+        self.lock_errors: Dict[str, int] = {}
+        self.timeouts: Dict[str, int] = {}
+        self.stuck = False  # The server stopped answering at all
+
+    def record(self, endpoint: str, latency_ms: float, status: int, body: str):
+        self.latencies.setdefault(endpoint, []).append(latency_ms)
+        if status >= 400 or status == 0:
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+            if status == 503 or "locked" in body.lower():
+                self.lock_errors[endpoint] = self.lock_errors.get(endpoint, 0) + 1
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+async def timed(client: httpx.AsyncClient, stats: Stats, endpoint: str, method: str, url: str, **kwargs):
+    started = time.perf_counter()
+    try:
+        response = await client.request(method, url, **kwargs)
+        status, body = response.status_code, response.text if response.status_code >= 400 else ""
+    except httpx.TimeoutException as e:
+        status, body = 0, f"timeout: {e}"
+        stats.timeouts[endpoint] = stats.timeouts.get(endpoint, 0) + 1
+        if not stats.stuck and not await server_responds(str(client.base_url)):
+            stats.stuck = True
+    except httpx.HTTPError as e:
+        status, body = 0, str(e)
+    stats.record(endpoint, (time.perf_counter() - started) * 1000, status, body)
+
+
+async def server_responds(base_url: str) -> bool:
+    """Whether a cheap read still gets an answer (own connection, so a full pool doesn't matter)."""
+    try:
+        async with httpx.AsyncClient(base_url=base_url, timeout=PROBE_TIMEOUT) as probe:
+            return (await probe.get("/api/shift-templates/")).status_code < 500
+    except httpx.HTTPError:
+        return False
+
+
+async def run_client(client, stats, mix, deadline, rng, staff_ids, templates, weeks):
+    operations = [name for name, _ in mix]
+    weights = [weight for _, weight in mix]
+    while time.perf_counter() < deadline and not stats.stuck:
+        operation = rng.choices(operations, weights)[0]
+        week = rng.choice(weeks).strftime("%Y-%m-%d")
+        if operation == "week":
+            # ScheduleView.loadData: one bootstrap call per week view
+            await timed(client, stats, "GET /bootstrap", "GET", "/api/bootstrap", params={"week_start": week})
+        elif operation == "fairness":
+            period = rng.choice([7, 14, 28, 56, 84])
+            await timed(client, stats, "GET /fairness/all", "GET", "/api/fairness/all", params={"period_days": period})
+        elif operation == "availability":
+            template_id, days = rng.choice(templates)
+            await timed(client, stats, "POST /availability/", "POST", "/api/availability/", json={
+                "staff_id": rng.choice(staff_ids),
+                "day_of_week": rng.choice(days),
+                "shift_template_id": template_id,
+                "is_available": rng.random() < 0.5,
+            })
+        elif operation == "auto":
+            await timed(client, stats, "POST /schedule/auto", "POST", "/api/schedule/auto", json={
+                "week_start_date": f"{week}T00:00:00",
+                "clear_existing": False,
+            })
+        elif operation == "clear":
+            await timed(client, stats, "DELETE /assignments/week", "DELETE", f"/api/assignments/week/{week}")
+
+
+async def run_load(base_url, clients, duration, mix, seed, staff_ids, templates, request_timeout=DEFAULT_REQUEST_TIMEOUT):
+    stats = Stats()
+    this_week = monday_of(datetime.utcnow())
+    weeks = [this_week + timedelta(weeks=offset) for offset in range(-4, 9)]
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+    async with httpx.AsyncClient(base_url=base_url, timeout=request_timeout, limits=limits) as client:
+        started = time.perf_counter()
+        deadline = started + duration
+        await asyncio.gather(*[
+            run_client(client, stats, mix, deadline, random.Random(seed + i), staff_ids, templates, weeks)
+            for i in range(clients)
+        ])
+        elapsed = time.perf_counter() - started
+    return stats, elapsed
+
+
+def print_report(stats: Stats, elapsed: float, clients: int):
+    print(f"\n{clients} clients for {elapsed:.1f}s")
+    header = (f"{'endpoint':<28}{'reqs':>8}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+              f"{'err %':>8}{'lock %':>8}{'timeout':>9}")
+    print(header)
+    print("-" * len(header))
+    total = 0
+    for endpoint in sorted(stats.latencies):
+        values = sorted(stats.latencies[endpoint])
+        count = len(values)
+        total += count
+        print(
+            f"{endpoint:<28}{count:>8}{count / elapsed:>9.1f}"
+            f"{percentile(values, 50):>10.1f}{percentile(values, 95):>10.1f}{percentile(values, 99):>10.1f}"
+            f"{100 * stats.errors.get(endpoint, 0) / count:>8.2f}{100 * stats.lock_errors.get(endpoint, 0) / count:>8.2f}"
+            f"{stats.timeouts.get(endpoint, 0):>9}"
+        )
+    print("-" * len(header))
+    print(f"{'total':<28}{total:>8}{total / elapsed:>9.1f}")
+    if stats.stuck:
+        print(f"\nStopped early: the server stopped responding (no answer to a {PROBE_TIMEOUT}s probe after a request timed out)")
+
+
+def wait_for_server(base_url: str, process: subprocess.Popen, timeout: float = 30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("Server exited during startup")
+        try:
+            if httpx.get(f"{base_url}/api/staff/", timeout=2).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.3)
+    raise RuntimeError("Server did not start in time")
+
+
+def parse_mix(text: str):
+    mix = []
+    for part in text.split(","):
+        name, weight = part.split("=")
+        if name not in ("week", "fairness", "availability", "auto", "clear"):
+            raise SystemExit(f"Unknown operation in --mix: {name}")
+        mix.append((name, float(weight)))
+    return mix
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local load test for the shift scheduler API")
+    parser.add_argument("--staff", type=int, default=300)
+    parser.add_argument("--templates", type=int, default=12)
+    parser.add_argument("--weeks", type=int, default=26, help="Weeks of generated assignment history")
+    parser.add_argument("--clients", type=int, default=50, help="Concurrent async clients")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds to run")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"Operation weights (default {DEFAULT_MIX})")
+    parser.add_argument("--request-timeout", type=float, default=DEFAULT_REQUEST_TIMEOUT,
+                        help="Seconds without a response before a request counts as timed out")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--db", help="Reuse or create the database at this path instead of a temp file")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+    db_path = args.db or os.path.join(tempfile.mkdtemp(prefix="shift-loadtest-"), "loadtest.db")
+
+    if os.path.exists(db_path):
+        db = sessionmaker(bind=create_engine(f"sqlite:///{db_path}"))()
+        staff_ids = [row[0] for row in db.query(models.Staff.id).all()]
+        templates = [(t.id, list(t.days_of_week)) for t in db.query(models.ShiftTemplate).filter(models.ShiftTemplate.is_active == True).all()]
+        db.close()
+        print(f"Using existing database {db_path}")
+    else:
+        staff_ids, templates = generate_database(db_path, args.staff, args.templates, args.weeks, args.seed)
+
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{db_path}")
+    env.pop("ASYNC_DATABASE_URL", None)
+    base_url = f"http://127.0.0.1:{args.port}"
+    log_path = db_path + ".server.log"
+    server_log = open(log_path, "w")
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(args.port),
+         "--workers", str(args.workers), "--log-level", "warning"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env,
+        stdout=server_log,
+        stderr=subprocess.STDOUT,
+    )
+    print(f"Server log: {log_path}")
+    try:
+        wait_for_server(base_url, server)
+        stats, elapsed = asyncio.run(run_load(
+            base_url, args.clients, args.duration, mix, args.seed, staff_ids, templates, args.request_timeout
+        ))
+        print_report(stats, elapsed, args.clients)
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+            server.wait()
+        server_log.close()
+    if stats.stuck:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,53 @@
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, Depends, Header, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import List
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional
+from datetime import datetime, timedelta
+import asyncio
+import contextlib
+import contextvars
+import functools
+import json
+import orjson
+import os
+import tempfile
 import models
 import schemas
-from database import engine, get_db
 from scheduler import SchedulingEngine
-
-# Create database tables
-models.Base.metadata.create_all(bind=engine)
+from profiling import profiled
+from reference_cache import reference_cache
+from snapshot import bump_data_version, current_data_version
+from fairness_cache import fairness_cache, normalize_window
+from events import assignment_payload, change_feed, format_sse, KEEPALIVE_SECONDS
+from week_locks import WeekLockedError, week_lock
+from sites import DEFAULT_SITE, SiteDatabase, SiteMiddleware, UnknownSiteError, get_async_db, get_db, get_site, site_registry
+import archive
+import assignment_batch
+import bulk_io
+import coverage
+import decision_trace
+import fairness_series
+import load_counters
+import profiling
+import serialization
+import week_clone
+from serialization import JSONBytesResponse
+
+# Create or upgrade the default site's tables and backfill its weekly load
+# counters; other sites are prepared when they are first opened
+site_registry.get(DEFAULT_SITE)
 
 app = FastAPI(title="Shift Organizer API")
 
+# CPU-bound scheduling runs here so it never blocks the event loop serving reads
+scheduling_executor = ThreadPoolExecutor(max_workers=int(os.getenv("SCHEDULER_THREADS", "2")))
+
 # Configure CORS for local development
 app.add_middleware(
     CORSMiddleware,
@@ -22,22 +57,64 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.exception_handler(OperationalError)
+async def database_busy_handler(request, exc: OperationalError):
+    # SQLite gave up waiting for the write lock: tell the client to retry instead of a bare 500
+    if "locked" in str(exc.orig).lower():
+        return JSONResponse(status_code=503, content={"detail": "Database is busy, please retry"})
+    raise exc
+
+@app.exception_handler(WeekLockedError)
+async def week_locked_handler(request, exc: WeekLockedError):
+    # Another run is scheduling the same week and didn't finish within the lock wait
+    return JSONResponse(status_code=409, content={"detail": str(exc)})
+
+@app.exception_handler(UnknownSiteError)
+async def unknown_site_handler(request, exc: UnknownSiteError):
+    return JSONResponse(status_code=404, content={"detail": str(exc)})
+
+# Opt-in request profiling (PROFILING_ENABLED=1 plus X-Profile: 1 header or ?profile=1)
+profiling.install(app)
+
+# Outermost, so everything below (including profiling) sees the request's site
+app.add_middleware(SiteMiddleware)
+
+# Site endpoints
+@app.get("/api/sites")
+def list_sites():
+    """Site ids that have a database (the default site is always there)"""
+    return {"sites": site_registry.site_ids()}
+
+@app.post("/api/sites")
+def create_site(request: schemas.SiteCreate):
+    """Create an empty database for a new site; address it with /api/sites/{site_id}/... or X-Site-Id"""
+    try:
+        site = site_registry.create(request.site_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"site_id": site.site_id}
+
 # Staff endpoints
 @app.post("/api/staff/", response_model=schemas.Staff)
 def create_staff(staff: schemas.StaffCreate, db: Session = Depends(get_db)):
     db_staff = models.Staff(**staff.dict())
     db.add(db_staff)
+    bump_data_version(db)
     db.commit()
+    reference_cache.invalidate(db)
     db.refresh(db_staff)
+    change_feed.publish("staff.updated", staff=schemas.Staff.model_validate(db_staff).model_dump(mode="json"))
     return db_staff
 
 @app.get("/api/staff/", response_model=List[schemas.Staff])
-def get_all_staff(db: Session = Depends(get_db)):
-    return db.query(models.Staff).all()
+async def get_all_staff(db: AsyncSession = Depends(get_async_db)):
+    reference = await reference_cache.get_async(db)
+    return JSONBytesResponse(serialization.encode_records(serialization.STAFF_FIELDS, reference.staff))
 
 @app.get("/api/staff/{staff_id}", response_model=schemas.Staff)
-def get_staff(staff_id: int, db: Session = Depends(get_db)):
-    staff = db.query(models.Staff).filter(models.Staff.id == staff_id).first()
+async def get_staff(staff_id: int, db: AsyncSession = Depends(get_async_db)):
+    reference = await reference_cache.get_async(db)
+    staff = reference.staff_by_id.get(staff_id)
     if not staff:
         raise HTTPException(status_code=404, detail="Staff not found")
     return staff
@@ -51,8 +128,11 @@ def update_staff(staff_id: int, staff: schemas.StaffCreate, db: Session = Depend
     for key, value in staff.dict().items():
         setattr(db_staff, key, value)
 
+    bump_data_version(db)
     db.commit()
+    reference_cache.invalidate(db)
     db.refresh(db_staff)
+    change_feed.publish("staff.updated", staff=schemas.Staff.model_validate(db_staff).model_dump(mode="json"))
     return db_staff
 
 @app.delete("/api/staff/{staff_id}")
@@ -62,7 +142,11 @@ def delete_staff(staff_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Staff not found")
 
     db.delete(db_staff)
+    bump_data_version(db)
     db.commit()
+    reference_cache.invalidate(db)
+    # Their assignments were deleted with them
+    change_feed.publish("staff.deleted", staff_id=staff_id)
     return {"message": "Staff deleted successfully"}
 
 # Availability endpoints
@@ -77,13 +161,16 @@ def create_availability(availability: schemas.AvailabilityCreate, db: Session =
 
     db_availability = models.Availability(**availability.dict())
     db.add(db_availability)
+    bump_data_version(db)
     db.commit()
     db.refresh(db_availability)
+    change_feed.publish("availability.updated", availability=schemas.Availability.model_validate(db_availability).model_dump(mode="json"))
     return db_availability
 
 @app.get("/api/availability/staff/{staff_id}", response_model=List[schemas.Availability])
-def get_staff_availability(staff_id: int, db: Session = Depends(get_db)):
-    return db.query(models.Availability).filter(models.Availability.staff_id == staff_id).all()
+async def get_staff_availability(staff_id: int, db: AsyncSession = Depends(get_async_db)):
+    result = await db.execute(select(models.Availability).filter(models.Availability.staff_id == staff_id))
+    return result.scalars().all()
 
 # Preference endpoints
 @app.post("/api/preference/", response_model=schemas.Preference)
@@ -97,26 +184,33 @@ def create_preference(preference: schemas.PreferenceCreate, db: Session = Depend
 
     db_preference = models.Preference(**preference.dict())
     db.add(db_preference)
+    bump_data_version(db)
     db.commit()
     db.refresh(db_preference)
+    change_feed.publish("preference.updated", preference=schemas.Preference.model_validate(db_preference).model_dump(mode="json"))
     return db_preference
 
 @app.get("/api/preference/staff/{staff_id}", response_model=List[schemas.Preference])
-def get_staff_preferences(staff_id: int, db: Session = Depends(get_db)):
-    return db.query(models.Preference).filter(models.Preference.staff_id == staff_id).all()
+async def get_staff_preferences(staff_id: int, db: AsyncSession = Depends(get_async_db)):
+    result = await db.execute(select(models.Preference).filter(models.Preference.staff_id == staff_id))
+    return result.scalars().all()
 
 # Shift Template endpoints
 @app.post("/api/shift-templates/", response_model=schemas.ShiftTemplate)
 def create_shift_template(template: schemas.ShiftTemplateCreate, db: Session = Depends(get_db)):
     db_template = models.ShiftTemplate(**template.dict())
     db.add(db_template)
+    bump_data_version(db)
     db.commit()
+    reference_cache.invalidate(db)
     db.refresh(db_template)
+    change_feed.publish("template.updated", template=schemas.ShiftTemplate.model_validate(db_template).model_dump(mode="json"))
     return db_template
 
 @app.get("/api/shift-templates/", response_model=List[schemas.ShiftTemplate])
-def get_all_shift_templates(db: Session = Depends(get_db)):
-    return db.query(models.ShiftTemplate).filter(models.ShiftTemplate.is_active == True).all()
+async def get_all_shift_templates(db: AsyncSession = Depends(get_async_db)):
+    reference = await reference_cache.get_async(db)
+    return JSONBytesResponse(serialization.encode_records(serialization.TEMPLATE_FIELDS, reference.active_templates))
 
 @app.put("/api/shift-templates/{template_id}", response_model=schemas.ShiftTemplate)
 def update_shift_template(template_id: int, template: schemas.ShiftTemplateCreate, db: Session = Depends(get_db)):
@@ -124,11 +218,17 @@ def update_shift_template(template_id: int, template: schemas.ShiftTemplateCreat
     if not db_template:
         raise HTTPException(status_code=404, detail="Shift template not found")
 
+    times_changed = (db_template.start_time, db_template.end_time) != (template.start_time, template.end_time)
     for key, value in template.dict().items():
         setattr(db_template, key, value)
 
+    if times_changed:
+        models.refresh_shift_times(db, db_template)
+    bump_data_version(db)
     db.commit()
+    reference_cache.invalidate(db)
     db.refresh(db_template)
+    change_feed.publish("template.updated", template=schemas.ShiftTemplate.model_validate(db_template).model_dump(mode="json"))
     return db_template
 
 @app.delete("/api/shift-templates/{template_id}")
@@ -138,47 +238,113 @@ def delete_shift_template(template_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Shift template not found")
 
     db_template.is_active = False
+    bump_data_version(db)
     db.commit()
+    reference_cache.invalidate(db)
+    change_feed.publish("template.deactivated", shift_template_id=template_id)
     return {"message": "Shift template deactivated"}
 
+# Aggregated page-load endpoints
+@app.get("/api/bootstrap", response_model=schemas.Bootstrap)
+@profiled("bootstrap")
+async def get_bootstrap(week_start: str, db: AsyncSession = Depends(get_async_db)):
+    """Everything the schedule view needs on load: staff, active templates, the week's assignments and coverage"""
+    week_date = datetime.fromisoformat(week_start)
+    reference = await reference_cache.get_async(db)
+    assignments = await serialization.fetch_rows(
+        db, serialization.assignment_columns().filter(models.week_start_filter(week_date))
+    )
+    return JSONBytesResponse(serialization.encode_object({
+        "week_start_date": orjson.dumps(week_date.date()),
+        "staff": serialization.encode_records(serialization.STAFF_FIELDS, reference.staff),
+        "shift_templates": serialization.encode_records(serialization.TEMPLATE_FIELDS, reference.active_templates),
+        "assignments": serialization.encode_rows(serialization.ASSIGNMENT_FIELDS, assignments),
+        "coverage": orjson.dumps(coverage.coverage_from_assignments(week_date, reference.active_templates, assignments).slot_list()),
+    }))
+
+@app.get("/api/staff-profiles", response_model=Dict[int, schemas.StaffProfile])
+async def get_staff_profiles(staff_ids: str = None, db: AsyncSession = Depends(get_async_db)):
+    """Availability and preferences keyed by staff id, for all staff or a comma-separated staff_ids list"""
+    if staff_ids:
+        try:
+            ids = sorted({int(part) for part in staff_ids.split(",") if part.strip()})
+        except ValueError:
+            raise HTTPException(status_code=400, detail="staff_ids must be comma-separated integers")
+    else:
+        ids = [s.id for s in (await reference_cache.get_async(db)).staff]
+
+    # Two set-based queries instead of two per staff member
+    grouped = {staff_id: ([], []) for staff_id in ids}
+    for index, (model, fields) in enumerate((
+        (models.Availability, serialization.AVAILABILITY_FIELDS),
+        (models.Preference, serialization.PREFERENCE_FIELDS),
+    )):
+        statement = serialization.columns(model, fields).order_by(model.staff_id, model.id)
+        if staff_ids:
+            statement = statement.filter(model.staff_id.in_(ids))
+        for row in await serialization.fetch_rows(db, statement):
+            entry = grouped.get(row.staff_id)
+            if entry is not None:
+                entry[index].append(dict(zip(fields, row)))
+
+    return JSONBytesResponse({
+        str(staff_id): {"availability": availability, "preferences": preferences}
+        for staff_id, (availability, preferences) in grouped.items()
+    })
+
 # Week Assignment endpoints
 @app.get("/api/assignments/week/{week_start}", response_model=List[schemas.WeekAssignment])
-def get_week_assignments(week_start: str, db: Session = Depends(get_db)):
+@profiled("get_week_assignments")
+async def get_week_assignments(week_start: str, db: AsyncSession = Depends(get_async_db)):
     """Get all assignments for a specific week (pass date as YYYY-MM-DD)"""
     week_date = datetime.fromisoformat(week_start)
 
-    # Get all assignments and filter in Python to avoid timezone issues
-    all_assignments = db.query(models.WeekAssignment).all()
-
     print(f"DEBUG: Looking for week {week_date.date()}")
-    print(f"DEBUG: Total assignments in DB: {len(all_assignments)}")
 
-    # Filter by comparing just the date part
-    assignments = [
-        a for a in all_assignments
-        if a.week_start_date.date() == week_date.date()
-    ]
+    # Match on the date part only (see models.week_start_filter)
+    assignments = await serialization.fetch_rows(
+        db, serialization.assignment_columns().filter(models.week_start_filter(week_date))
+    )
 
     print(f"DEBUG: Found {len(assignments)} assignments matching this week")
     for a in assignments[:3]:
         print(f"  - Assignment: template_id={a.shift_template_id}, staff_id={a.staff_id}, date={a.week_start_date}")
 
-    return assignments
+    return JSONBytesResponse(serialization.encode_rows(serialization.ASSIGNMENT_FIELDS, assignments))
+
+@app.get("/api/assignments/range", response_model=List[schemas.WeekAssignment])
+async def get_assignments_in_range(start_date: str, end_date: str, db: AsyncSession = Depends(get_async_db)):
+    """Assignments whose shift falls between two dates, inclusive (YYYY-MM-DD), e.g. a month or quarter"""
+    start = datetime.fromisoformat(start_date).date()
+    end = datetime.fromisoformat(end_date).date()
+    if end < start:
+        raise HTTPException(status_code=400, detail="end_date must not be before start_date")
+
+    assignments = await serialization.fetch_rows(
+        db,
+        serialization.assignment_columns()
+        .filter(models.WeekAssignment.shift_date >= start, models.WeekAssignment.shift_date <= end)
+        .order_by(models.WeekAssignment.shift_date, models.WeekAssignment.start_at)
+    )
+    return JSONBytesResponse(serialization.encode_rows(serialization.ASSIGNMENT_FIELDS, assignments))
 
 @app.get("/api/assignments/", response_model=List[schemas.WeekAssignment])
-def get_all_assignments(db: Session = Depends(get_db)):
-    return db.query(models.WeekAssignment).all()
+async def get_all_assignments(db: AsyncSession = Depends(get_async_db)):
+    assignments = await serialization.fetch_rows(db, serialization.assignment_columns())
+    return JSONBytesResponse(serialization.encode_rows(serialization.ASSIGNMENT_FIELDS, assignments))
 
 @app.post("/api/assignments/", response_model=schemas.WeekAssignment)
 def create_assignment(assignment: schemas.WeekAssignmentCreate, db: Session = Depends(get_db)):
     """Manually create an assignment (allows overbooking)"""
+    reference = reference_cache.get(db)
+
     # Verify staff exists
-    staff = db.query(models.Staff).filter(models.Staff.id == assignment.staff_id).first()
+    staff = reference.staff_by_id.get(assignment.staff_id)
     if not staff:
         raise HTTPException(status_code=404, detail="Staff not found")
 
     # Verify shift template exists
-    template = db.query(models.ShiftTemplate).filter(models.ShiftTemplate.id == assignment.shift_template_id).first()
+    template = reference.templates_by_id.get(assignment.shift_template_id)
     if not template:
         raise HTTPException(status_code=404, detail="Shift template not found")
 
@@ -187,13 +353,11 @@ def create_assignment(assignment: schemas.WeekAssignmentCreate, db: Session = De
         raise HTTPException(status_code=400, detail=f"Day {assignment.day_of_week} is not in this shift template's days")
 
     # Check for duplicate assignment (same staff, template, day, week)
-    from sqlalchemy import cast, Date
-    week_date_only = assignment.week_start_date.date()
     existing = db.query(models.WeekAssignment).filter(
         models.WeekAssignment.staff_id == assignment.staff_id,
         models.WeekAssignment.shift_template_id == assignment.shift_template_id,
         models.WeekAssignment.day_of_week == assignment.day_of_week,
-        cast(models.WeekAssignment.week_start_date, Date) == week_date_only
+        models.week_start_filter(assignment.week_start_date)
     ).first()
 
     if existing:
@@ -202,36 +366,86 @@ def create_assignment(assignment: schemas.WeekAssignmentCreate, db: Session = De
     # Create assignment (no constraint checking - allows manual overbooking)
     db_assignment = models.WeekAssignment(**assignment.dict())
     db.add(db_assignment)
-    db.commit()
+    load_counters.adjust_week_load(db, assignment.staff_id, assignment.week_start_date, 1)
+    try:
+        db.commit()
+    except IntegrityError:
+        # Same assignment written by a concurrent request since the check above
+        db.rollback()
+        raise HTTPException(status_code=400, detail="This staff member is already assigned to this shift on this day")
     db.refresh(db_assignment)
+    change_feed.assignments_added(db_assignment.week_start_date, [assignment_payload(db_assignment)])
     return db_assignment
 
+@app.post("/api/assignments/batch")
+@profiled("batch_assignments")
+def batch_assignments(batch: schemas.AssignmentBatch, db: Session = Depends(get_db)):
+    """Apply add/remove/move operations to one week in a single transaction (all or nothing)"""
+    if not batch.operations:
+        raise HTTPException(status_code=400, detail="No operations given")
+    if len(batch.operations) > assignment_batch.MAX_BATCH_OPERATIONS:
+        raise HTTPException(status_code=400, detail=f"At most {assignment_batch.MAX_BATCH_OPERATIONS} operations per batch")
+    week_date = batch.week_start_date
+
+    with week_lock(db, week_date):
+        try:
+            results, removed_ids, added = assignment_batch.apply_batch(db, week_date, batch.operations)
+        except assignment_batch.BatchRejected as e:
+            raise HTTPException(status_code=400, detail={"message": str(e), "results": e.results})
+        except IntegrityError:
+            # A writer that doesn't take the week lock got there first
+            db.rollback()
+            raise HTTPException(status_code=409, detail="The week changed while the batch was applied; reload and retry")
+
+        assignments = db.execute(
+            serialization.assignment_columns().filter(models.week_start_filter(week_date))
+        ).all()
+
+    if removed_ids:
+        change_feed.assignments_removed(week_date, removed_ids)
+    if added:
+        change_feed.assignments_added(week_date, added)
+
+    week = coverage.coverage_from_assignments(week_date, reference_cache.get(db).active_templates, assignments)
+    return JSONBytesResponse(serialization.encode_object({
+        "results": orjson.dumps(results),
+        "assignments": serialization.encode_rows(serialization.ASSIGNMENT_FIELDS, assignments),
+        "coverage": orjson.dumps(week.slot_list())
+    }))
+
 @app.delete("/api/assignments/{assignment_id}")
 def delete_assignment(assignment_id: int, db: Session = Depends(get_db)):
     assignment = db.query(models.WeekAssignment).filter(models.WeekAssignment.id == assignment_id).first()
     if not assignment:
         raise HTTPException(status_code=404, detail="Assignment not found")
 
+    week_start_date = assignment.week_start_date
+    load_counters.adjust_week_load(db, assignment.staff_id, week_start_date, -1)
     db.delete(assignment)
     db.commit()
+    change_feed.assignments_removed(week_start_date, [assignment_id])
     return {"message": "Assignment deleted"}
 
 @app.delete("/api/assignments/week/{week_start}")
+@profiled("delete_week_assignments")
 def delete_week_assignments(week_start: str, db: Session = Depends(get_db)):
     """Delete all assignments for a specific week"""
     week_date = datetime.fromisoformat(week_start)
 
-    # Get all assignments and filter by date
-    all_assignments = db.query(models.WeekAssignment).all()
-    assignments_to_delete = [
-        a for a in all_assignments
-        if a.week_start_date.date() == week_date.date()
-    ]
+    # Don't clear a week while a scheduling run is filling it
+    with week_lock(db, week_date):
+        assignments_to_delete = db.query(models.WeekAssignment).filter(
+            models.week_start_filter(week_date)
+        ).all()
 
-    for assignment in assignments_to_delete:
-        db.delete(assignment)
+        deleted_ids = [assignment.id for assignment in assignments_to_delete]
+        for assignment in assignments_to_delete:
+            db.delete(assignment)
 
-    db.commit()
+        deltas = load_counters.count_by_staff(assignments_to_delete)
+        load_counters.adjust_week_loads(db, week_date, {staff_id: -count for staff_id, count in deltas.items()})
+        db.commit()
+    change_feed.assignments_removed(week_date, deleted_ids)
 
     print(f"DEBUG: Deleted {len(assignments_to_delete)} assignments for week {week_date.date()}")
 
@@ -246,8 +460,8 @@ def get_staff_fairness(
     end_date: str = None,
     db: Session = Depends(get_db)
 ):
-    engine = SchedulingEngine(db)
-    staff = db.query(models.Staff).filter(models.Staff.id == staff_id).first()
+    # Sync (threadpool): the scoring loop is CPU-bound and must not run on the event loop
+    staff = reference_cache.get(db).staff_by_id.get(staff_id)
     if not staff:
         raise HTTPException(status_code=404, detail="Staff not found")
 
@@ -255,47 +469,380 @@ def get_staff_fairness(
     start_dt = datetime.fromisoformat(start_date) if start_date else None
     end_dt = datetime.fromisoformat(end_date) if end_date else None
 
-    return engine.calculate_fairness_score(staff, period_days, start_dt, end_dt)
+    return SchedulingEngine(db).calculate_fairness_score(staff, period_days, start_dt, end_dt)
+
+def _compute_all_fairness(site: SiteDatabase, window) -> List[Dict]:
+    with site.SessionLocal() as db:
+        engine = SchedulingEngine(db)
+        return [
+            {
+                "staff_id": staff.id,
+                "staff_name": staff.name,
+                "metrics": engine.calculate_fairness_score(staff, None, *window)
+            }
+            for staff in reference_cache.staff(db)
+        ]
 
 @app.get("/api/fairness/all")
-def get_all_fairness(
+async def get_all_fairness(
     period_days: int = None,
     start_date: str = None,
     end_date: str = None,
-    db: Session = Depends(get_db)
+    site: SiteDatabase = Depends(get_site),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    engine = SchedulingEngine(db)
-    all_staff = db.query(models.Staff).all()
-
+    """Fairness metrics for all staff; identical concurrent requests share one computation (see fairness_cache.py)"""
     # Parse dates if provided
     start_dt = datetime.fromisoformat(start_date) if start_date else None
     end_dt = datetime.fromisoformat(end_date) if end_date else None
+    window = normalize_window(period_days, start_dt, end_dt)
+
+    version = await db.run_sync(current_data_version)
+    # The scoring loop is CPU-bound, so it runs in the threadpool with its own session
+    return await fairness_cache.get(
+        site.site_id, window, version, lambda: run_in_threadpool(_compute_all_fairness, site, window)
+    )
+
+@app.get("/api/fairness/timeseries")
+async def get_fairness_timeseries(
+    start_week: str = None,
+    end_week: str = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Per-staff weekly fairness figures with prefix sums (defaults to ±12 weeks around this week)"""
+    today = datetime.utcnow().date()
+    this_monday = today - timedelta(days=today.weekday())
+    start = datetime.fromisoformat(start_week).date() if start_week else this_monday - timedelta(weeks=12)
+    end = datetime.fromisoformat(end_week).date() if end_week else this_monday + timedelta(weeks=12)
+    if end < start:
+        raise HTTPException(status_code=400, detail="end_week must not be before start_week")
+    if (end - start).days // 7 + 1 > fairness_series.MAX_SERIES_WEEKS:
+        raise HTTPException(status_code=400, detail=f"At most {fairness_series.MAX_SERIES_WEEKS} weeks per request")
+
+    reference = await reference_cache.get_async(db)
+    return await db.run_sync(
+        lambda session: fairness_series.compute_fairness_timeseries(session, start, end, reference.staff)
+    )
+
+# Scheduling endpoints
+@app.get("/api/schedule/feasibility/{week_start}")
+def get_schedule_feasibility(week_start: str, db: Session = Depends(get_db)):
+    """Max-flow pre-check: best achievable coverage and bottlenecks for a week (pass date as YYYY-MM-DD)"""
+    engine = SchedulingEngine(db)
+    return engine.check_feasibility(datetime.fromisoformat(week_start))
+
+@app.get("/api/schedule/explain/{week_start}")
+def explain_schedule_constraints(
+    week_start: str,
+    shift_template_id: int,
+    day_of_week: int = None,
+    staff_id: int = None,
+    db: Session = Depends(get_db)
+):
+    """Explain why staff can or cannot take a shift in a week (all staff unless staff_id is given)"""
+    reference = reference_cache.get(db)
+    if staff_id is not None and staff_id not in reference.staff_by_id:
+        raise HTTPException(status_code=404, detail="Staff not found")
+    if shift_template_id not in reference.templates_by_id:
+        raise HTTPException(status_code=404, detail="Shift template not found")
+    if day_of_week is not None and not 0 <= day_of_week <= 6:
+        raise HTTPException(status_code=400, detail="day_of_week must be between 0 and 6")
 
-    return [
-        {
-            "staff_id": staff.id,
-            "staff_name": staff.name,
-            "metrics": engine.calculate_fairness_score(staff, period_days, start_dt, end_dt)
-        }
-        for staff in all_staff
-    ]
+    engine = SchedulingEngine(db)
+    return engine.explain_constraints(datetime.fromisoformat(week_start), shift_template_id, day_of_week, staff_id)
+
+def run_auto_schedule(site: SiteDatabase, request: schemas.ScheduleRequest) -> Dict:
+    """Run one scheduling call with its own session (executed on scheduling_executor)."""
+    db = site.SessionLocal()
+    try:
+        engine = SchedulingEngine(db)
+
+        # Clearing and refilling happen under one hold of the week's lock
+        with week_lock(db, request.week_start_date):
+            # Clear existing assignments if requested
+            if request.clear_existing:
+                existing = db.query(models.WeekAssignment).filter(
+                    models.week_start_filter(request.week_start_date)
+                )
+                cleared = existing.all()
+                cleared_ids = [a.id for a in cleared]
+                deltas = load_counters.count_by_staff(cleared)
+                existing.delete()
+                load_counters.adjust_week_loads(
+                    db, request.week_start_date, {staff_id: -count for staff_id, count in deltas.items()}
+                )
+                db.commit()
+                change_feed.assignments_removed(request.week_start_date, cleared_ids)
+
+            return engine.auto_schedule(request.week_start_date)
+    finally:
+        db.close()
 
-# Scheduling endpoint
 @app.post("/api/schedule/auto")
-def auto_schedule(request: schemas.ScheduleRequest, db: Session = Depends(get_db)):
+async def auto_schedule(request: schemas.ScheduleRequest, site: SiteDatabase = Depends(get_site)):
     """Trigger AI-powered automatic scheduling for a specific week."""
-    engine = SchedulingEngine(db)
-
-    # Clear existing assignments if requested
-    if request.clear_existing:
-        db.query(models.WeekAssignment).filter(
-            models.WeekAssignment.week_start_date == request.week_start_date
-        ).delete()
-        db.commit()
+    loop = asyncio.get_running_loop()
+    # Carry the request context (e.g. an active profile, the site) into the executor thread
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(scheduling_executor, functools.partial(context.run, run_auto_schedule, site, request))
+
+MAX_ROLLING_WEEKS = 104
+
+def run_clone_weeks(site: SiteDatabase, source_week: datetime, target_weeks: List[datetime], fill_gaps: bool) -> Dict:
+    """Clone into each target week under its lock, then optionally fill its gaps (runs on scheduling_executor)."""
+    db = site.SessionLocal()
+    try:
+        engine = SchedulingEngine(db)
+        weeks = []
+        for target_week in target_weeks:
+            with week_lock(db, target_week):
+                result = week_clone.clone_week(db, source_week, target_week)
+                if fill_gaps:
+                    filled = engine.auto_schedule(target_week)
+                    result["scheduled"] = len(filled.get("successful", []))
+                    result["conflicts"] = len(filled.get("conflicts", []))
+                    result["run_id"] = filled.get("run_id")
+            weeks.append(result)
+        return {
+            "source_week_date": source_week.date().isoformat(),
+            "copied": sum(week["copied"] for week in weeks),
+            "skipped": sum(len(week["skipped"]) for week in weeks),
+            "weeks": weeks
+        }
+    finally:
+        db.close()
+
+@app.post("/api/schedule/clone")
+async def clone_schedule_weeks(request: schemas.CloneWeekRequest, site: SiteDatabase = Depends(get_site)):
+    """Copy a week's assignments into other weeks, skipping rows that break availability or caps"""
+    source_week = datetime.combine(request.source_week_date.date(), datetime.min.time())
+    if request.target_week_dates:
+        target_weeks = [datetime.combine(d.date(), datetime.min.time()) for d in request.target_week_dates]
+    elif request.num_weeks:
+        target_weeks = [source_week + timedelta(weeks=i) for i in range(1, request.num_weeks + 1)]
+    else:
+        raise HTTPException(status_code=400, detail="Give target_week_dates or num_weeks")
+    target_weeks = sorted(set(target_weeks))
+    if not 1 <= len(target_weeks) <= MAX_ROLLING_WEEKS:
+        raise HTTPException(status_code=400, detail=f"Give between 1 and {MAX_ROLLING_WEEKS} target weeks")
+    if source_week in target_weeks:
+        raise HTTPException(status_code=400, detail="A target week can't be the source week")
+
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(
+        scheduling_executor,
+        functools.partial(context.run, run_clone_weeks, site, source_week, target_weeks, request.fill_gaps)
+    )
+
+def stream_schedule_job(site: SiteDatabase, job_id: int) -> Iterator[str]:
+    """Server-sent events for a rolling job; runs in the threadpool with its own session."""
+    db = site.SessionLocal()
+    try:
+        job = db.query(models.ScheduleJob).filter(models.ScheduleJob.id == job_id).first()
+        yield f"event: job\ndata: {json.dumps(schemas.ScheduleJob.model_validate(job).model_dump(mode='json'))}\n\n"
+
+        engine = SchedulingEngine(db)
+        try:
+            # closing() makes a client disconnect mark the job interrupted right away
+            with contextlib.closing(engine.schedule_weeks(job)) as weeks:
+                for week in weeks:
+                    yield f"event: week\ndata: {json.dumps(week)}\n\n"
+        except Exception as e:
+            yield f"event: error\ndata: {json.dumps({'job_id': job_id, 'completed_weeks': job.completed_weeks, 'error': str(e)})}\n\n"
+            return
+
+        yield f"event: done\ndata: {json.dumps({'job_id': job_id, 'completed_weeks': job.completed_weeks})}\n\n"
+    finally:
+        db.close()
+
+@app.post("/api/schedule/rolling")
+def start_rolling_schedule(
+    request: schemas.RollingScheduleRequest,
+    db: Session = Depends(get_db),
+    site: SiteDatabase = Depends(get_site)
+):
+    """Schedule many weeks ahead, streaming each week's result as server-sent events"""
+    if not 1 <= request.num_weeks <= MAX_ROLLING_WEEKS:
+        raise HTTPException(status_code=400, detail=f"num_weeks must be between 1 and {MAX_ROLLING_WEEKS}")
 
-    result = engine.auto_schedule(request.week_start_date)
+    job = models.ScheduleJob(start_week_date=request.start_week_date, num_weeks=request.num_weeks)
+    db.add(job)
+    db.commit()
+    return StreamingResponse(stream_schedule_job(site, job.id), media_type="text/event-stream")
+
+@app.post("/api/schedule/rolling/{job_id}/resume")
+def resume_rolling_schedule(job_id: int, db: Session = Depends(get_db), site: SiteDatabase = Depends(get_site)):
+    """Continue an interrupted or failed rolling job from its last completed week"""
+    job = db.query(models.ScheduleJob).filter(models.ScheduleJob.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Schedule job not found")
+    if job.status == "completed":
+        raise HTTPException(status_code=400, detail="Schedule job already completed")
+    return StreamingResponse(stream_schedule_job(site, job.id), media_type="text/event-stream")
+
+@app.get("/api/schedule/jobs/{job_id}", response_model=schemas.ScheduleJob)
+def get_schedule_job(job_id: int, db: Session = Depends(get_db)):
+    job = db.query(models.ScheduleJob).filter(models.ScheduleJob.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Schedule job not found")
+    return job
+
+@app.get("/api/schedule/runs", response_model=List[schemas.ScheduleRun])
+def list_schedule_runs(week_start: str = None, limit: int = 20, db: Session = Depends(get_db)):
+    """Recent auto-schedule runs, newest first (only one week's if week_start is given)"""
+    query = db.query(models.ScheduleRun)
+    if week_start:
+        week_date = datetime.fromisoformat(week_start)
+        query = query.filter(models.ScheduleRun.week_start_date == datetime.combine(week_date.date(), datetime.min.time()))
+    return query.order_by(models.ScheduleRun.id.desc()).limit(min(max(limit, 1), 200)).all()
+
+@app.get("/api/schedule/runs/{run_id}/trace")
+def get_schedule_run_trace(
+    run_id: int,
+    shift_template_id: int = None,
+    day_of_week: int = None,
+    staff_id: int = None,
+    db: Session = Depends(get_db)
+):
+    """Per-slot decisions of a run: top candidates with score components and rejection counts"""
+    run = db.query(models.ScheduleRun).filter(models.ScheduleRun.id == run_id).first()
+    if not run:
+        raise HTTPException(status_code=404, detail="Schedule run not found")
+    reference = reference_cache.get(db)
+    staff_names = {s.id: s.name for s in reference.staff_by_id.values()}
+    template_names = {t.id: t.name for t in reference.templates_by_id.values()}
+    slots = decision_trace.decode_run(run, staff_names, template_names, shift_template_id, day_of_week, staff_id)
+    return {
+        "run": schemas.ScheduleRun.model_validate(run).model_dump(mode="json"),
+        "slots": slots
+    }
+
+@app.get("/api/coverage/week/{week_start}")
+async def get_week_coverage(week_start: str, db: AsyncSession = Depends(get_async_db)):
+    """Required, assigned and missing staff per active (template, day) for a staffing heatmap"""
+    week_date = datetime.fromisoformat(week_start)
+    week = await db.run_sync(lambda session: coverage.week_coverage(session, week_date))
+    return week.matrix()
+
+# Change feed
+@app.get("/api/events")
+async def stream_changes(week_start: str = None, last_event_id: Optional[str] = Header(None)):
+    """Server-sent change events; assignment events only for week_start (YYYY-MM-DD) if given"""
+    week = datetime.fromisoformat(week_start).date().isoformat() if week_start else None
+    # Sent by EventSource when it reconnects
+    last_id = int(last_event_id) if last_event_id and last_event_id.isdigit() else None
+
+    async def event_stream():
+        subscription = change_feed.subscribe(week, last_id)
+        try:
+            yield ": connected\n\n"
+            while True:
+                event = await subscription.next_event(KEEPALIVE_SECONDS)
+                # Comment lines keep proxies from closing an idle stream
+                yield format_sse(event) if event is not None else ": keepalive\n\n"
+        finally:
+            change_feed.unsubscribe(subscription)
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+# Archive endpoints
+@app.post("/api/archive/run")
+def run_archive(request: schemas.ArchiveRequest, db: Session = Depends(get_db)):
+    """Move weeks older than the horizon out of week_assignment, keeping fairness rollups"""
+    try:
+        result = archive.archive_assignments(db, request.horizon_days)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    for week in result["weeks"]:
+        change_feed.publish("assignments.archived", datetime.fromisoformat(week["week_start_date"]))
     return result
 
+@app.get("/api/archive/assignments")
+def get_archived_assignments(
+    start_date: str = None,
+    end_date: str = None,
+    staff_id: int = None,
+    db: Session = Depends(get_db)
+):
+    """Archived assignments for audits (filter by week start range and/or staff)"""
+    start_dt = datetime.fromisoformat(start_date) if start_date else None
+    end_dt = datetime.fromisoformat(end_date) if end_date else None
+    return archive.query_archive(db, start_dt, end_dt, staff_id)
+
+# Bulk import/export endpoints
+def _run_bulk_import(site: SiteDatabase, kind: str, source, fmt: str) -> Dict:
+    with site.SessionLocal() as db:
+        return bulk_io.import_file(db, kind, source, fmt)
+
+@app.post("/api/bulk/import/{kind}")
+async def bulk_import(kind: str, request: Request, format: str = "csv", site: SiteDatabase = Depends(get_site)):
+    """Import a CSV or Parquet file sent as the raw request body, committing chunk by chunk"""
+    try:
+        bulk_io.check_kind_and_format(kind, format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # Spool the upload (to disk past 64 MB) so parsing never holds the whole file as Python objects
+    with tempfile.SpooledTemporaryFile(max_size=64 * 1024 * 1024) as source:
+        async for chunk in request.stream():
+            source.write(chunk)
+        source.seek(0)
+        try:
+            report = await run_in_threadpool(_run_bulk_import, site, kind, source, format)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    if kind != "assignments":
+        reference_cache.invalidate(site.engine)
+    if report["rows_written"]:
+        # Too many rows for per-row events; open clients reload
+        change_feed.publish("resync")
+    return report
+
+@app.get("/api/bulk/export/{kind}")
+def bulk_export(
+    kind: str,
+    format: str = "csv",
+    start_date: str = None,
+    end_date: str = None,
+    site: SiteDatabase = Depends(get_site)
+):
+    """Stream one table as CSV or Parquet (assignments can be limited to a week_start_date range)"""
+    try:
+        bulk_io.check_kind_and_format(kind, format)
+        filters = {}
+        if kind == "assignments":
+            filters["start_date"] = datetime.fromisoformat(start_date) if start_date else None
+            filters["end_date"] = datetime.fromisoformat(end_date) if end_date else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    headers = {"Content-Disposition": f'attachment; filename="{kind}.{format}"'}
+
+    if format == "csv":
+        def csv_stream() -> Iterator[str]:
+            # The response outlives the request scope, so the generator owns its session
+            with site.SessionLocal() as db:
+                yield from bulk_io.iter_csv(db, kind, **filters)
+        return StreamingResponse(csv_stream(), media_type="text/csv", headers=headers)
+
+    # Parquet's footer is written last, so build the file first and stream it from disk
+    target = tempfile.TemporaryFile()
+    with site.SessionLocal() as db:
+        bulk_io.write_parquet(db, kind, target, **filters)
+    target.seek(0)
+
+    def file_stream() -> Iterator[bytes]:
+        with target:
+            while True:
+                block = target.read(1024 * 1024)
+                if not block:
+                    break
+                yield block
+    return StreamingResponse(file_stream(), media_type="application/vnd.apache.parquet", headers=headers)
+
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # Open change-feed streams would otherwise hold up shutdown indefinitely
+    uvicorn.run(app, host="0.0.0.0", port=8000, timeout_graceful_shutdown=5)
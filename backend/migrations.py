@@ -0,0 +1,74 @@
+"""In-place upgrades for databases created by older versions.
+
+``Base.metadata.create_all`` creates missing tables but never alters existing
+ones. Each step here checks the live schema and only runs when needed, so it
+is safe to call on every startup.
+"""
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import sessionmaker
+import load_counters
+import models
+import snapshot
+
+
+def _add_shift_time_columns(engine: Engine):
+    columns = {c["name"] for c in inspect(engine).get_columns("week_assignment")}
+    if "shift_date" in columns:
+        return
+
+    with engine.begin() as conn:
+        conn.execute(text("ALTER TABLE week_assignment ADD COLUMN shift_date DATE"))
+        conn.execute(text("ALTER TABLE week_assignment ADD COLUMN start_at DATETIME"))
+        conn.execute(text("ALTER TABLE week_assignment ADD COLUMN end_at DATETIME"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_week_assignment_shift_date ON week_assignment (shift_date)"))
+
+    db = sessionmaker(bind=engine)()
+    try:
+        for template in db.query(models.ShiftTemplate).all():
+            models.refresh_shift_times(db, template)
+        db.commit()
+    finally:
+        db.close()
+    print("DEBUG: Added and backfilled week_assignment.shift_date/start_at/end_at")
+
+
+def _add_assignment_unique_index(engine: Engine):
+    indexes = {i["name"] for i in inspect(engine).get_indexes("week_assignment")}
+    if "ux_week_assignment_staff_shift" in indexes:
+        return
+
+    # Concurrent runs could double-book a week before the index existed; keep the first row
+    with engine.begin() as conn:
+        removed = conn.execute(text(
+            "DELETE FROM week_assignment WHERE shift_date IS NOT NULL AND id NOT IN ("
+            "SELECT MIN(id) FROM week_assignment WHERE shift_date IS NOT NULL "
+            "GROUP BY staff_id, shift_template_id, shift_date)"
+        )).rowcount
+        conn.execute(text(
+            "CREATE UNIQUE INDEX ux_week_assignment_staff_shift "
+            "ON week_assignment (staff_id, shift_template_id, shift_date)"
+        ))
+
+    if removed:
+        db = sessionmaker(bind=engine)()
+        try:
+            load_counters.rebuild_week_loads(db)
+        finally:
+            db.close()
+    print(f"DEBUG: Added unique index on week_assignment, removed {removed} duplicate assignments")
+
+
+def _add_data_version_row(engine: Engine):
+    # Scheduling snapshots are keyed by this counter (see snapshot.py)
+    with engine.begin() as conn:
+        conn.execute(
+            text("INSERT OR IGNORE INTO data_version (id, version) VALUES (1, :version)"),
+            {"version": snapshot.initial_data_version()}
+        )
+
+
+def run_migrations(engine: Engine):
+    _add_shift_time_columns(engine)
+    _add_assignment_unique_index(engine)
+    _add_data_version_row(engine)
@@ -1,6 +1,6 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Boolean, JSON, Time
+from sqlalchemy import Column, Integer, String, Float, Date, DateTime, ForeignKey, Boolean, Index, JSON, LargeBinary, Time, and_, bindparam, event, select, update
 from sqlalchemy.orm import relationship
-from datetime import datetime
+from datetime import date, datetime, time, timedelta
 from database import Base
 
 class Staff(Base):
@@ -16,6 +16,8 @@ class Staff(Base):
     preferences = relationship("Preference", back_populates="staff", cascade="all, delete-orphan")
     assignments = relationship("WeekAssignment", back_populates="staff", cascade="all, delete-orphan")
     fairness_metrics = relationship("FairnessMetric", back_populates="staff", cascade="all, delete-orphan")
+    week_loads = relationship("StaffWeekLoad", back_populates="staff", cascade="all, delete-orphan")
+    week_rollups = relationship("StaffWeekRollup", back_populates="staff", cascade="all, delete-orphan")
 
 
 class Availability(Base):
@@ -70,12 +72,103 @@ class WeekAssignment(Base):
     week_start_date = Column(DateTime, nullable=False)  # Monday of the week
     day_of_week = Column(Integer, nullable=False)  # 0=Monday, 6=Sunday - specific day this assignment is for
     assigned_at = Column(DateTime, default=datetime.utcnow)
+    # Materialized from week_start_date + day_of_week and the template times (see _materialize_shift_times)
+    shift_date = Column(Date, index=True)
+    start_at = Column(DateTime)
+    end_at = Column(DateTime)  # Next day for shifts that run past midnight
 
     shift_template = relationship("ShiftTemplate", back_populates="week_assignments")
     staff = relationship("Staff", back_populates="assignments")
 
+    # shift_date is the week's date + day_of_week, so this is one row per (staff, template, day, week)
+    __table_args__ = (
+        Index("ux_week_assignment_staff_shift", "staff_id", "shift_template_id", "shift_date", unique=True),
+    )
 
 
+class StaffWeekLoad(Base):
+    """Number of assignments per staff member per week, maintained by every assignment write (see load_counters.py)"""
+    __tablename__ = "staff_week_load"
+
+    staff_id = Column(Integer, ForeignKey("staff.id"), primary_key=True)
+    week_start_date = Column(DateTime, primary_key=True)  # Midnight of the week's Monday
+    shift_count = Column(Integer, nullable=False, default=0)
+
+    staff = relationship("Staff", back_populates="week_loads")
+
+
+class StaffWeekRollup(Base):
+    """Fairness totals per staff member per week for assignments moved to the archive (see archive.py)"""
+    __tablename__ = "staff_week_rollup"
+
+    staff_id = Column(Integer, ForeignKey("staff.id"), primary_key=True)
+    week_start_date = Column(DateTime, primary_key=True)  # Same value the archived assignments had
+    shift_count = Column(Integer, nullable=False, default=0)
+    preference_sum = Column(Float, nullable=False, default=0.0)
+    preferred_count = Column(Integer, nullable=False, default=0)
+    avoided_count = Column(Integer, nullable=False, default=0)
+
+    staff = relationship("Staff", back_populates="week_rollups")
+
+
+class AssignmentArchive(Base):
+    """One week's archived assignments, stored as zlib-compressed JSON columns"""
+    __tablename__ = "assignment_archive"
+
+    id = Column(Integer, primary_key=True, index=True)
+    week_start_date = Column(DateTime, nullable=False, index=True)  # Midnight of the week's Monday
+    row_count = Column(Integer, nullable=False)
+    payload = Column(LargeBinary, nullable=False)
+    archived_at = Column(DateTime, default=datetime.utcnow)
+
+
+
+class WeekLock(Base):
+    """Advisory lock serializing scheduling writes to one week across workers (see week_locks.py)"""
+    __tablename__ = "week_lock"
+
+    week_start_date = Column(DateTime, primary_key=True)  # Midnight of the week's Monday
+    owner = Column(String, nullable=False)
+    acquired_at = Column(DateTime, nullable=False)
+    expires_at = Column(DateTime, nullable=False)  # Held past this point only by a crashed worker
+
+
+class DataVersion(Base):
+    """Single row counting changes to the scheduling inputs (see snapshot.py)"""
+    __tablename__ = "data_version"
+
+    id = Column(Integer, primary_key=True)  # Always 1
+    version = Column(Integer, nullable=False, default=0)
+
+
+class ScheduleJob(Base):
+    """Multi-week rolling scheduling run, tracked so an interrupted run can resume"""
+    __tablename__ = "schedule_job"
+
+    id = Column(Integer, primary_key=True, index=True)
+    start_week_date = Column(DateTime, nullable=False)  # Monday of the first week
+    num_weeks = Column(Integer, nullable=False)
+    completed_weeks = Column(Integer, default=0)  # Weeks 0..completed_weeks-1 are committed
+    status = Column(String, default="running")  # running, completed, interrupted, failed
+    error = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+
+class ScheduleRun(Base):
+    """One auto-schedule run with its compressed decision trace (see decision_trace.py)"""
+    __tablename__ = "schedule_run"
+
+    id = Column(Integer, primary_key=True, index=True)
+    week_start_date = Column(DateTime, nullable=False, index=True)  # Midnight of the week's Monday
+    started_at = Column(DateTime, nullable=False)
+    duration_ms = Column(Float, nullable=False)
+    slot_count = Column(Integer, nullable=False)  # Slots recorded, across all apply attempts
+    top_k = Column(Integer, nullable=False)  # Candidates kept per slot
+    assignments_made = Column(Integer, default=0)
+    conflicts = Column(Integer, default=0)
+    trace = Column(LargeBinary, nullable=False)
+
 
 class FairnessMetric(Base):
     __tablename__ = "fairness_metric"
@@ -90,3 +183,60 @@ class FairnessMetric(Base):
     avoided_shifts_count = Column(Integer, default=0)
 
     staff = relationship("Staff", back_populates="fairness_metrics")
+
+
+def week_start_filter(week_start_date: datetime):
+    """Filter WeekAssignment rows to the week starting on week_start_date's date.
+
+    CAST(week_start_date AS DATE) has numeric affinity on SQLite and never equals
+    a date, so compare against the bounds of the day instead (also index friendly).
+    """
+    day_start = datetime.combine(week_start_date.date(), datetime.min.time())
+    return and_(
+        WeekAssignment.week_start_date >= day_start,
+        WeekAssignment.week_start_date < day_start + timedelta(days=1)
+    )
+
+
+def shift_times(week_start_date: datetime, day_of_week: int, start_time: str, end_time: str):
+    """Concrete (shift_date, start_at, end_at) for an assignment."""
+    shift_date = week_start_date.date() + timedelta(days=day_of_week)
+    start_at = datetime.combine(shift_date, time.fromisoformat(start_time))
+    end_at = datetime.combine(shift_date, time.fromisoformat(end_time))
+    if end_at <= start_at:
+        end_at += timedelta(days=1)
+    return shift_date, start_at, end_at
+
+
+@event.listens_for(WeekAssignment, "before_insert")
+@event.listens_for(WeekAssignment, "before_update")
+def _materialize_shift_times(mapper, connection, target):
+    """Keep shift_date/start_at/end_at in step on every ORM insert or update.
+
+    Core bulk inserts bypass this and must fill the columns with shift_times().
+    """
+    times = connection.execute(
+        select(ShiftTemplate.start_time, ShiftTemplate.end_time).where(ShiftTemplate.id == target.shift_template_id)
+    ).first()
+    if times is None:
+        return
+    target.shift_date, target.start_at, target.end_at = shift_times(
+        target.week_start_date, target.day_of_week, times.start_time, times.end_time
+    )
+
+
+def refresh_shift_times(db, template: ShiftTemplate):
+    """Recompute start_at/end_at of a template's assignments after its times change. Does not commit."""
+    rows = db.query(WeekAssignment.id, WeekAssignment.week_start_date, WeekAssignment.day_of_week).filter(
+        WeekAssignment.shift_template_id == template.id
+    ).all()
+    if not rows:
+        return
+    params = []
+    for assignment_id, week_start_date, day_of_week in rows:
+        shift_date, start_at, end_at = shift_times(week_start_date, day_of_week, template.start_time, template.end_time)
+        params.append({"row_id": assignment_id, "shift_date": shift_date, "start_at": start_at, "end_at": end_at})
+    db.connection().execute(
+        update(WeekAssignment.__table__).where(WeekAssignment.__table__.c.id == bindparam("row_id")),
+        params
+    )
@@ -0,0 +1,245 @@
+"""Opt-in per-request profiling.
+
+Enable with ``PROFILING_ENABLED=1`` and then send ``X-Profile: 1`` (or add
+``?profile=1``) to the request you want to look at. The request runs under
+cProfile and every SQL statement it executes is recorded with its duration.
+Results are written to ``PROFILE_DIR`` (default ``./profiles``) as a pstats
+``.prof`` file, loadable with ``python -m pstats`` or snakeviz, plus a
+``.json`` summary with the hottest functions, their callees, the SQL list and
+section timings. The response carries the profile id in ``X-Profile-Id``.
+
+Work that runs off the event loop thread (sync endpoints, the scheduling
+executor) is picked up through ``@profiled`` sections, which start their own
+profiler in that thread while a profile is active.
+"""
+import cProfile
+import functools
+import inspect
+import json
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Dict, List, Optional
+from fastapi import HTTPException
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "0") == "1"
+PROFILE_DIR = os.getenv("PROFILE_DIR", "./profiles")
+PROFILE_TOP_FUNCTIONS = 40
+
+_active_profile: ContextVar[Optional["RequestProfile"]] = ContextVar("active_profile", default=None)
+
+
+class RequestProfile:
+    """Everything captured for one profiled request."""
+
+    def __init__(self, method: str, path: str):
+        self.id = f"{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        self.method = method
+        self.path = path
+        self.started = time.perf_counter()
+        self.profilers: List[cProfile.Profile] = []
+        self.sql: List[Dict] = []
+        self.sections: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    def add_profiler(self, profiler: cProfile.Profile):
+        with self._lock:
+            self.profilers.append(profiler)
+
+    def add_sql(self, statement: str, duration_ms: float):
+        with self._lock:
+            self.sql.append({"statement": statement, "duration_ms": round(duration_ms, 3)})
+
+    def add_section(self, name: str, duration_ms: float):
+        # Aggregated by name: fairness scoring alone can run thousands of times per request
+        with self._lock:
+            section = self.sections.setdefault(name, {"name": name, "calls": 0, "total_ms": 0.0, "max_ms": 0.0})
+            section["calls"] += 1
+            section["total_ms"] += duration_ms
+            section["max_ms"] = max(section["max_ms"], duration_ms)
+
+    def save(self, status_code: int) -> str:
+        """Write the .prof and .json files and return the JSON path."""
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        slug = re.sub(r"[^A-Za-z0-9]+", "_", self.path).strip("_") or "root"
+        base = os.path.join(PROFILE_DIR, f"{self.id}_{self.method}_{slug}")
+
+        stats = None
+        for profiler in self.profilers:
+            if stats is None:
+                stats = pstats.Stats(profiler)
+            else:
+                stats.add(profiler)
+        if stats is not None:
+            stats.dump_stats(base + ".prof")
+
+        summary = {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "status_code": status_code,
+            "total_ms": round((time.perf_counter() - self.started) * 1000, 3),
+            "sections": [
+                dict(section, total_ms=round(section["total_ms"], 3), max_ms=round(section["max_ms"], 3))
+                for section in sorted(self.sections.values(), key=lambda x: -x["total_ms"])
+            ],
+            "sql_count": len(self.sql),
+            "sql_total_ms": round(sum(q["duration_ms"] for q in self.sql), 3),
+            "sql": self.sql,
+            "call_tree": _call_tree(stats) if stats is not None else [],
+        }
+        with open(base + ".json", "w") as f:
+            json.dump(summary, f, indent=2)
+        return base + ".json"
+
+
+def _func_label(func) -> str:
+    filename, line, name = func
+    return f"{os.path.basename(filename)}:{line}({name})" if line else name
+
+
+def _call_tree(stats: pstats.Stats) -> List[Dict]:
+    """Top functions by cumulative time, each with its direct callees."""
+    stats.calc_callees()
+    rows = sorted(stats.stats.items(), key=lambda item: -item[1][3])[:PROFILE_TOP_FUNCTIONS]
+    tree = []
+    for func, (primitive_calls, total_calls, own_time, cumulative, _callers) in rows:
+        callees = stats.all_callees.get(func, {})
+        tree.append({
+            "function": _func_label(func),
+            "calls": total_calls,
+            "own_ms": round(own_time * 1000, 3),
+            "cumulative_ms": round(cumulative * 1000, 3),
+            "callees": [
+                {"function": _func_label(callee), "cumulative_ms": round(info[3] * 1000, 3)}
+                for callee, info in sorted(callees.items(), key=lambda item: -item[1][3])[:10]
+            ],
+        })
+    return tree
+
+
+def _start_thread_profiler(profile: RequestProfile) -> Optional[cProfile.Profile]:
+    """Start a profiler on this thread unless one is already running here."""
+    if sys.getprofile() is not None:
+        return None
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Python 3.12+ allows only one active cProfile per interpreter; it already sees this thread
+        return None
+    profile.add_profiler(profiler)
+    return profiler
+
+
+def profiled(name: str):
+    """Decorator marking a section to time (and profile off the event loop) when a profile is active."""
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                profile = _active_profile.get()
+                if profile is None:
+                    return await func(*args, **kwargs)
+                started = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    profile.add_section(name, (time.perf_counter() - started) * 1000)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            profile = _active_profile.get()
+            if profile is None:
+                return func(*args, **kwargs)
+            profiler = _start_thread_profiler(profile)
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                if profiler is not None:
+                    profiler.disable()
+                profile.add_section(name, (time.perf_counter() - started) * 1000)
+        return wrapper
+    return decorator
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _active_profile.get() is not None:
+        conn.info.setdefault("profile_query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _active_profile.get()
+    if profile is None:
+        return
+    starts = conn.info.get("profile_query_start")
+    if starts:
+        profile.add_sql(statement, (time.perf_counter() - starts.pop()) * 1000)
+
+
+def _wants_profile(request) -> bool:
+    return request.headers.get("x-profile") == "1" or request.query_params.get("profile") == "1"
+
+
+def install(app):
+    """Register the profiling middleware and SQL listeners (no-op unless PROFILING_ENABLED=1)."""
+    if not PROFILING_ENABLED:
+        return
+
+    # On the Engine class, so site engines opened later are covered too
+    event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+
+    @app.middleware("http")
+    async def profile_request(request, call_next):
+        if not _wants_profile(request):
+            return await call_next(request)
+
+        profile = RequestProfile(request.method, request.url.path)
+        token = _active_profile.set(profile)
+        profiler = _start_thread_profiler(profile)
+        status_code = 500
+        try:
+            response = await call_next(request)
+            status_code = response.status_code
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            _active_profile.reset(token)
+            path = profile.save(status_code)
+            print(f"DEBUG: Saved request profile {path}")
+        response.headers["X-Profile-Id"] = profile.id
+        return response
+
+    @app.get("/api/profiles/")
+    def list_profiles():
+        """List saved request profiles, newest first"""
+        if not os.path.isdir(PROFILE_DIR):
+            return []
+        summaries = []
+        for filename in sorted(os.listdir(PROFILE_DIR), reverse=True):
+            if filename.endswith(".json"):
+                with open(os.path.join(PROFILE_DIR, filename)) as f:
+                    data = json.load(f)
+                summaries.append({key: data[key] for key in ("id", "method", "path", "status_code", "total_ms", "sql_count", "sql_total_ms")})
+        return summaries
+
+    @app.get("/api/profiles/{profile_id}")
+    def get_profile(profile_id: str):
+        """Fetch one saved profile summary (call tree, SQL statements, timings)"""
+        if os.path.isdir(PROFILE_DIR):
+            for filename in os.listdir(PROFILE_DIR):
+                if filename.startswith(profile_id + "_") and filename.endswith(".json"):
+                    with open(os.path.join(PROFILE_DIR, filename)) as f:
+                        return json.load(f)
+        raise HTTPException(status_code=404, detail="Profile not found")
@@ -0,0 +1,171 @@
+"""Process-level cache of staff and shift template reference data.
+
+Staff and templates change a few times a day but are read by every list
+endpoint and several times per scheduling call. ``ReferenceCache`` keeps them
+as immutable ``NamedTuple`` records and reloads them only after a write.
+
+Writers call ``invalidate(db)``, which bumps the in-process version and replaces
+a small stamp file next to the SQLite database. Readers compare the stamp's
+inode/mtime (one ``stat`` call, no SQLite) so caches in other uvicorn workers
+notice the change too. Each site's database has its own cache and stamp file.
+"""
+import os
+import tempfile
+import threading
+from datetime import datetime
+from types import MappingProxyType
+from typing import Mapping, NamedTuple, Optional, Tuple
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+import models
+from database import PerDatabase
+
+
+class StaffRecord(NamedTuple):
+    id: int
+    name: str
+    qualifications: Tuple[str, ...]
+    max_shifts_per_week: int
+    created_at: datetime
+
+
+class TemplateRecord(NamedTuple):
+    id: int
+    name: str
+    days_of_week: Tuple[int, ...]
+    start_time: str
+    end_time: str
+    required_staff: int
+    required_qualifications: Mapping[str, int]
+    is_active: bool
+
+
+class ReferenceData(NamedTuple):
+    version: int
+    stamp: Optional[tuple]
+    staff: Tuple[StaffRecord, ...]
+    staff_by_id: Mapping[int, StaffRecord]
+    templates: Tuple[TemplateRecord, ...]  # Including inactive ones
+    templates_by_id: Mapping[int, TemplateRecord]
+    active_templates: Tuple[TemplateRecord, ...]
+
+
+def _stamp_path_for(database_path: Optional[str]) -> Optional[str]:
+    return database_path + ".refstamp" if database_path is not None else None
+
+
+def _load(db: Session, version: int, stamp: Optional[tuple]) -> ReferenceData:
+    staff = tuple(
+        StaffRecord(s.id, s.name, tuple(s.qualifications or ()), s.max_shifts_per_week, s.created_at)
+        for s in db.query(models.Staff).order_by(models.Staff.id).all()
+    )
+    templates = tuple(
+        TemplateRecord(
+            t.id, t.name, tuple(t.days_of_week or ()), t.start_time, t.end_time, t.required_staff,
+            MappingProxyType(dict(t.required_qualifications or {})), bool(t.is_active)
+        )
+        for t in db.query(models.ShiftTemplate).order_by(models.ShiftTemplate.id).all()
+    )
+    return ReferenceData(
+        version=version,
+        stamp=stamp,
+        staff=staff,
+        staff_by_id=MappingProxyType({s.id: s for s in staff}),
+        templates=templates,
+        templates_by_id=MappingProxyType({t.id: t for t in templates}),
+        active_templates=tuple(t for t in templates if t.is_active),
+    )
+
+
+class ReferenceCache:
+    def __init__(self, stamp_path: Optional[str]):
+        self.stamp_path = stamp_path
+        self.version = 0
+        self._data: Optional[ReferenceData] = None
+        self._lock = threading.Lock()
+
+    def _current_stamp(self) -> Optional[tuple]:
+        if self.stamp_path is None:
+            return None
+        try:
+            stat = os.stat(self.stamp_path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_ino, stat.st_mtime_ns)
+
+    def invalidate(self):
+        """Drop cached data here and signal other processes sharing the database."""
+        with self._lock:
+            self.version += 1
+            self._data = None
+        if self.stamp_path is not None:
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.stamp_path))
+            with os.fdopen(fd, "w") as f:
+                f.write(f"{os.getpid()}:{self.version}")
+            os.replace(tmp_path, self.stamp_path)
+
+    def _fresh(self) -> Optional[ReferenceData]:
+        data = self._data
+        if data is not None and data.version == self.version and data.stamp == self._current_stamp():
+            return data
+        return None
+
+    def get(self, db: Session) -> ReferenceData:
+        """Cached reference data, loading it with db on a miss."""
+        data = self._fresh()
+        if data is not None:
+            return data
+
+        version, stamp = self.version, self._current_stamp()
+        data = _load(db, version, stamp)
+        with self._lock:
+            # Only keep it if nothing was invalidated while we were loading
+            if self.version == version:
+                self._data = data
+        return data
+
+    async def get_async(self, db: AsyncSession) -> ReferenceData:
+        data = self._fresh()
+        if data is not None:
+            return data
+        return await db.run_sync(self.get)
+
+    # Convenience accessors
+    def staff(self, db: Session) -> Tuple[StaffRecord, ...]:
+        return self.get(db).staff
+
+    def staff_by_id(self, db: Session) -> Mapping[int, StaffRecord]:
+        return self.get(db).staff_by_id
+
+    def templates(self, db: Session, active_only: bool = True) -> Tuple[TemplateRecord, ...]:
+        data = self.get(db)
+        return data.active_templates if active_only else data.templates
+
+
+class ReferenceCaches(PerDatabase):
+    """One ReferenceCache per database (each site has its own), picked from the session's engine."""
+
+    def __init__(self):
+        super().__init__(lambda path: ReferenceCache(_stamp_path_for(path)))
+
+    def get(self, db: Session) -> ReferenceData:
+        return self.for_bind(db).get(db)
+
+    async def get_async(self, db: AsyncSession) -> ReferenceData:
+        return await self.for_bind(db).get_async(db)
+
+    def invalidate(self, bind):
+        """Call after committing a staff/template write through bind (a session or engine)."""
+        self.for_bind(bind).invalidate()
+
+    def staff(self, db: Session) -> Tuple[StaffRecord, ...]:
+        return self.for_bind(db).staff(db)
+
+    def staff_by_id(self, db: Session) -> Mapping[int, StaffRecord]:
+        return self.for_bind(db).staff_by_id(db)
+
+    def templates(self, db: Session, active_only: bool = True) -> Tuple[TemplateRecord, ...]:
+        return self.for_bind(db).templates(db, active_only)
+
+
+reference_cache = ReferenceCaches()
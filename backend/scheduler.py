@@ -1,11 +1,61 @@
 from datetime import datetime, timedelta
-from typing import List, Dict, Tuple
+from typing import Iterator, List, Dict, Tuple
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import Session
 import models
+from constraints import ConstraintTable, REASON_MAX_SHIFTS, REASON_OK
+from coverage import WeekCoverage, week_coverage
+from decision_trace import TRACE_ENABLED, DecisionTrace, save_run
+from feasibility import compute_week_feasibility
+from load_counters import adjust_week_loads, get_loads, get_week_loads
+from archive import NO_ROLLUP, get_rollup_totals_by_staff, latest_archived_week
+from profiling import profiled
+from reference_cache import reference_cache
+from snapshot import Snapshot, snapshot_store
+from events import assignment_payload, change_feed
+from fairness_cache import normalize_window
+from week_locks import week_lock
+
+# Generate-and-apply rounds when rows are lost to concurrent writes
+MAX_APPLY_ATTEMPTS = 3
 
 class SchedulingEngine:
     def __init__(self, db: Session):
         self.db = db
+        self._constraint_tables = {}  # week date -> ConstraintTable
+        self._snapshot = None
+        self._latest_archived_week = False  # Not looked up yet (None: nothing archived)
+        self._rollup_totals = {}  # (start, end) -> {staff_id: rollup totals}
+
+    def get_rollup_totals(self, staff_id: int, start_date: datetime, end_date: datetime) -> Tuple[int, float, int, int]:
+        """Archived (shifts, preference_sum, preferred, avoided) in a window, loaded for all staff once per run."""
+        if self._latest_archived_week is False:
+            self._latest_archived_week = latest_archived_week(self.db)
+        if self._latest_archived_week is None or start_date > self._latest_archived_week:
+            return NO_ROLLUP
+
+        # Exact window, like the assignment query (rollup weeks need not start at
+        # midnight); ±days windows are already whole days, so the key is stable
+        totals = self._rollup_totals.get((start_date, end_date))
+        if totals is None:
+            totals = self._rollup_totals[(start_date, end_date)] = get_rollup_totals_by_staff(self.db, start_date, end_date)
+        return totals.get(staff_id, NO_ROLLUP)
+
+    def get_snapshot(self) -> Snapshot:
+        """Scheduling inputs snapshot, checked for freshness once per run (and per compiled week)."""
+        if self._snapshot is None:
+            self._snapshot = snapshot_store.get(self.db)
+        return self._snapshot
+
+    def get_constraint_table(self, week_start_date: datetime) -> ConstraintTable:
+        """Compiled hard constraints for a week, built once and reused for the rest of the run."""
+        week_date_only = week_start_date.date()
+        table = self._constraint_tables.get(week_date_only)
+        if table is None:
+            self._snapshot = snapshot_store.get(self.db)
+            table = ConstraintTable.compile(self.db, week_start_date, snapshot=self._snapshot)
+            self._constraint_tables[week_date_only] = table
+        return table
 
     def check_constraints(
         self,
@@ -14,96 +64,53 @@ class SchedulingEngine:
         week_start_date: datetime,
         specific_day: int = None
     ) -> Tuple[bool, List[str]]:
-        """Check if staff member can be assigned to shift based on hard constraints."""
-        violations = []
+        """Check if staff member can be assigned to shift based on hard constraints.
 
-        # Check availability for the specific day being assigned
-        # If specific_day is provided, only check that day
-        # Otherwise check if they're available on at least ONE day in the template
-        day_names = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+        If specific_day is provided, only that day is checked; otherwise the staff
+        member only needs to be available on at least ONE day in the template.
+        Violation messages are rendered only when the check fails.
+        """
+        table = self.get_constraint_table(week_start_date)
+        if staff.id not in table.staff_index or shift_template.id not in table.template_index:
+            # Created after the table was compiled - rebuild it
+            self._constraint_tables.pop(week_start_date.date(), None)
+            table = self.get_constraint_table(week_start_date)
 
         if specific_day is not None:
-            # Checking a specific day assignment
-            availability = self.db.query(models.Availability).filter(
-                models.Availability.staff_id == staff.id,
-                models.Availability.day_of_week == specific_day,
-                models.Availability.shift_template_id == shift_template.id
-            ).first()
-
-            if availability and not availability.is_available:
-                violations.append(f"{staff.name} is not available for {shift_template.name} on {day_names[specific_day]}")
+            code = table.reason(staff.id, shift_template.id, specific_day)
         else:
-            # General check - are they available on at least one day?
-            available_on_any_day = False
-            for day in shift_template.days_of_week:
-                availability = self.db.query(models.Availability).filter(
-                    models.Availability.staff_id == staff.id,
-                    models.Availability.day_of_week == day,
-                    models.Availability.shift_template_id == shift_template.id
-                ).first()
-
-                # If no availability record, or record shows available
-                if not availability or availability.is_available:
-                    available_on_any_day = True
-                    break
-
-            if not available_on_any_day:
-                violations.append(f"{staff.name} is not available for {shift_template.name} on any day")
-
-        # Check qualifications
-        if shift_template.required_qualifications:
-            staff_quals = set(staff.qualifications or [])
-            for qual, min_count in shift_template.required_qualifications.items():
-                if qual not in staff_quals:
-                    violations.append(f"{staff.name} lacks required qualification: {qual}")
-
-        # Check if already assigned to this shift template on this specific day for this week
-        from sqlalchemy import cast, Date
-        week_date_only = week_start_date.date()
-
-        if specific_day is not None:
-            # Check for assignment on this specific day
-            existing_assignment = self.db.query(models.WeekAssignment).filter(
-                models.WeekAssignment.staff_id == staff.id,
-                models.WeekAssignment.shift_template_id == shift_template.id,
-                models.WeekAssignment.day_of_week == specific_day,
-                cast(models.WeekAssignment.week_start_date, Date) == week_date_only
-            ).first()
+            code = table.template_reason(staff.id, shift_template.id)
 
-            if existing_assignment:
-                violations.append(f"{staff.name} is already assigned to {shift_template.name} on {day_names[specific_day]} this week")
-                return False, violations
+        if code == REASON_OK:
+            return True, []
+        return False, table.explain(staff.id, shift_template.id, specific_day)
 
-        # Check if already assigned to another shift at overlapping time on the same day
-        if specific_day is not None:
-            # Only check for conflicts on this specific day
-            same_day_assignments = self.db.query(models.WeekAssignment).filter(
-                models.WeekAssignment.staff_id == staff.id,
-                models.WeekAssignment.day_of_week == specific_day,
-                cast(models.WeekAssignment.week_start_date, Date) == week_date_only
-            ).all()
-
-            for assignment in same_day_assignments:
-                if assignment.shift_template_id == shift_template.id:
-                    continue  # Skip same template (already checked above)
-
-                # Check for time overlap
-                # TODO: Add actual time overlap checking logic
-                violations.append(f"{staff.name} is already assigned to {assignment.shift_template.name} on {day_names[specific_day]}")
-
-        # Check max shifts per week
-        week_shift_count = self.db.query(models.WeekAssignment).filter(
-            models.WeekAssignment.staff_id == staff.id,
-            cast(models.WeekAssignment.week_start_date, Date) == week_date_only
-        ).count()
-
-        if week_shift_count >= staff.max_shifts_per_week:
-            violations.append(f"{staff.name} has reached maximum shifts per week ({staff.max_shifts_per_week})")
-
-        return len(violations) == 0, violations
+    def explain_constraints(
+        self,
+        week_start_date: datetime,
+        shift_template_id: int,
+        day_of_week: int = None,
+        staff_id: int = None
+    ) -> List[Dict]:
+        """Explain which hard constraints block staff from a shift (one staff member or everyone)."""
+        table = self.get_constraint_table(week_start_date)
+        staff_ids = [staff_id] if staff_id is not None else [s.id for s in table.staff]
+        return [table.describe(sid, shift_template_id, day_of_week) for sid in staff_ids]
 
     def get_preference_score(self, staff: models.Staff, shift_template: models.ShiftTemplate, specific_day: int = None) -> float:
         """Get staff preference score for a shift template across all its days."""
+        snapshot = self.get_snapshot()
+        if snapshot.knows(staff.id, shift_template.id):
+            if specific_day is not None:
+                score = snapshot.preference(staff.id, shift_template.id, specific_day)
+                return score if score is not None else 0.0
+            scores = [
+                score for score in (snapshot.preference(staff.id, shift_template.id, day) for day in shift_template.days_of_week)
+                if score is not None
+            ]
+            return sum(scores) / len(scores) if scores else 0.0
+
+        # Staff or template newer than the snapshot: look it up directly
         if specific_day is not None:
             # If checking a specific day, return that day's score
             preference = self.db.query(models.Preference).filter(
@@ -131,6 +138,7 @@ class SchedulingEngine:
         # Return average preference, or 0.0 if no preferences set
         return total_score / days_with_prefs if days_with_prefs > 0 else 0.0
 
+    @profiled("SchedulingEngine.calculate_fairness_score")
     def calculate_fairness_score(
         self,
         staff: models.Staff,
@@ -142,21 +150,14 @@ class SchedulingEngine:
 
         Args:
             staff: Staff member to calculate metrics for
-            period_days: Bidirectional period (±days from now). Overridden by start_date/end_date if provided.
+            period_days: Bidirectional period (±days from now, rounded inwards to midnights). Overridden by
+                start_date/end_date if provided.
             start_date: Custom start date for analysis window
             end_date: Custom end date for analysis window
         """
-        # Use custom date range if provided, otherwise use bidirectional period
-        if start_date is not None and end_date is not None:
-            past_cutoff_date = start_date
-            future_cutoff_date = end_date
-        elif period_days is not None:
-            past_cutoff_date = datetime.utcnow() - timedelta(days=period_days)
-            future_cutoff_date = datetime.utcnow() + timedelta(days=period_days)
-        else:
-            # Default to ±30 days
-            past_cutoff_date = datetime.utcnow() - timedelta(days=30)
-            future_cutoff_date = datetime.utcnow() + timedelta(days=30)
+        # Custom date range if provided, otherwise ±period_days (default 30); the same
+        # window /api/fairness/all caches results under
+        past_cutoff_date, future_cutoff_date = normalize_window(period_days, start_date, end_date)
 
         # Get all assignments in period (both past and future scheduled weeks)
         assignments = self.db.query(models.WeekAssignment).filter(
@@ -165,7 +166,12 @@ class SchedulingEngine:
             models.WeekAssignment.week_start_date <= future_cutoff_date
         ).all()
 
-        if not assignments:
+        # Archived weeks only contribute their rollups
+        archived_shifts, archived_sum, archived_preferred, archived_avoided = self.get_rollup_totals(
+            staff.id, past_cutoff_date, future_cutoff_date
+        )
+
+        if not assignments and not archived_shifts:
             return {
                 "total_shifts": 0,
                 "preference_fulfillment": 0.0,
@@ -173,10 +179,10 @@ class SchedulingEngine:
                 "avoided_count": 0
             }
 
-        total_shifts = len(assignments)
-        preference_sum = 0.0
-        preferred_count = 0
-        avoided_count = 0
+        total_shifts = len(assignments) + archived_shifts
+        preference_sum = archived_sum
+        preferred_count = archived_preferred
+        avoided_count = archived_avoided
 
         for assignment in assignments:
             shift_template = assignment.shift_template
@@ -198,32 +204,38 @@ class SchedulingEngine:
             "avoided_count": avoided_count
         }
 
+    def check_feasibility(self, week_start_date: datetime, shift_templates: List[models.ShiftTemplate] = None) -> Dict:
+        """Upper-bound the week's achievable coverage with max-flow before assigning anything."""
+        return compute_week_feasibility(self.db, self.get_constraint_table(week_start_date), shift_templates)
+
+    @profiled("SchedulingEngine.generate_schedule_algorithmically")
     def generate_schedule_algorithmically(
         self,
         shift_templates: List[models.ShiftTemplate],
-        week_start_date: datetime
+        week_start_date: datetime,
+        coverage: WeekCoverage = None,
+        trace: DecisionTrace = None
     ) -> Dict:
-        """Generate optimal schedule using deterministic algorithm with fairness consideration."""
+        """Generate optimal schedule using deterministic algorithm with fairness consideration.
 
-        from sqlalchemy import cast, Date
-        week_date_only = week_start_date.date()
+        Pass the week's coverage if it is already known and current; otherwise it is queried.
+        With a trace, each slot's top candidates and rejection counts are recorded into it.
+        """
 
         # Get all staff
-        all_staff = self.db.query(models.Staff).all()
+        all_staff = reference_cache.staff(self.db)
 
-        # Build list of all shift slots that need filling
+        # Hard constraints compiled once for the whole run
+        table = self.get_constraint_table(week_start_date)
+
+        # Build list of all shift slots that need filling (one grouped count for the week)
+        if coverage is None:
+            coverage = week_coverage(self.db, week_start_date)
         shift_slots = []
         for template in shift_templates:
             for day in template.days_of_week:
-                # Check how many already assigned
-                assigned_count = self.db.query(models.WeekAssignment).filter(
-                    models.WeekAssignment.shift_template_id == template.id,
-                    models.WeekAssignment.day_of_week == day,
-                    cast(models.WeekAssignment.week_start_date, Date) == week_date_only
-                ).count()
-
                 # Add slots for remaining needed staff
-                for slot in range(assigned_count, template.required_staff):
+                for slot in range(coverage.missing(template.id, day)):
                     shift_slots.append({
                         "shift_template_id": template.id,
                         "day_of_week": day,
@@ -237,24 +249,15 @@ class SchedulingEngine:
         past_cutoff = datetime.utcnow() - timedelta(days=30)
         future_cutoff = datetime.utcnow() + timedelta(days=30)
 
+        # One range scan over the weekly counters gives both the 60-day window
+        # totals and this week's counts (for max_shifts_per_week enforcement)
+        week_counts, window_totals = get_loads(self.db, week_start_date, past_cutoff, future_cutoff)
+
         staff_shift_counts = {}
         for staff in all_staff:
-            # Count all assignments in the 60-day window (past and future)
-            total_in_window = self.db.query(models.WeekAssignment).filter(
-                models.WeekAssignment.staff_id == staff.id,
-                models.WeekAssignment.week_start_date >= past_cutoff,
-                models.WeekAssignment.week_start_date <= future_cutoff
-            ).count()
-
-            # But also track just this week for max_shifts_per_week enforcement
-            this_week_count = self.db.query(models.WeekAssignment).filter(
-                models.WeekAssignment.staff_id == staff.id,
-                cast(models.WeekAssignment.week_start_date, Date) == week_date_only
-            ).count()
-
             staff_shift_counts[staff.id] = {
-                'total': total_in_window,
-                'this_week': this_week_count
+                'total': window_totals.get(staff.id, 0),
+                'this_week': week_counts.get(staff.id, 0)
             }
 
         assignments = []
@@ -272,29 +275,49 @@ class SchedulingEngine:
                 staff_data = staff_shift_counts.get(staff.id, {'total': 0, 'this_week': 0})
                 if staff_data['this_week'] >= staff.max_shifts_per_week:
                     continue
-                valid, _ = self.check_constraints(staff, template, week_start_date, specific_day=day)
-                if valid:
+                if table.reason(staff.id, template.id, day) == REASON_OK:
                     count += 1
             return count
 
         shift_slots.sort(key=count_available_staff)
 
+        if trace is not None:
+            trace.reserve(len(shift_slots))
+
+        # Qualification minimums per (template, day), starting from what is already assigned
+        staff_masks = table.staff_masks
+        slot_coverages = {}
+        for slot in shift_slots:
+            key = (slot["shift_template_id"], slot["day_of_week"])
+            if key not in slot_coverages:
+                slot_coverages[key] = table.slot_coverage(*key)
+
         # Assign staff to slots
         for slot in shift_slots:
             template = slot["template"]
             day = slot["day_of_week"]
+            slot_coverage = slot_coverages[(template.id, day)]
+            unmet = slot_coverage.unmet_mask()
+            tight = slot_coverage.tight_mask()
 
             # Find best available staff for this slot
             candidates = []
+            fallback = []  # Eligible but would leave the slot short of a qualification
+            if trace is not None:
+                trace.begin_slot(template.id, day)
             for staff in all_staff:
                 staff_data = staff_shift_counts.get(staff.id, {'total': 0, 'this_week': 0})
 
                 # Check if staff can take this shift this week
                 if staff_data['this_week'] >= staff.max_shifts_per_week:
+                    if trace is not None:
+                        trace.reject(REASON_MAX_SHIFTS)
                     continue
 
-                valid, violations = self.check_constraints(staff, template, week_start_date, specific_day=day)
-                if not valid:
+                reason = table.reason(staff.id, template.id, day)
+                if reason != REASON_OK:
+                    if trace is not None:
+                        trace.reject(reason)
                     continue
 
                 # Calculate priority score (lower is better)
@@ -309,11 +332,7 @@ class SchedulingEngine:
                 working_double = False
 
                 # Check database for existing assignments
-                existing_on_day = self.db.query(models.WeekAssignment).filter(
-                    models.WeekAssignment.staff_id == staff.id,
-                    models.WeekAssignment.day_of_week == day,
-                    cast(models.WeekAssignment.week_start_date, Date) == week_date_only
-                ).first()
+                existing_on_day = (staff.id, day) in table.day_assignments
 
                 # Check current batch assignments
                 if staff.id in staff_days_working and day in staff_days_working[staff.id]:
@@ -321,22 +340,38 @@ class SchedulingEngine:
                 elif existing_on_day:
                     working_double = True
 
-                # Priority: avoid double shifts, balance workload, consider preferences, balance fairness
+                staff_mask = staff_masks.get(staff.id, 0)
+                qualification_bonus = bin(staff_mask & unmet).count("1") * 20
+
+                # Priority: avoid double shifts, balance workload, consider preferences, balance fairness,
+                # and fill unmet qualification minimums while there are seats to spare
                 priority = (
                     (100 if working_double else 0)  # Heavily penalize double shifts - avoid unless necessary
                     + current_load * 10  # Prioritize balancing workload
                     - pref_score * 5   # Consider preferences
                     - fairness_score * 3  # Balance historical fairness
+                    - qualification_bonus  # Cover qualifications the slot still needs
                 )
 
-                candidates.append({
+                (candidates if staff_mask & tight == tight else fallback).append({
                     "staff": staff,
                     "priority": priority,
                     "current_load": current_load,
-                    "pref_score": pref_score
+                    "pref_score": pref_score,
+                    "working_double": working_double,
+                    "fairness_score": fairness_score,
+                    "qualification_bonus": qualification_bonus
                 })
 
+            fallback_only = not candidates and bool(fallback)
             if not candidates:
+                # Nobody holding the reserved qualifications is free; fill the seat anyway
+                # and report the shortfall below
+                candidates = fallback
+
+            if not candidates:
+                if trace is not None:
+                    trace.end_slot(candidates, False)
                 day_names = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
                 conflicts.append({
                     "shift_template_id": template.id,
@@ -348,6 +383,8 @@ class SchedulingEngine:
             # Pick best candidate
             candidates.sort(key=lambda x: x["priority"])
             best = candidates[0]
+            if trace is not None:
+                trace.end_slot(candidates, fallback_only)
 
             assignments.append({
                 "shift_template_id": template.id,
@@ -356,6 +393,8 @@ class SchedulingEngine:
                 "reasoning": f"Load: {best['current_load']}, Pref: {best['pref_score']:.1f}"
             })
 
+            slot_coverage.add(staff_masks.get(best["staff"].id, 0))
+
             # Update workload tracker (both total and this week)
             staff_data = staff_shift_counts.get(best["staff"].id, {'total': 0, 'this_week': 0})
             staff_shift_counts[best["staff"].id] = {
@@ -368,6 +407,19 @@ class SchedulingEngine:
                 staff_days_working[best["staff"].id] = set()
             staff_days_working[best["staff"].id].add(day)
 
+        # Slots left below a qualification minimum
+        qualification_names = table.qualifications.names
+        day_names = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+        for (template_id, day), slot_coverage in slot_coverages.items():
+            for bit, needed in slot_coverage.deficits.items():
+                if needed > 0:
+                    template = table.template_by_id[template_id]
+                    conflicts.append({
+                        "shift_template_id": template_id,
+                        "day_of_week": day,
+                        "issue": f"{template.name} on {day_names[day]} is short {needed} staff with {qualification_names[bit]}"
+                    })
+
         print(f"DEBUG: Generated {len(assignments)} assignments, {len(conflicts)} conflicts")
 
         # Count double shifts
@@ -400,6 +452,7 @@ class SchedulingEngine:
             }
         }
 
+    @profiled("SchedulingEngine.validate_and_apply_schedule")
     def validate_and_apply_schedule(
         self,
         schedule_result: Dict,
@@ -417,16 +470,17 @@ class SchedulingEngine:
         # Track shift counts per staff in this batch to enforce max_shifts_per_week
         staff_shift_counts = {}  # staff_id -> count of shifts in this batch
 
-        # Initialize with existing counts from database
-        from sqlalchemy import cast, Date
-        week_date_only = week_start_date.date()
-        all_staff = self.db.query(models.Staff).all()
-        for staff in all_staff:
-            existing_count = self.db.query(models.WeekAssignment).filter(
-                models.WeekAssignment.staff_id == staff.id,
-                cast(models.WeekAssignment.week_start_date, Date) == week_date_only
-            ).count()
-            staff_shift_counts[staff.id] = existing_count
+        # Initialize with existing counts from the weekly load counters
+        staff_shift_counts.update(get_week_loads(self.db, week_start_date))
+
+        # Shifts added per staff in this batch, applied to the counters before commit
+        added_counts = {}
+
+        # Staff lookups come from the reference cache instead of a query per assignment
+        staff_by_id = reference_cache.staff_by_id(self.db)
+
+        # Rows to insert, applied in one statement after validation
+        pending = []
 
         print(f"DEBUG: validate_and_apply_schedule called with {len(schedule_result.get('assignments', []))} assignments")
         print(f"DEBUG: Week start date: {week_start_date}")
@@ -464,7 +518,7 @@ class SchedulingEngine:
 
             # Get template and staff
             template = next((t for t in shift_templates if t.id == template_id), None)
-            staff = self.db.query(models.Staff).filter(models.Staff.id == staff_id).first()
+            staff = staff_by_id.get(staff_id)
 
             if not template or not staff:
                 reason = f"Shift template or staff not found (template={template is not None}, staff={staff is not None})"
@@ -503,13 +557,16 @@ class SchedulingEngine:
 
             # Create assignment for this specific day
             day_names = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-            assignment = models.WeekAssignment(
-                shift_template_id=template_id,
-                staff_id=staff_id,
-                week_start_date=week_start_date,
-                day_of_week=day_of_week
-            )
-            self.db.add(assignment)
+            shift_date, start_at, end_at = models.shift_times(week_start_date, day_of_week, template.start_time, template.end_time)
+            pending.append({
+                "shift_template_id": template_id,
+                "staff_id": staff_id,
+                "week_start_date": week_start_date,
+                "day_of_week": day_of_week,
+                "shift_date": shift_date,
+                "start_at": start_at,
+                "end_at": end_at
+            })
 
             # Increment shift count for this staff member
             staff_shift_counts[staff_id] = staff_shift_counts.get(staff_id, 0) + 1
@@ -525,25 +582,119 @@ class SchedulingEngine:
                 "time": f"{template.start_time}-{template.end_time}"
             })
 
+        # Rows another writer inserted since the constraints were compiled are skipped by
+        # the unique index instead of failing the whole batch
+        inserted = []
+        if pending:
+            WA = models.WeekAssignment
+            stmt = sqlite_insert(WA).on_conflict_do_nothing(
+                index_elements=["staff_id", "shift_template_id", "shift_date"]
+            ).returning(
+                WA.id, WA.staff_id, WA.shift_template_id, WA.week_start_date,
+                WA.day_of_week, WA.shift_date, WA.start_at, WA.end_at
+            )
+            inserted = self.db.execute(stmt, pending).all()
+
+        inserted_keys = {(row.staff_id, row.shift_template_id, row.day_of_week) for row in inserted}
+        conflicted = []
+        if len(inserted) < len(pending):
+            kept = []
+            for entry in successful_assignments:
+                if (entry["staff_id"], entry["shift_template_id"], entry["day_of_week"]) in inserted_keys:
+                    kept.append(entry)
+                else:
+                    print(f"DEBUG: CONFLICT - {entry['staff_name']} -> {entry['shift_name']} on {entry['day_name']} was written concurrently")
+                    conflicted.append({
+                        "shift_template_id": entry["shift_template_id"],
+                        "staff_id": entry["staff_id"],
+                        "day_of_week": entry["day_of_week"],
+                        "reason": "Assignment was written concurrently by another request"
+                    })
+            successful_assignments = kept
+
+        for row in inserted:
+            added_counts[row.staff_id] = added_counts.get(row.staff_id, 0) + 1
+
+        adjust_week_loads(self.db, week_start_date, added_counts)
+        payloads = [assignment_payload(row) for row in inserted]
         self.db.commit()
+        change_feed.assignments_added(week_start_date, payloads)
+        # The compiled constraints no longer reflect this week
+        self._constraint_tables.pop(week_start_date.date(), None)
         print(f"DEBUG: Committed {len(successful_assignments)} successful assignments to database")
 
         return {
             "successful": successful_assignments,
             "failed": failed_assignments,
+            "conflicted": conflicted,
             "conflicts": schedule_result.get("conflicts", []),
             "fairness_summary": schedule_result.get("fairness_summary", {})
         }
 
+    def schedule_weeks(self, job: models.ScheduleJob) -> Iterator[Dict]:
+        """Schedule a job's weeks one at a time, yielding each week's result as soon as it is committed.
+
+        Each week is applied and committed by auto_schedule on its own, then the
+        job's progress is recorded. Resuming a job starts from completed_weeks;
+        re-running a week that committed just before an interruption is harmless
+        because auto_schedule only fills slots that are still missing.
+        """
+        job.status = "running"
+        job.updated_at = datetime.utcnow()
+        self.db.commit()
+
+        try:
+            for week_index in range(job.completed_weeks, job.num_weeks):
+                week_start_date = job.start_week_date + timedelta(weeks=week_index)
+                result = self.auto_schedule(week_start_date)
+
+                job.completed_weeks = week_index + 1
+                job.updated_at = datetime.utcnow()
+                self.db.commit()
+
+                conflicts = result.get("conflicts", [])
+                yield {
+                    "job_id": job.id,
+                    "week_index": week_index,
+                    "week_start_date": week_start_date.date().isoformat(),
+                    "message": result.get("message"),
+                    "assignments": result.get("successful", []),
+                    "failed_count": len(result.get("failed", [])),
+                    "conflict_count": len(conflicts),
+                    "conflicts": conflicts[:5],
+                    "min_unfilled": result.get("feasibility", {}).get("min_unfilled", 0)
+                }
+
+            job.status = "completed"
+        except GeneratorExit:
+            # Consumer went away (e.g. the client disconnected) - keep progress for resume
+            self.db.rollback()
+            job.status = "interrupted"
+            raise
+        except Exception as e:
+            self.db.rollback()
+            job.status = "failed"
+            job.error = str(e)
+            raise
+        finally:
+            job.updated_at = datetime.utcnow()
+            self.db.commit()
+
+    @profiled("SchedulingEngine.auto_schedule")
     def auto_schedule(self, week_start_date: datetime) -> Dict:
-        """Main entry point for automatic scheduling."""
+        """Main entry point for automatic scheduling.
 
+        Holds the week's lock for the whole run, so runs for the same week are
+        serialized while different weeks proceed in parallel.
+        """
+        with week_lock(self.db, week_start_date):
+            return self._auto_schedule_locked(week_start_date)
+
+    def _auto_schedule_locked(self, week_start_date: datetime) -> Dict:
         print(f"DEBUG: auto_schedule called for week starting {week_start_date}")
 
         # Get all active shift templates
-        shift_templates = self.db.query(models.ShiftTemplate).filter(
-            models.ShiftTemplate.is_active == True
-        ).all()
+        shift_templates = list(reference_cache.templates(self.db))
 
         print(f"DEBUG: Found {len(shift_templates)} active shift templates")
 
@@ -555,29 +706,17 @@ class SchedulingEngine:
                 "conflicts": []
             }
 
-        # Filter to only templates that need more staff
-        from sqlalchemy import func, cast, Date
-
-        templates_to_fill = []
-        week_date_only = week_start_date.date()
-
-        for template in shift_templates:
-            # Check if ANY day in this template needs more staff
-            needs_filling = False
+        # Filter to only templates that need more staff (one grouped count for the whole week)
+        coverage = week_coverage(self.db, week_start_date)
+        day_names = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+        for template in coverage.templates:
             for day in template.days_of_week:
-                assigned_count = self.db.query(models.WeekAssignment).filter(
-                    models.WeekAssignment.shift_template_id == template.id,
-                    models.WeekAssignment.day_of_week == day,
-                    cast(models.WeekAssignment.week_start_date, Date) == week_date_only
-                ).count()
+                slot = coverage.slots[(template.id, day)]
+                if slot.missing:
+                    print(f"DEBUG: Template '{template.name}' on {day_names[day]} - needs {slot.required}, has {slot.assigned} assigned")
 
-                if assigned_count < template.required_staff:
-                    needs_filling = True
-                    day_names = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-                    print(f"DEBUG: Template '{template.name}' on {day_names[day]} - needs {template.required_staff}, has {assigned_count} assigned")
-
-            if needs_filling:
-                templates_to_fill.append(template)
+        understaffed_ids = {t.id for t in coverage.understaffed_templates()}
+        templates_to_fill = [t for t in shift_templates if t.id in understaffed_ids]
 
         print(f"DEBUG: {len(templates_to_fill)} templates need to be filled")
 
@@ -589,10 +728,37 @@ class SchedulingEngine:
                 "conflicts": []
             }
 
-        # Generate schedule algorithmically
-        schedule_result = self.generate_schedule_algorithmically(templates_to_fill, week_start_date)
-
-        # Validate and apply
-        final_result = self.validate_and_apply_schedule(schedule_result, shift_templates, week_start_date)
+        # Pre-check: how much of the week can be staffed at all?
+        feasibility = self.check_feasibility(week_start_date, templates_to_fill)
+
+        # Generate schedule algorithmically, then validate and apply. Rows lost to a
+        # concurrent writer (one that doesn't take the week lock) leave their slots
+        # open, so regenerate against the fresh state and try again.
+        successful = []
+        failed = []
+        started_at = datetime.utcnow()
+        trace = DecisionTrace() if TRACE_ENABLED else None  # One trace covers every attempt
+        for attempt in range(MAX_APPLY_ATTEMPTS):
+            # Later attempts re-count, since the conflicting writes changed the week
+            schedule_result = self.generate_schedule_algorithmically(
+                templates_to_fill, week_start_date, coverage if attempt == 0 else None, trace
+            )
+            final_result = self.validate_and_apply_schedule(schedule_result, shift_templates, week_start_date)
+            successful.extend(final_result["successful"])
+            failed.extend(final_result["failed"])
+            if not final_result["conflicted"]:
+                break
+            print(f"DEBUG: {len(final_result['conflicted'])} assignments conflicted on attempt {attempt + 1}, retrying")
+
+        final_result["successful"] = successful
+        final_result["failed"] = failed + final_result.pop("conflicted")
+        final_result["feasibility"] = feasibility
+
+        if trace is not None:
+            run = save_run(
+                self.db, week_start_date, trace, started_at,
+                assignments_made=len(successful), conflicts=len(final_result.get("conflicts", []))
+            )
+            final_result["run_id"] = run.id
 
         return final_result
@@ -1,6 +1,6 @@
 from pydantic import BaseModel
 from typing import List, Dict, Optional
-from datetime import datetime
+from datetime import date, datetime
 
 # Staff schemas
 class StaffBase(BaseModel):
@@ -79,13 +79,46 @@ class WeekAssignmentBase(BaseModel):
 class WeekAssignmentCreate(WeekAssignmentBase):
     pass
 
+class AssignmentOperation(BaseModel):
+    op: str  # add, remove or move
+    assignment_id: Optional[int] = None  # remove and move
+    staff_id: Optional[int] = None  # add; move keeps the current value when omitted
+    shift_template_id: Optional[int] = None
+    day_of_week: Optional[int] = None
+
+class AssignmentBatch(BaseModel):
+    week_start_date: datetime
+    operations: List[AssignmentOperation]
+
 class WeekAssignment(WeekAssignmentBase):
     id: int
     assigned_at: datetime
+    shift_date: Optional[date] = None
+    start_at: Optional[datetime] = None
+    end_at: Optional[datetime] = None
 
     class Config:
         from_attributes = True
 
+# Aggregated page-load schemas
+class SlotCoverage(BaseModel):
+    shift_template_id: int
+    day_of_week: int
+    required: int
+    assigned: int
+    missing: int
+
+class Bootstrap(BaseModel):
+    week_start_date: date
+    staff: List[Staff]
+    shift_templates: List[ShiftTemplate]
+    assignments: List[WeekAssignment]
+    coverage: List[SlotCoverage]
+
+class StaffProfile(BaseModel):
+    availability: List[Availability]
+    preferences: List[Preference]
+
 # Fairness metric schemas
 class FairnessMetric(BaseModel):
     id: int
@@ -104,3 +137,45 @@ class FairnessMetric(BaseModel):
 class ScheduleRequest(BaseModel):
     week_start_date: datetime
     clear_existing: bool = False
+
+class RollingScheduleRequest(BaseModel):
+    start_week_date: datetime
+    num_weeks: int = 52
+
+class CloneWeekRequest(BaseModel):
+    source_week_date: datetime
+    target_week_dates: List[datetime] = []  # Explicit targets, or
+    num_weeks: Optional[int] = None  # the weeks right after the source
+    fill_gaps: bool = True  # Auto-schedule whatever the copy leaves open
+
+class SiteCreate(BaseModel):
+    site_id: str
+
+class ArchiveRequest(BaseModel):
+    horizon_days: Optional[int] = None  # Defaults to ARCHIVE_HORIZON_DAYS
+
+class ScheduleJob(BaseModel):
+    id: int
+    start_week_date: datetime
+    num_weeks: int
+    completed_weeks: int
+    status: str
+    error: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+
+    class Config:
+        from_attributes = True
+
+class ScheduleRun(BaseModel):
+    id: int
+    week_start_date: datetime
+    started_at: datetime
+    duration_ms: float
+    slot_count: int
+    top_k: int
+    assignments_made: int
+    conflicts: int
+
+    class Config:
+        from_attributes = True
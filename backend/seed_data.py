@@ -2,6 +2,8 @@
 from datetime import datetime
 from database import SessionLocal, engine
 import models
+from reference_cache import reference_cache
+from snapshot import bump_data_version
 
 # Create tables
 models.Base.metadata.create_all(bind=engine)
@@ -92,7 +94,9 @@ try:
     pref3 = models.Preference(staff_id=staff1.id, day_of_week=6, shift_template_id=morning.id, preference_score=0.5)
 
     db.add_all([pref1, pref2, pref3])
+    bump_data_version(db)  # Scheduling snapshots rebuild on next use
     db.commit()
+    reference_cache.invalidate(db)  # Let a running server reload staff and templates
 
     print("Created preferences:")
     print("  - Fredo: prefers Monday Afternoon (+0.5), avoids Thursday Afternoon (-0.5), prefers Sunday Morning (+0.5)")
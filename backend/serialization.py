@@ -0,0 +1,75 @@
+"""Lean JSON path for list endpoints.
+
+Returning ORM objects makes FastAPI hydrate every row, validate it through
+the ``from_attributes`` schema and run ``jsonable_encoder`` over the result
+before encoding. For tens of thousands of assignments that dominates the
+request. The helpers here select only the schema's columns with Core queries
+and encode the row tuples straight to JSON bytes with orjson, chunk by chunk.
+The field names and order come from the Pydantic schemas, so the payload is
+unchanged; endpoints keep their ``response_model`` for the OpenAPI docs.
+"""
+from typing import Mapping, Sequence
+import orjson
+from fastapi.responses import Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+import models
+import schemas
+
+ENCODE_CHUNK_ROWS = 5000
+
+ASSIGNMENT_FIELDS = tuple(schemas.WeekAssignment.model_fields)
+STAFF_FIELDS = tuple(schemas.Staff.model_fields)
+TEMPLATE_FIELDS = tuple(schemas.ShiftTemplate.model_fields)
+AVAILABILITY_FIELDS = tuple(schemas.Availability.model_fields)
+PREFERENCE_FIELDS = tuple(schemas.Preference.model_fields)
+
+
+class JSONBytesResponse(Response):
+    """JSON response whose body is already encoded (other content goes through orjson)."""
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return content if isinstance(content, bytes) else orjson.dumps(content, default=_default)
+
+
+def _default(value):
+    # MappingProxyType from the reference cache records
+    if isinstance(value, Mapping):
+        return dict(value)
+    raise TypeError
+
+
+def encode_rows(fields: Sequence[str], rows: Sequence) -> bytes:
+    """JSON array of objects from row tuples, encoded in chunks to keep the dicts short-lived."""
+    parts = []
+    for start in range(0, len(rows), ENCODE_CHUNK_ROWS):
+        chunk = orjson.dumps([dict(zip(fields, row)) for row in rows[start:start + ENCODE_CHUNK_ROWS]], default=_default)
+        parts.append(chunk[1:-1])
+    return b"[" + b",".join(parts) + b"]"
+
+
+def encode_records(fields: Sequence[str], records: Sequence) -> bytes:
+    """Same for objects with attributes (e.g. reference cache records)."""
+    return encode_rows(fields, [tuple(getattr(record, name) for name in fields) for record in records])
+
+
+def encode_object(members: Mapping[str, bytes]) -> bytes:
+    """JSON object from already-encoded member values (e.g. several encode_rows arrays)."""
+    return b"{" + b",".join(orjson.dumps(key) + b":" + value for key, value in members.items()) + b"}"
+
+
+async def fetch_rows(db: AsyncSession, statement) -> Sequence:
+    """Run a column select on the session's connection, skipping the ORM loading layer."""
+    connection = await db.connection()
+    return (await connection.execute(statement)).all()
+
+
+def columns(model, fields: Sequence[str]):
+    """select() of a model's columns named by a schema, in schema order."""
+    return select(*(getattr(model, name) for name in fields))
+
+
+def assignment_columns():
+    """select() of the WeekAssignment schema's columns, in schema order."""
+    return columns(models.WeekAssignment, ASSIGNMENT_FIELDS)
@@ -0,0 +1,198 @@
+"""Per-site databases.
+
+Each location (site) has its own SQLite file, so writes and scheduling runs at
+one site never wait on another site's write lock, and throughput grows with
+the number of sites. The ``default`` site is the original ``DATABASE_URL``.
+Every other site is ``<SITES_DIR>/<site_id>.db``, created with
+``POST /api/sites``.
+
+Requests pick their site with a path prefix (``/api/sites/<site_id>/staff/``
+is routed as ``/api/staff/``) or an ``X-Site-Id`` header. Without either they
+use the default site. ``SiteMiddleware`` stores the choice in
+``current_site_id`` for the whole request, including the threads it hands work
+to. ``get_db`` and ``get_async_db`` open sessions on that site's engines.
+
+Engines and session factories are created on first use, after creating or
+upgrading the site's schema. At most ``MAX_OPEN_SITES`` are kept; the least
+recently used one is disposed when another site is opened. Caches kept per
+database (reference data, scheduling snapshot) are dropped with it.
+"""
+import contextvars
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import List
+import database
+import load_counters
+import migrations
+import models
+from reference_cache import reference_cache
+from snapshot import snapshot_store
+
+DEFAULT_SITE = "default"
+SITES_DIR = os.getenv("SITES_DIR", "./sites")
+MAX_OPEN_SITES = int(os.getenv("MAX_OPEN_SITES", "32"))
+SITE_ID_PATTERN = re.compile(r"^[a-z0-9][a-z0-9_-]{0,63}$")
+SITE_PATH_PATTERN = re.compile(r"^/api/sites/([^/]+)(/.+)$")
+
+current_site_id: contextvars.ContextVar[str] = contextvars.ContextVar("current_site_id", default=DEFAULT_SITE)
+
+
+class UnknownSiteError(Exception):
+    """No database exists for the requested site id."""
+
+    def __init__(self, site_id: str):
+        self.site_id = site_id
+        super().__init__(f"Site '{site_id}' not found")
+
+
+class SiteDatabase:
+    """Engines and session factories for one site."""
+
+    def __init__(self, site_id: str, engine, session_factory, async_engine, async_session_factory):
+        self.site_id = site_id
+        self.engine = engine
+        self.SessionLocal = session_factory
+        self.async_engine = async_engine
+        self.AsyncSessionLocal = async_session_factory
+
+    def prepare(self):
+        """Create missing tables, upgrade older schemas and backfill counters."""
+        models.Base.metadata.create_all(bind=self.engine)
+        migrations.run_migrations(self.engine)
+        with self.SessionLocal() as db:
+            load_counters.ensure_week_loads(db)
+
+    def close(self):
+        # Connections still checked out by in-flight requests close when they are returned
+        self.engine.dispose()
+        self.async_engine.sync_engine.dispose(close=False)
+        reference_cache.forget(self.engine)
+        snapshot_store.forget(self.engine)
+
+
+def site_path(site_id: str) -> str:
+    return os.path.abspath(os.path.join(SITES_DIR, f"{site_id}.db"))
+
+
+def _valid(site_id: str) -> bool:
+    return site_id == DEFAULT_SITE or SITE_ID_PATTERN.match(site_id) is not None
+
+
+class SiteRegistry:
+    """LRU of open site databases (the default site is always open)."""
+
+    def __init__(self, max_open: int = MAX_OPEN_SITES):
+        self.max_open = max_open
+        self.default = SiteDatabase(
+            DEFAULT_SITE, database.engine, database.SessionLocal, database.async_engine, database.AsyncSessionLocal
+        )
+        self._default_prepared = False
+        self._open: "OrderedDict[str, SiteDatabase]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, site_id: str) -> SiteDatabase:
+        if site_id == DEFAULT_SITE:
+            if not self._default_prepared:
+                with self._lock:
+                    if not self._default_prepared:
+                        self.default.prepare()
+                        self._default_prepared = True
+            return self.default
+
+        with self._lock:
+            site = self._open.get(site_id)
+            if site is not None:
+                self._open.move_to_end(site_id)
+                return site
+            if not _valid(site_id) or not os.path.exists(site_path(site_id)):
+                raise UnknownSiteError(site_id)
+            return self._open_site(site_id)
+
+    def create(self, site_id: str) -> SiteDatabase:
+        """Create a new site's database. Raises ValueError for a bad or taken id."""
+        if not SITE_ID_PATTERN.match(site_id) or site_id == DEFAULT_SITE:
+            raise ValueError("Site ids are 1-64 lowercase letters, digits, '-' or '_' (and not 'default')")
+        with self._lock:
+            if site_id in self._open or os.path.exists(site_path(site_id)):
+                raise ValueError(f"Site '{site_id}' already exists")
+            os.makedirs(SITES_DIR, exist_ok=True)
+            return self._open_site(site_id)
+
+    def _open_site(self, site_id: str) -> SiteDatabase:
+        # Called with the lock held
+        site = SiteDatabase(site_id, *database.create_engines(f"sqlite:///{site_path(site_id)}"))
+        site.prepare()
+        self._open[site_id] = site
+        while len(self._open) > self.max_open:
+            _, evicted = self._open.popitem(last=False)
+            print(f"DEBUG: Closing site database {evicted.site_id} (more than {self.max_open} open)")
+            evicted.close()
+        return site
+
+    def site_ids(self) -> List[str]:
+        ids = [DEFAULT_SITE]
+        if os.path.isdir(SITES_DIR):
+            ids.extend(sorted(
+                name[:-3] for name in os.listdir(SITES_DIR)
+                if name.endswith(".db") and SITE_ID_PATTERN.match(name[:-3])
+            ))
+        return ids
+
+
+site_registry = SiteRegistry()
+
+
+def current_site() -> SiteDatabase:
+    """The request's site (raises UnknownSiteError, a 404 from the API)."""
+    return site_registry.get(current_site_id.get())
+
+
+def get_site() -> SiteDatabase:
+    """FastAPI dependency for endpoints that open their own sessions (jobs, streams)."""
+    return current_site()
+
+
+def get_db():
+    db = current_site().SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+async def get_async_db():
+    async with current_site().AsyncSessionLocal() as db:
+        yield db
+
+
+class SiteMiddleware:
+    """Sets current_site_id from a /api/sites/<site_id>/... prefix or the X-Site-Id header."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        site_id = DEFAULT_SITE
+        match = SITE_PATH_PATTERN.match(scope["path"])
+        if match:
+            # EventSource can't send headers, so the prefix form also covers the change feed
+            site_id = match.group(1)
+            path = "/api" + match.group(2)
+            scope = dict(scope, path=path, raw_path=path.encode())
+        else:
+            for name, value in scope["headers"]:
+                if name == b"x-site-id":
+                    site_id = value.decode("latin-1").strip() or DEFAULT_SITE
+                    break
+
+        token = current_site_id.set(site_id)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_site_id.reset(token)
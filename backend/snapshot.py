@@ -0,0 +1,309 @@
+"""Compiled, memory-mapped snapshot of the scheduling inputs.
+
+Every scheduling call needs each staff member's weekly cap and qualifications,
+which (staff, template, day) pairings are unavailable, and the preference
+score of each pairing. The scheduler used to look up preferences with one
+query per candidate. The snapshot packs all of this into fixed-width arrays
+in one file next to the database:
+
+    header   magic, format, data version, counts, section offsets
+    staff    ids (int32), max_shifts_per_week (int32), qualification bits (uint64 words)
+    template ids (int32), required_staff (int32), day bits (uint8), active (uint8),
+             minimum count per qualification (int32, templates x qualifications)
+    unavail  day bits per (staff, template) (uint8)
+    prefs    score per (staff, template, day) (float64, NaN = no preference)
+    meta     qualification names in bit order (JSON)
+
+Processes open the file with ``mmap`` and read it through ``memoryview`` casts.
+Nothing is copied or parsed beyond the id -> index maps, so every uvicorn
+worker shares one physical copy through the page cache.
+
+Freshness is keyed by the single-row ``data_version`` table. Every write to
+staff, templates, availability or preferences calls ``bump_data_version``
+in the same transaction as the change. The first reader that sees a newer
+version rebuilds the file. The new file is written to a temporary path and
+renamed over the old one, so a process that still maps the previous version
+keeps a consistent view until its next check. Each site's database has its
+own snapshot file and store.
+"""
+import json
+import logging
+import math
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from array import array
+from typing import Dict, List, Optional
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+import models
+from database import PerDatabase
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"SSNP"
+FORMAT_VERSION = 1
+# magic, format, qualification words, data version, staff, templates, qualifications, meta length
+HEADER = struct.Struct("<4sHHqIIII")
+SECTIONS = (
+    "staff_ids", "staff_caps", "staff_quals",
+    "template_ids", "template_required", "template_days", "template_active", "template_requirements",
+    "unavailable", "preferences", "meta",
+)
+OFFSETS = struct.Struct(f"<{len(SECTIONS)}Q")
+NO_PREFERENCE = float("nan")
+
+
+def current_data_version(db: Session) -> int:
+    version = db.query(models.DataVersion.version).filter(models.DataVersion.id == 1).scalar()
+    return version or 0
+
+
+def initial_data_version() -> int:
+    """Starting point for a new database's counter.
+
+    Milliseconds since the epoch rather than 0, so a snapshot file left behind by
+    a deleted database never matches the version of its replacement.
+    """
+    return int(time.time() * 1000)
+
+
+def bump_data_version(db: Session):
+    """Mark the scheduling inputs as changed. Call before committing the write."""
+    stmt = sqlite_insert(models.DataVersion).values(id=1, version=initial_data_version())
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["id"],
+        set_={"version": models.DataVersion.version + 1}
+    )
+    db.execute(stmt)
+
+
+def _align(offset: int) -> int:
+    return (offset + 7) & ~7
+
+
+def build_snapshot(db: Session) -> bytes:
+    """Serialize the current scheduling inputs (read in the session's transaction)."""
+    version = current_data_version(db)
+    staff = db.query(
+        models.Staff.id, models.Staff.max_shifts_per_week, models.Staff.qualifications
+    ).order_by(models.Staff.id).all()
+    templates = db.query(
+        models.ShiftTemplate.id, models.ShiftTemplate.required_staff, models.ShiftTemplate.days_of_week,
+        models.ShiftTemplate.is_active, models.ShiftTemplate.required_qualifications
+    ).order_by(models.ShiftTemplate.id).all()
+
+    # Same interning rule as constraints.QualificationIndex: only required qualifications get a bit
+    qualifications = []
+    bits = {}
+    for template in templates:
+        for qual in (template.required_qualifications or {}):
+            if qual not in bits:
+                bits[qual] = len(qualifications)
+                qualifications.append(qual)
+    words = max(1, (len(qualifications) + 63) // 64)
+
+    staff_index = {row.id: i for i, row in enumerate(staff)}
+    template_index = {row.id: i for i, row in enumerate(templates)}
+    staff_count, template_count = len(staff), len(templates)
+
+    staff_quals = array("Q", bytes(8 * staff_count * words))
+    for i, row in enumerate(staff):
+        for qual in (row.qualifications or ()):
+            bit = bits.get(qual)
+            if bit is not None:
+                staff_quals[i * words + bit // 64] |= 1 << (bit % 64)
+
+    template_days = bytearray(template_count)
+    requirements = array("i", bytes(4 * template_count * len(qualifications)))
+    for i, row in enumerate(templates):
+        for day in (row.days_of_week or ()):
+            template_days[i] |= 1 << day
+        for qual, count in (row.required_qualifications or {}).items():
+            requirements[i * len(qualifications) + bits[qual]] = count
+
+    unavailable = bytearray(staff_count * template_count)
+    for staff_id, template_id, day in db.query(
+        models.Availability.staff_id, models.Availability.shift_template_id, models.Availability.day_of_week
+    ).filter(models.Availability.is_available == False).all():
+        if staff_id in staff_index and template_id in template_index:
+            unavailable[staff_index[staff_id] * template_count + template_index[template_id]] |= 1 << day
+
+    preferences = array("d", [NO_PREFERENCE]) * (staff_count * template_count * 7)
+    for staff_id, template_id, day, score in db.query(
+        models.Preference.staff_id, models.Preference.shift_template_id,
+        models.Preference.day_of_week, models.Preference.preference_score
+    ).order_by(models.Preference.id).all():
+        if staff_id in staff_index and template_id in template_index:
+            cell = (staff_index[staff_id] * template_count + template_index[template_id]) * 7 + day
+            # First row wins, like get_preference_score's .first()
+            if math.isnan(preferences[cell]):
+                preferences[cell] = score if score is not None else 0.0
+
+    meta = json.dumps({"qualifications": qualifications}).encode()
+    sections = [
+        array("i", [row.id for row in staff]).tobytes(),
+        array("i", [row.max_shifts_per_week or 0 for row in staff]).tobytes(),
+        staff_quals.tobytes(),
+        array("i", [row.id for row in templates]).tobytes(),
+        array("i", [row.required_staff or 0 for row in templates]).tobytes(),
+        bytes(template_days),
+        bytes(1 if row.is_active else 0 for row in templates),
+        requirements.tobytes(),
+        bytes(unavailable),
+        preferences.tobytes(),
+        meta,
+    ]
+
+    offsets = []
+    position = _align(HEADER.size + OFFSETS.size)
+    for section in sections:
+        offsets.append(position)
+        position = _align(position + len(section))
+    buffer = bytearray(position)
+    HEADER.pack_into(buffer, 0, MAGIC, FORMAT_VERSION, words, version, staff_count, template_count, len(qualifications), len(meta))
+    OFFSETS.pack_into(buffer, HEADER.size, *offsets)
+    for offset, section in zip(offsets, sections):
+        buffer[offset:offset + len(section)] = section
+    return bytes(buffer)
+
+
+class Snapshot:
+    """Read-only view over a snapshot buffer (an mmap or bytes)."""
+
+    def __init__(self, buffer):
+        self._buffer = buffer
+        view = memoryview(buffer)
+        magic, fmt, self.qual_words, self.version, staff_count, template_count, qual_count, meta_length = HEADER.unpack_from(view, 0)
+        if magic != MAGIC or fmt != FORMAT_VERSION:
+            raise ValueError("Not a scheduling snapshot of this format")
+        offsets = dict(zip(SECTIONS, OFFSETS.unpack_from(view, HEADER.size)))
+
+        def section(name: str, fmt: str, count: int):
+            size = struct.calcsize(fmt)
+            return view[offsets[name]:offsets[name] + size * count].cast(fmt)
+
+        self.staff_count = staff_count
+        self.template_count = template_count
+        self.staff_ids = section("staff_ids", "i", staff_count)
+        self.staff_caps = section("staff_caps", "i", staff_count)
+        self.staff_quals = section("staff_quals", "Q", staff_count * self.qual_words)
+        self.template_ids = section("template_ids", "i", template_count)
+        self.template_required = section("template_required", "i", template_count)
+        self.template_days = section("template_days", "B", template_count)
+        self.template_active = section("template_active", "B", template_count)
+        self.template_requirements = section("template_requirements", "i", template_count * qual_count)
+        self.unavailable = section("unavailable", "B", staff_count * template_count)
+        self.preferences = section("preferences", "d", staff_count * template_count * 7)
+        self.qualifications: List[str] = json.loads(bytes(view[offsets["meta"]:offsets["meta"] + meta_length]))["qualifications"]
+
+        self.staff_index: Dict[int, int] = {staff_id: i for i, staff_id in enumerate(self.staff_ids)}
+        self.template_index: Dict[int, int] = {template_id: i for i, template_id in enumerate(self.template_ids)}
+
+    def staff_mask(self, staff_id: int) -> Optional[int]:
+        """Qualification bits (in self.qualifications order), or None for an unknown staff id."""
+        index = self.staff_index.get(staff_id)
+        if index is None:
+            return None
+        mask = 0
+        base = index * self.qual_words
+        for word in range(self.qual_words):
+            mask |= self.staff_quals[base + word] << (64 * word)
+        return mask
+
+    def unavailable_days(self, staff_id: int, template_id: int) -> int:
+        """Bitmask of days the staff member is unavailable for the template (0 if unknown)."""
+        s_idx = self.staff_index.get(staff_id)
+        t_idx = self.template_index.get(template_id)
+        if s_idx is None or t_idx is None:
+            return 0
+        return self.unavailable[s_idx * self.template_count + t_idx]
+
+    def knows(self, staff_id: int, template_id: int) -> bool:
+        return staff_id in self.staff_index and template_id in self.template_index
+
+    def preference(self, staff_id: int, template_id: int, day: int) -> Optional[float]:
+        """Stored preference score, or None if there is none (callers check knows() first)."""
+        score = self.preferences[(self.staff_index[staff_id] * self.template_count + self.template_index[template_id]) * 7 + day]
+        return None if score != score else score
+
+
+def _snapshot_path_for(database_path: Optional[str]) -> Optional[str]:
+    return database_path + ".snapshot" if database_path is not None else None
+
+
+class SnapshotStore:
+    """Hands out the snapshot matching the database's data version, rebuilding it when stale."""
+
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self._snapshot: Optional[Snapshot] = None
+        self._lock = threading.Lock()
+
+    def _open_file(self) -> Optional[Snapshot]:
+        try:
+            with open(self.path, "rb") as f:
+                return Snapshot(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+        except (FileNotFoundError, ValueError, struct.error):
+            return None
+
+    def _write_file(self, data: bytes):
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.path))
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, self.path)
+
+    def get(self, db: Session) -> Snapshot:
+        # A snapshot newer than what this session's transaction sees is still current
+        version = current_data_version(db)
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.version >= version:
+            return snapshot
+
+        # No lock is held while building: under AsyncSession.run_sync every query
+        # hands the thread back to the event loop, and a request blocking there on
+        # a threading lock would never let the builder finish. Two requests may
+        # rebuild the same version at once; the file replace is atomic and the
+        # newer snapshot wins the swap below.
+        # Another worker may already have rebuilt it (a database without a
+        # version row can't tell its file from a stale one, so always rebuild)
+        snapshot = self._open_file() if self.path is not None and version else None
+        if snapshot is None or snapshot.version < version:
+            data = build_snapshot(db)
+            snapshot = None
+            if self.path is not None:
+                try:
+                    self._write_file(data)
+                    snapshot = self._open_file()
+                except OSError as e:
+                    # e.g. the file is mapped elsewhere on a platform that can't replace it
+                    logger.warning("Could not write scheduling snapshot (%s), keeping it in memory", e)
+            if snapshot is None or snapshot.version < version:
+                # A concurrent rebuild from an older transaction replaced the file meanwhile
+                snapshot = Snapshot(data)
+            logger.debug("Rebuilt scheduling snapshot v%d (%d bytes)", snapshot.version, len(data))
+
+        # Only the swap is locked; the newer version wins. The previous mmap is
+        # closed when its last reader drops it
+        with self._lock:
+            current = self._snapshot
+            if current is not None and current.version >= snapshot.version:
+                return current
+            self._snapshot = snapshot
+        return snapshot
+
+
+class SnapshotStores(PerDatabase):
+    """One SnapshotStore per database (each site has its own file), picked from the session's engine."""
+
+    def __init__(self):
+        super().__init__(lambda path: SnapshotStore(_snapshot_path_for(path)))
+
+    def get(self, db: Session) -> Snapshot:
+        return self.for_bind(db).get(db)
+
+
+snapshot_store = SnapshotStores()
@@ -0,0 +1,75 @@
+"""Concurrent fairness reads right after a write to the scheduling inputs.
+
+A write bumps data_version, so the first fairness request rebuilds the
+scheduling snapshot. Other requests arriving meanwhile must not block the
+event loop (and with it the request doing the rebuild).
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+
+_tmp = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{_tmp}/test.db"
+os.environ.pop("ASYNC_DATABASE_URL", None)
+os.environ["SITES_DIR"] = os.path.join(_tmp, "sites")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx  # noqa: E402
+import main  # noqa: E402
+
+TIMEOUT_SECONDS = 30
+
+
+async def _fairness_after_write():
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        templates = []
+        for name, start, end in (("Morning", "06:00", "14:00"), ("Evening", "14:00", "22:00")):
+            response = await client.post("/api/shift-templates/", json={
+                "name": name, "days_of_week": [0, 1, 2, 3, 4], "start_time": start, "end_time": end, "required_staff": 2
+            })
+            assert response.status_code == 200, response.text
+            templates.append(response.json()["id"])
+        staff_ids = []
+        for i in range(8):
+            response = await client.post("/api/staff/", json={"name": f"Staff {i}", "qualifications": [], "max_shifts_per_week": 5})
+            assert response.status_code == 200, response.text
+            staff_ids.append(response.json()["id"])
+        week = "2026-10-19T00:00:00"
+        response = await client.post("/api/schedule/auto", json={"week_start_date": week})
+        assert response.status_code == 200, response.text
+
+        response = await client.post("/api/availability/", json={
+            "staff_id": staff_ids[0], "shift_template_id": templates[0], "day_of_week": 0, "is_available": False
+        })
+        assert response.status_code == 200, response.text
+
+        responses = await asyncio.gather(*[
+            client.get(f"/api/fairness/all?period_days={days}") for days in (7, 14, 28, 56)
+        ], client.get(f"/api/fairness/staff/{staff_ids[1]}?period_days=30"))
+        return responses
+
+
+def test_concurrent_fairness_reads_after_write():
+    # A blocked event loop can't time itself out, so run it in a thread and give up on that
+    outcome = {}
+
+    def run():
+        try:
+            outcome["responses"] = asyncio.run(_fairness_after_write())
+        except BaseException as e:
+            outcome["error"] = e
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(TIMEOUT_SECONDS)
+    assert not thread.is_alive(), f"fairness requests still pending after {TIMEOUT_SECONDS}s (event loop blocked)"
+    if "error" in outcome:
+        raise outcome["error"]
+    responses = outcome["responses"]
+    for response in responses[:-1]:
+        assert response.status_code == 200, response.text
+        assert len(response.json()) == 8
+    assert responses[-1].status_code == 200, responses[-1].text
@@ -0,0 +1,167 @@
+"""Copy one week's assignments into other weeks ("same as last week").
+
+``clone_week`` copies the source week's rows into a target week with one
+``INSERT ... SELECT``: staff, template and day are kept, and week_start_date,
+shift_date, start_at and end_at are moved by the number of days between the
+two weeks (the source's materialized times are current, see
+``models.refresh_shift_times``). Each source row is first classified in SQL
+by the same ``classified`` subquery that feeds the insert:
+
+    not_scheduled     the template is inactive or no longer runs on that day
+    unavailable       the staff member marked the shift/day unavailable
+    already_assigned  the target week already has this staff/shift/day
+    max_shifts        copying it would exceed the staff member's weekly cap,
+                      counting what the target week already holds (rows are
+                      taken per staff member in day, template order)
+
+Rows with a reason are skipped and reported; the rest are inserted, the
+weekly counters adjusted and the change feed told. The gaps the skipped rows
+(or an understaffed source week) leave are for the scheduler to fill; the
+clone endpoint runs ``auto_schedule`` on each target week unless asked not to.
+"""
+import logging
+from datetime import datetime
+from typing import Dict
+from sqlalchemy import and_, case, exists, func, literal, literal_column, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+import load_counters
+import models
+from events import assignment_payload, change_feed
+
+logger = logging.getLogger(__name__)
+
+SKIP_REASONS = ("not_scheduled", "unavailable", "already_assigned", "max_shifts")
+
+
+def _shifted(column, days: int, fmt: str):
+    """SQLite strftime of a date/datetime column moved by days, in SQLAlchemy's storage format."""
+    return func.strftime(fmt, column, f"{days:+d} days")
+
+
+def _classified(source_week: datetime, target_week: datetime):
+    """Source rows with their target-week columns and skip reason (NULL if the row can be copied)."""
+    WA = models.WeekAssignment
+    T = models.ShiftTemplate
+    A = models.Availability
+    offset = (target_week.date() - source_week.date()).days
+    target_key = load_counters.week_key(target_week)
+
+    scheduled = and_(
+        T.is_active == True,
+        exists(
+            select(literal(1)).select_from(func.json_each(T.days_of_week).table_valued("value"))
+            .where(literal_column("value") == WA.day_of_week)
+        )
+    )
+    unavailable = exists().where(
+        A.staff_id == WA.staff_id,
+        A.shift_template_id == WA.shift_template_id,
+        A.day_of_week == WA.day_of_week,
+        A.is_available == False
+    )
+    Target = models.WeekAssignment.__table__.alias("target")
+    shift_date = _shifted(WA.shift_date, offset, "%Y-%m-%d")
+    present = exists().where(
+        Target.c.staff_id == WA.staff_id,
+        Target.c.shift_template_id == WA.shift_template_id,
+        Target.c.shift_date == shift_date
+    )
+    already = func.coalesce(
+        select(models.StaffWeekLoad.shift_count).where(
+            models.StaffWeekLoad.staff_id == WA.staff_id,
+            models.StaffWeekLoad.week_start_date == target_key
+        ).scalar_subquery(),
+        0
+    )
+    blocked = case(
+        (~scheduled, "not_scheduled"),
+        (unavailable, "unavailable"),
+        (present, "already_assigned"),
+        else_=None
+    )
+    # Running count per staff member over the rows that aren't blocked otherwise
+    sequence = func.row_number().over(
+        partition_by=(WA.staff_id, blocked.is_(None)),
+        order_by=(WA.day_of_week, WA.shift_template_id)
+    )
+    staged = (
+        select(
+            WA.staff_id,
+            WA.shift_template_id,
+            WA.day_of_week,
+            shift_date.label("shift_date"),
+            _shifted(WA.start_at, offset, "%Y-%m-%d %H:%M:%f000").label("start_at"),
+            _shifted(WA.end_at, offset, "%Y-%m-%d %H:%M:%f000").label("end_at"),
+            blocked.label("blocked"),
+            (sequence + already).label("week_count"),
+            models.Staff.max_shifts_per_week
+        )
+        .join(T, T.id == WA.shift_template_id)
+        .join(models.Staff, models.Staff.id == WA.staff_id)
+        .where(models.week_start_filter(source_week))
+    ).subquery("staged")
+    return select(
+        staged.c.staff_id,
+        staged.c.shift_template_id,
+        staged.c.day_of_week,
+        staged.c.shift_date,
+        staged.c.start_at,
+        staged.c.end_at,
+        case(
+            (staged.c.blocked.is_not(None), staged.c.blocked),
+            (staged.c.week_count > staged.c.max_shifts_per_week, "max_shifts"),
+            else_=None
+        ).label("reason")
+    ).subquery("classified")
+
+
+def clone_week(db: Session, source_week: datetime, target_week: datetime) -> Dict:
+    """Copy the source week's assignments into target_week. Commits.
+
+    Call with the target week's lock held. Returns copied/skipped counts and
+    the skipped rows with their reason.
+    """
+    WA = models.WeekAssignment
+    classified = _classified(source_week, target_week)
+    target_key = load_counters.week_key(target_week)
+
+    skipped = [
+        {"staff_id": staff_id, "shift_template_id": template_id, "day_of_week": day, "reason": reason}
+        for staff_id, template_id, day, reason in db.execute(
+            select(classified.c.staff_id, classified.c.shift_template_id, classified.c.day_of_week, classified.c.reason)
+            .where(classified.c.reason.is_not(None))
+            .order_by(classified.c.day_of_week, classified.c.shift_template_id, classified.c.staff_id)
+        )
+    ]
+
+    insert_stmt = sqlite_insert(WA).from_select(
+        ["staff_id", "shift_template_id", "day_of_week", "shift_date", "start_at", "end_at", "week_start_date", "assigned_at"],
+        select(
+            classified.c.staff_id,
+            classified.c.shift_template_id,
+            classified.c.day_of_week,
+            classified.c.shift_date,
+            classified.c.start_at,
+            classified.c.end_at,
+            literal(target_key, WA.week_start_date.type),
+            literal(datetime.utcnow(), WA.assigned_at.type)
+        ).where(classified.c.reason.is_(None))
+    ).on_conflict_do_nothing().returning(
+        WA.id, WA.staff_id, WA.shift_template_id, WA.week_start_date, WA.day_of_week, WA.shift_date, WA.start_at, WA.end_at
+    )
+    copied = db.execute(insert_stmt).all()
+    load_counters.adjust_week_loads(db, target_week, load_counters.count_by_staff(copied))
+    db.commit()
+
+    if copied:
+        change_feed.assignments_added(target_key, [assignment_payload(row) for row in copied])
+
+    logger.debug("Cloned week %s into %s: %d copied, %d skipped", source_week.date(), target_week.date(), len(copied), len(skipped))
+
+    return {
+        "week_start_date": target_key.date().isoformat(),
+        "copied": len(copied),
+        "skipped_by_reason": {reason: sum(1 for row in skipped if row["reason"] == reason) for reason in SKIP_REASONS},
+        "skipped": skipped
+    }
@@ -0,0 +1,103 @@
+"""Per-week advisory locks.
+
+Two scheduling runs for the same week used to interleave their reads and
+writes and double-book it. Every path that fills or clears a whole week takes
+``week_lock(db, week_start_date)`` first. The lock is a row in ``week_lock``
+of the database ``db`` writes to (so each site locks its own weeks),
+claimed with a single upsert that only overwrites an expired row. That makes it
+visible to every worker process sharing the database. Runs for different weeks
+hold different rows and proceed in parallel.
+
+A lock that is still held is retried with backoff for up to ``LOCK_WAIT_SECONDS``,
+then ``WeekLockedError`` is raised (409 from the API). A worker that dies while
+holding a lock blocks its week only until ``expires_at``. Locks are re-entrant
+within a thread, so ``run_auto_schedule`` can clear a week and then call
+``auto_schedule`` under the same lock.
+
+The unique index on ``week_assignment`` remains the last line of defence for
+writers that don't take the lock (e.g. a single manual assignment).
+"""
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from database import database_path
+import models
+from load_counters import week_key
+
+LOCK_TTL_SECONDS = int(os.getenv("WEEK_LOCK_TTL_SECONDS", "300"))
+LOCK_WAIT_SECONDS = float(os.getenv("WEEK_LOCK_WAIT_SECONDS", "30"))
+MAX_BACKOFF_SECONDS = 0.5
+
+_held = threading.local()  # .weeks: {(database path, week key): owner} held by this thread
+
+
+class WeekLockedError(Exception):
+    """Another run holds the week's lock and did not release it in time."""
+
+    def __init__(self, week_start_date: datetime):
+        self.week_start_date = week_key(week_start_date)
+        super().__init__(f"Week {self.week_start_date.date()} is being scheduled by another request, please retry")
+
+
+def try_acquire(engine: Engine, week_start_date: datetime, owner: str, ttl_seconds: int = LOCK_TTL_SECONDS) -> bool:
+    """Claim the week if it is free or its lock has expired. Commits immediately."""
+    now = datetime.utcnow()
+    stmt = sqlite_insert(models.WeekLock).values(
+        week_start_date=week_key(week_start_date),
+        owner=owner,
+        acquired_at=now,
+        expires_at=now + timedelta(seconds=ttl_seconds)
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["week_start_date"],
+        set_={"owner": stmt.excluded.owner, "acquired_at": stmt.excluded.acquired_at, "expires_at": stmt.excluded.expires_at},
+        where=models.WeekLock.expires_at < now
+    ).returning(models.WeekLock.owner)
+    with engine.begin() as conn:
+        return conn.execute(stmt).first() is not None
+
+
+def release(engine: Engine, week_start_date: datetime, owner: str):
+    with engine.begin() as conn:
+        conn.execute(
+            models.WeekLock.__table__.delete().where(
+                models.WeekLock.week_start_date == week_key(week_start_date),
+                models.WeekLock.owner == owner
+            )
+        )
+
+
+@contextmanager
+def week_lock(db: Session, week_start_date: datetime, wait_seconds: float = LOCK_WAIT_SECONDS):
+    """Hold the week's lock in db's database for the duration of the block."""
+    engine = db.get_bind()
+    key = week_key(week_start_date)
+    held_key = (database_path(engine), key)
+    held = getattr(_held, "weeks", None)
+    if held is None:
+        held = _held.weeks = {}
+    if held_key in held:
+        yield
+        return
+
+    owner = f"{os.getpid()}:{threading.get_ident()}:{uuid.uuid4().hex[:8]}"
+    deadline = time.monotonic() + wait_seconds
+    backoff = 0.02
+    while not try_acquire(engine, key, owner):
+        if time.monotonic() >= deadline:
+            raise WeekLockedError(key)
+        time.sleep(backoff)
+        backoff = min(backoff * 2, MAX_BACKOFF_SECONDS)
+
+    held[held_key] = owner
+    try:
+        yield
+    finally:
+        del held[held_key]
+        release(engine, key, owner)
@@ -9,12 +9,28 @@ const api = axios.create({
   },
 })
 
+// Sites (locations): requests go to /api/sites/<id>/..., which EventSource can
+// use too (it can't send an X-Site-Id header). null is the default site.
+let siteId = null
+const apiBase = () => (siteId ? `${API_BASE_URL}/sites/${siteId}` : API_BASE_URL)
+
+export const setSite = (id) => {
+  siteId = id
+  api.defaults.baseURL = apiBase()
+}
+export const getSites = () => axios.get(`${API_BASE_URL}/sites`)
+export const createSite = (id) => axios.post(`${API_BASE_URL}/sites`, { site_id: id })
+
 // Staff
 export const getStaff = () => api.get('/staff/')
 export const createStaff = (data) => api.post('/staff/', data)
 export const updateStaff = (id, data) => api.put(`/staff/${id}`, data)
 export const deleteStaff = (id) => api.delete(`/staff/${id}`)
 
+// Staff profiles: availability and preferences keyed by staff id, for everyone or a list of ids
+export const getStaffProfiles = (staffIds) =>
+  api.get('/staff-profiles', { params: staffIds ? { staff_ids: staffIds.join(',') } : {} })
+
 // Availability
 export const createAvailability = (data) => api.post('/availability/', data)
 export const getStaffAvailability = (staffId) => api.get(`/availability/staff/${staffId}`)
@@ -29,18 +45,104 @@ export const createShiftTemplate = (data) => api.post('/shift-templates/', data)
 export const updateShiftTemplate = (id, data) => api.put(`/shift-templates/${id}`, data)
 export const deleteShiftTemplate = (id) => api.delete(`/shift-templates/${id}`)
 
+// Page load: staff, active templates, the week's assignments and slot coverage in one request
+export const getBootstrap = (weekStart) => api.get('/bootstrap', { params: { week_start: weekStart } })
+
 // Assignments
 export const getAssignments = () => api.get('/assignments/')
 export const getWeekAssignments = (weekStart) => api.get(`/assignments/week/${weekStart}`)
+export const getAssignmentsInRange = (startDate, endDate) => api.get('/assignments/range', { params: { start_date: startDate, end_date: endDate } })
 export const createAssignment = (data) => api.post('/assignments/', data)
 export const deleteAssignment = (id) => api.delete(`/assignments/${id}`)
+// operations: [{ op: 'add' | 'remove' | 'move', assignment_id, staff_id, shift_template_id, day_of_week }]
+// applied all or nothing; resolves to { results, assignments, coverage } for the week
+export const batchAssignments = (weekStartDate, operations) => api.post('/assignments/batch', { week_start_date: weekStartDate, operations })
 export const clearWeekAssignments = (weekStart) => api.delete(`/assignments/week/${weekStart}`)
 
 // Fairness
 export const getAllFairness = (params = {}) => api.get('/fairness/all', { params })
 export const getStaffFairness = (staffId, params = {}) => api.get(`/fairness/staff/${staffId}`, { params })
+export const getFairnessTimeseries = (params = {}) => api.get('/fairness/timeseries', { params })
 
 // Scheduling
 export const autoSchedule = (data) => api.post('/schedule/auto', data)
+export const getScheduleFeasibility = (weekStart) => api.get(`/schedule/feasibility/${weekStart}`)
+export const explainScheduleConstraints = (weekStart, params) => api.get(`/schedule/explain/${weekStart}`, { params })
+
+// Rolling multi-week scheduling streams server-sent events over a POST, so it
+// uses fetch rather than axios. onEvent(type, data) is called for job, week,
+// error and done events; resolves when the stream ends.
+const readEventStream = async (response, onEvent) => {
+  const reader = response.body.getReader()
+  const decoder = new TextDecoder()
+  let buffer = ''
+  while (true) {
+    const { done, value } = await reader.read()
+    if (done) break
+    buffer += decoder.decode(value, { stream: true })
+    let boundary
+    while ((boundary = buffer.indexOf('\n\n')) >= 0) {
+      const chunk = buffer.slice(0, boundary)
+      buffer = buffer.slice(boundary + 2)
+      const type = chunk.match(/^event: (.*)$/m)?.[1] || 'message'
+      const data = chunk.match(/^data: (.*)$/m)?.[1]
+      onEvent(type, data ? JSON.parse(data) : null)
+    }
+  }
+}
+
+export const streamRollingSchedule = async (data, onEvent) => {
+  const response = await fetch(`${apiBase()}/schedule/rolling`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify(data),
+  })
+  await readEventStream(response, onEvent)
+}
+
+export const resumeRollingSchedule = async (jobId, onEvent) => {
+  const response = await fetch(`${apiBase()}/schedule/rolling/${jobId}/resume`, { method: 'POST' })
+  await readEventStream(response, onEvent)
+}
+
+export const getScheduleJob = (jobId) => api.get(`/schedule/jobs/${jobId}`)
+
+// Copy a week into target_week_dates (or the next num_weeks weeks); fill_gaps auto-schedules what's left open
+export const cloneSchedule = (data) => api.post('/schedule/clone', data)
+
+// Decision traces of auto-schedule runs (params: shift_template_id, day_of_week, staff_id)
+export const getScheduleRuns = (weekStart) => api.get('/schedule/runs', { params: weekStart ? { week_start: weekStart } : {} })
+export const getScheduleRunTrace = (runId, params) => api.get(`/schedule/runs/${runId}/trace`, { params })
+
+// Change feed: onEvent(type, data) is called for every change event touching
+// the given week, or every week if weekStart is null (roster changes always arrive). EventSource reconnects on its
+// own and the server replays what was missed, or sends 'resync' if it can't.
+// Returns a function that closes the stream.
+const CHANGE_EVENT_TYPES = [
+  'assignments.added', 'assignments.removed', 'assignments.archived',
+  'staff.updated', 'staff.deleted', 'template.updated', 'template.deactivated',
+  'availability.updated', 'preference.updated', 'resync',
+]
+
+export const subscribeToChanges = (weekStart, onEvent) => {
+  const source = new EventSource(`${apiBase()}/events${weekStart ? `?week_start=${weekStart}` : ''}`)
+  CHANGE_EVENT_TYPES.forEach((type) =>
+    source.addEventListener(type, (event) => onEvent(type, JSON.parse(event.data)))
+  )
+  return () => source.close()
+}
+
+// Archive
+export const runArchive = (data) => api.post('/archive/run', data)
+export const getArchivedAssignments = (params) => api.get('/archive/assignments', { params })
+
+// Bulk import/export: file is a File/Blob (CSV or Parquet), sent as the raw body
+export const importBulk = (kind, file, format = 'csv') =>
+  api.post(`/bulk/import/${kind}`, file, {
+    params: { format },
+    headers: { 'Content-Type': 'application/octet-stream' },
+  })
+export const bulkExportUrl = (kind, format = 'csv', params = {}) =>
+  `${apiBase()}/bulk/export/${kind}?${new URLSearchParams({ format, ...params })}`
 
 export default api
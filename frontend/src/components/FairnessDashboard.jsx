@@ -1,6 +1,35 @@
 import React, { useState, useEffect } from 'react'
-import { getAllFairness } from '../api'
-import { format, subWeeks, addWeeks, startOfDay } from 'date-fns'
+import { getAllFairness, getFairnessTimeseries, subscribeToChanges } from '../api'
+import { format, subWeeks, addWeeks, startOfDay, startOfWeek } from 'date-fns'
+
+// Weeks of history/future fetched for preset mode (largest preset)
+const SERIES_WEEKS = 12
+
+// Change events that alter fairness figures (the ones the server's fairness cache drops on)
+const FAIRNESS_EVENTS = ['assignments.', 'preference.', 'staff.', 'template.', 'resync']
+// Clones and rolling runs send one event per week; refetch once they settle
+const REFRESH_DELAY_MS = 1000
+
+// Fairness metrics for the weeks [first, last) of a time series, using the
+// prefix sums so each total is a single subtraction
+const sliceSeries = (series, first, last) => {
+  first = Math.max(0, first)
+  last = Math.min(series.weeks.length, last)
+  return series.staff.map((s) => {
+    const total = (field) => (last > first ? s.prefix[field][last] - s.prefix[field][first] : 0)
+    const totalShifts = total('shift_counts')
+    return {
+      staff_id: s.staff_id,
+      staff_name: s.staff_name,
+      metrics: {
+        total_shifts: totalShifts,
+        preference_fulfillment: totalShifts > 0 ? total('preference_sums') / totalShifts : 0.0,
+        preferred_count: total('preferred_counts'),
+        avoided_count: total('avoided_counts'),
+      },
+    }
+  })
+}
 
 function FairnessDashboard() {
   const [fairnessData, setFairnessData] = useState([])
@@ -17,20 +46,73 @@ function FairnessDashboard() {
   const [startDate, setStartDate] = useState('')
   const [endDate, setEndDate] = useState('')
 
+  // Preset mode: ±SERIES_WEEKS of weekly figures, re-sliced locally when the presets change
+  const [series, setSeries] = useState(null)
+
+  // Bumped by fairness-relevant changes (and the Refresh button) to refetch in place
+  const [changeCount, setChangeCount] = useState(0)
+
   useEffect(() => {
-    loadFairness()
-  }, [mode, pastWeeks, futureWeeks, startDate, endDate])
+    // Entering preset mode always refetches, so the series never outlives a schedule change
+    if (mode === 'preset') {
+      loadSeries()
+    } else {
+      loadFairness()
+    }
+  }, [mode, startDate, endDate])
 
-  const loadFairness = async () => {
-    setLoading(true)
+  useEffect(() => {
+    if (changeCount === 0) return
+    if (mode === 'preset') {
+      loadSeries(true)
+    } else {
+      loadFairness(true)
+    }
+  }, [changeCount])
+
+  useEffect(() => {
+    let timer = null
+    const unsubscribe = subscribeToChanges(null, (type) => {
+      if (!FAIRNESS_EVENTS.some((prefix) => type.startsWith(prefix))) return
+      clearTimeout(timer)
+      timer = setTimeout(() => setChangeCount((count) => count + 1), REFRESH_DELAY_MS)
+    })
+    return () => {
+      clearTimeout(timer)
+      unsubscribe()
+    }
+  }, [])
+
+  useEffect(() => {
+    if (mode === 'preset' && series) {
+      // Past weeks end before the current week; future weeks start with it
+      setFairnessData(sliceSeries(series, SERIES_WEEKS - pastWeeks, SERIES_WEEKS + futureWeeks))
+    }
+  }, [mode, series, pastWeeks, futureWeeks])
+
+  // quiet: refresh behind the current figures instead of showing the loading state
+  const loadSeries = async (quiet = false) => {
+    if (!quiet) setLoading(true)
+    try {
+      const currentWeek = startOfWeek(new Date(), { weekStartsOn: 1 })
+      const response = await getFairnessTimeseries({
+        start_week: format(subWeeks(currentWeek, SERIES_WEEKS), 'yyyy-MM-dd'),
+        end_week: format(addWeeks(currentWeek, SERIES_WEEKS), 'yyyy-MM-dd'),
+      })
+      setSeries(response.data)
+    } catch (error) {
+      console.error('Failed to load fairness time series:', error)
+    } finally {
+      setLoading(false)
+    }
+  }
+
+  const loadFairness = async (quiet = false) => {
+    if (!quiet) setLoading(true)
     try {
       let params = {}
 
-      if (mode === 'preset') {
-        // Use bidirectional period: max of past and future weeks
-        const maxWeeks = Math.max(pastWeeks, futureWeeks)
-        params.period_days = maxWeeks * 7
-      } else if (mode === 'custom' && startDate && endDate) {
+      if (mode === 'custom' && startDate && endDate) {
         // Use custom date range
         params.start_date = startDate
         params.end_date = endDate
@@ -100,7 +182,16 @@ function FairnessDashboard() {
       <h1>Fairness Dashboard</h1>
 
       <div className="card">
-        <h3>Analysis Window</h3>
+        <div style={{ display: 'flex', justifyContent: 'space-between', alignItems: 'center' }}>
+          <h3>Analysis Window</h3>
+          <button
+            className="btn btn-secondary"
+            onClick={() => setChangeCount((count) => count + 1)}
+            style={{ fontSize: '12px', padding: '5px 10px' }}
+          >
+            Refresh
+          </button>
+        </div>
 
         <div className="form-group" style={{ marginBottom: '15px' }}>
           <label>Mode</label>
@@ -1,5 +1,5 @@
 import React, { useState, useEffect } from 'react'
-import { getShiftTemplates, getWeekAssignments, getStaff, autoSchedule, clearWeekAssignments, deleteAssignment, createAssignment } from '../api'
+import { getBootstrap, autoSchedule, clearWeekAssignments, deleteAssignment, createAssignment, subscribeToChanges } from '../api'
 import { format, startOfWeek, addDays } from 'date-fns'
 
 const DAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
@@ -15,8 +15,47 @@ function ScheduleView() {
 
   useEffect(() => {
     loadData()
+
+    // Patch local state from the change feed instead of refetching after every edit
+    const weekStartStr = format(startOfWeek(selectedWeek, { weekStartsOn: 1 }), 'yyyy-MM-dd')
+    return subscribeToChanges(weekStartStr, applyChange)
   }, [selectedWeek])
 
+  const upsertById = (items, item) =>
+    items.some(i => i.id === item.id) ? items.map(i => (i.id === item.id ? item : i)) : [...items, item]
+
+  const applyChange = (type, data) => {
+    switch (type) {
+      case 'assignments.added':
+        setAssignments(prev => data.assignments.reduce(upsertById, prev))
+        break
+      case 'assignments.removed': {
+        const removed = new Set(data.assignment_ids)
+        setAssignments(prev => prev.filter(a => !removed.has(a.id)))
+        break
+      }
+      case 'assignments.archived':
+        setAssignments([])
+        break
+      case 'staff.updated':
+        setStaff(prev => upsertById(prev, data.staff))
+        break
+      case 'staff.deleted':
+        setStaff(prev => prev.filter(s => s.id !== data.staff_id))
+        setAssignments(prev => prev.filter(a => a.staff_id !== data.staff_id))
+        break
+      case 'template.updated':
+        setShiftTemplates(prev => upsertById(prev, data.template))
+        break
+      case 'template.deactivated':
+        setShiftTemplates(prev => prev.filter(t => t.id !== data.shift_template_id))
+        break
+      case 'resync':
+        loadData()
+        break
+    }
+  }
+
   const loadData = async () => {
     try {
       const weekStart = startOfWeek(selectedWeek, { weekStartsOn: 1 })
@@ -24,20 +63,16 @@ function ScheduleView() {
 
       console.log('DEBUG: Loading data for week:', weekStartStr)
 
-      const [templatesResp, assignmentsResp, staffResp] = await Promise.all([
-        getShiftTemplates(),
-        getWeekAssignments(weekStartStr),
-        getStaff()
-      ])
+      const { data } = await getBootstrap(weekStartStr)
 
       console.log('DEBUG: Received data:')
-      console.log('  - Templates:', templatesResp.data.length)
-      console.log('  - Assignments:', assignmentsResp.data.length, assignmentsResp.data)
-      console.log('  - Staff:', staffResp.data.length)
+      console.log('  - Templates:', data.shift_templates.length)
+      console.log('  - Assignments:', data.assignments.length, data.assignments)
+      console.log('  - Staff:', data.staff.length)
 
-      setShiftTemplates(templatesResp.data)
-      setAssignments(assignmentsResp.data)
-      setStaff(staffResp.data)
+      setShiftTemplates(data.shift_templates)
+      setAssignments(data.assignments)
+      setStaff(data.staff)
     } catch (error) {
       console.error('Failed to load data:', error)
     }
@@ -56,7 +91,6 @@ function ScheduleView() {
       })
 
       setScheduleResult(response.data)
-      await loadData()
     } catch (error) {
       console.error('Failed to auto-schedule:', error)
       setScheduleResult({
@@ -92,7 +126,6 @@ function ScheduleView() {
 
     try {
       await clearWeekAssignments(weekStartStr)
-      await loadData()
       setScheduleResult(null)
     } catch (error) {
       console.error('Failed to clear week:', error)
@@ -103,7 +136,6 @@ function ScheduleView() {
   const handleDeleteAssignment = async (assignmentId) => {
     try {
       await deleteAssignment(assignmentId)
-      await loadData()
     } catch (error) {
       console.error('Failed to delete assignment:', error)
     }
@@ -134,8 +166,6 @@ function ScheduleView() {
         delete updated[key]
         return updated
       })
-
-      await loadData()
     } catch (error) {
       console.error('Failed to add assignment:', error)
       if (error.response?.data?.detail) {
@@ -1,5 +1,5 @@
 import React, { useState, useEffect } from 'react'
-import { getStaff, createStaff, updateStaff, deleteStaff, createAvailability, createPreference, getStaffAvailability, getStaffPreferences, getShiftTemplates } from '../api'
+import { getStaff, createStaff, updateStaff, deleteStaff, createAvailability, createPreference, getStaffProfiles, getShiftTemplates } from '../api'
 
 const DAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
 
@@ -16,6 +16,7 @@ function StaffManagement() {
   })
   const [availability, setAvailability] = useState([])
   const [preferences, setPreferences] = useState([])
+  const [profiles, setProfiles] = useState({})
 
   useEffect(() => {
     loadData()
@@ -23,12 +24,15 @@ function StaffManagement() {
 
   const loadData = async () => {
     try {
-      const [staffResp, templatesResp] = await Promise.all([
+      // Every staff member's availability and preferences in one request, so details open instantly
+      const [staffResp, templatesResp, profilesResp] = await Promise.all([
         getStaff(),
-        getShiftTemplates()
+        getShiftTemplates(),
+        getStaffProfiles()
       ])
       setStaff(staffResp.data)
       setShiftTemplates(templatesResp.data)
+      setProfiles(profilesResp.data)
     } catch (error) {
       console.error('Failed to load data:', error)
     }
@@ -82,18 +86,19 @@ function StaffManagement() {
     setShowForm(false)
   }
 
-  const viewDetails = async (staffMember) => {
+  const viewDetails = (staffMember) => {
     setSelectedStaff(staffMember)
-    try {
-      const [availResp, prefResp] = await Promise.all([
-        getStaffAvailability(staffMember.id),
-        getStaffPreferences(staffMember.id)
-      ])
-      setAvailability(availResp.data)
-      setPreferences(prefResp.data)
-    } catch (error) {
-      console.error('Failed to load staff details:', error)
-    }
+    const profile = profiles[staffMember.id] || { availability: [], preferences: [] }
+    setAvailability(profile.availability)
+    setPreferences(profile.preferences)
+  }
+
+  const reloadProfile = async (staffId) => {
+    const response = await getStaffProfiles([staffId])
+    const profile = response.data[staffId]
+    setProfiles(prev => ({ ...prev, [staffId]: profile }))
+    setAvailability(profile.availability)
+    setPreferences(profile.preferences)
   }
 
   const handleAvailabilityChange = async (day, shiftTemplateId, isAvailable) => {
@@ -104,8 +109,7 @@ function StaffManagement() {
         shift_template_id: shiftTemplateId,
         is_available: isAvailable
       })
-      const response = await getStaffAvailability(selectedStaff.id)
-      setAvailability(response.data)
+      await reloadProfile(selectedStaff.id)
     } catch (error) {
       console.error('Failed to update availability:', error)
     }
@@ -119,8 +123,7 @@ function StaffManagement() {
         shift_template_id: shiftTemplateId,
         preference_score: parseFloat(score)
       })
-      const response = await getStaffPreferences(selectedStaff.id)
-      setPreferences(response.data)
+      await reloadProfile(selectedStaff.id)
     } catch (error) {
       console.error('Failed to update preference:', error)
     }